@@ -0,0 +1,75 @@
+"""
+Worst-case latency of `check_format` on pathological ~20k-character outputs.
+
+    python benchmarks/bench_check_format.py [--size 20000] [--repeat 5] [--legacy]
+
+`--legacy` also times the backtracking regex that `check_format` used before
+the linear scanner (on inputs 10x smaller - it is far too slow otherwise).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rewards import check_format  # noqa: E402
+
+LEGACY_PATTERN = re.compile(r"""
+    ^<think>(?:(?!<think>).)*?</think>\s*
+    <recipe>(?:(?!<recipe>).)*?
+        <title>[^<]+</title>(?:(?!<recipe>).)*?
+        <ingredients>(?:(?!</ingredients>).)*?<ingredient>[^<]+</ingredient>(?:(?!</ingredients>).)*?</ingredients>
+        (?:(?!<recipe>).)*?
+        <instructions>(?:(?!</instructions>).)*?<step>[^<]+</step>(?:(?!</instructions>).)*?</instructions>
+        (?:(?!<recipe>).)*?
+    </recipe>$
+""", re.DOTALL | re.IGNORECASE | re.VERBOSE)
+
+
+def pathological_inputs(size: int) -> dict:
+    """Inputs that defeat the lazy tempered-greedy tokens in different ways."""
+    n = max(size // 30, 1)
+    return {
+        "many_open_ingredients": "<think>x</think><recipe><title>t</title>" + "<ingredients><ingredient>" * n + "</recipe>",
+        "many_empty_leaves": "<think>x</think><recipe><title>t</title><ingredients>" + "<ingredient></ingredient>" * n
+                             + "</ingredients><instructions><step>s</step></instructions></recipe>",
+        "unclosed_think": "<think>" + "</think " * (size // 8) + "<recipe></recipe>",
+        "angle_bracket_soup": "<think>" + "<" * size + "</think><recipe><title>t</title></recipe>",
+        "many_sections_no_steps": "<think>x</think><recipe><title>t</title><ingredients><ingredient>a</ingredient></ingredients>"
+                                  + "<instructions><step></step></instructions>" * (size // 45) + "</recipe>",
+        "huge_valid": "<think>x</think><recipe><title>t</title><ingredients>"
+                      + "<ingredient>1 cup sugar</ingredient>" * (size // 70)
+                      + "</ingredients><instructions>" + "<step>Mix well.</step>" * (size // 70)
+                      + "</instructions></recipe>",
+    }
+
+
+def worst_latency(fn, text: str, repeat: int) -> float:
+    worst = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        worst = max(worst, time.perf_counter() - start)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'input':<26}{'chars':>8}{'check_format ms':>18}" + (f"{'legacy ms (1/10 size)':>24}" if args.legacy else ""))
+    for name, text in pathological_inputs(args.size).items():
+        line = f"{name:<26}{len(text):>8}{worst_latency(check_format, text, args.repeat) * 1e3:>18.2f}"
+        if args.legacy:
+            small = pathological_inputs(args.size // 10)[name].strip()
+            line += f"{worst_latency(LEGACY_PATTERN.search, small, 1) * 1e3:>24.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Memory and reward error of quantized gold embeddings.
+
+    python benchmarks/bench_quantized_gold.py [--rows 2000] [--items 10] [--dim 384]
+
+Builds a synthetic gold store (ragged, `--items` vectors per row on
+average), quantizes it to float16 and int8, scores perturbed predictions
+against every precision with `rewards._avg_best_cosine` and reports the
+resident size and the absolute reward error relative to float32.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import QUANTIZATIONS, RaggedEmbeddings, quantize  # noqa: E402
+from rewards import _avg_best_cosine  # noqa: E402
+
+
+def synthetic_gold(rows: int, items: int, dim: int, seed: int = 0):
+    """Gold store plus one noisy prediction matrix per row."""
+    rng = np.random.default_rng(seed)
+    shared = rng.normal(size=dim)  # sentence embeddings share a common direction
+    lengths = rng.integers(1, 2 * items, size=rows)
+    gold = [(shared + rng.normal(size=(n, dim))).astype(np.float32) for n in lengths]
+    preds = [(g[rng.integers(0, len(g), size=max(1, len(g) - 1))] + 0.5 * rng.normal(size=(max(1, len(g) - 1), dim)))
+             .astype(np.float32) for g in gold]
+    return RaggedEmbeddings.from_rows(gold), preds
+
+
+def rewards_for(store, preds) -> np.ndarray:
+    return np.array([
+        _avg_best_cosine(["x"] * len(p), ["x"], store[i], pred_embeddings=p)
+        for i, p in enumerate(preds)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    gold, preds = synthetic_gold(args.rows, args.items, args.dim)
+    reference = None
+    print(f"{gold.offsets[-1]} gold vectors of dim {args.dim} in {args.rows} rows")
+    print(f"{'dtype':<9}{'MB':>9}{'saved':>8}{'max |err|':>12}{'mean |err|':>12}{'score s':>9}")
+    for dtype in QUANTIZATIONS:
+        store = quantize(gold, dtype)
+        start = time.perf_counter()
+        scores = rewards_for(store, preds)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = scores
+        error = np.abs(scores - reference)
+        print(f"{dtype:<9}{store.nbytes / 1e6:>9.2f}{1 - store.nbytes / gold.nbytes:>8.0%}"
+              f"{error.max():>12.2e}{error.mean():>12.2e}{elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
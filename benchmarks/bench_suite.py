@@ -0,0 +1,384 @@
+"""
+Micro-benchmarks of the parsing, reward and metric hot paths.
+
+    python benchmarks/bench_suite.py                         # run and print
+    python benchmarks/bench_suite.py --save baseline.json    # record a baseline
+    python benchmarks/bench_suite.py --compare baseline.json --threshold 0.25
+
+Every case is timed call by call over synthetic inputs and reported as
+latency percentiles (ms) and throughput (items per second).  With
+``--compare`` the run is checked against a saved baseline and the script
+exits with status 1 when a case's p50 latency grew, or its throughput
+fell, by more than ``--threshold`` (a fraction).
+
+Completions come from `synthetic_completions`: valid, truncated,
+malformed, huge (~20k characters) and adversarial (the inputs of
+bench_check_format.py).  Golden recipes are synthetic too.
+`preprocess_dataset` runs on a fixture subset: the first ``--rows`` rows
+of the recipe CSV if it is present, synthetic rows with generated JPEGs
+otherwise.
+
+The embedder is a deterministic random-projection stand-in by default, so
+the numbers measure this repository's code rather than the model, and
+nothing is downloaded.  Use ``--embedder model`` to time the configured
+SentenceTransformer instead.  The embedding cache is disabled either way.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import zlib
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import embeddings  # noqa: E402
+import rewards  # noqa: E402
+from benchmarks.bench_check_format import pathological_inputs  # noqa: E402
+from rewards import check_format, cosine_ingredients_reward, cosine_steps_reward  # noqa: E402
+from utils import parse_recipe_xml  # noqa: E402
+
+COMPLETION_KINDS = ("valid", "truncated", "malformed", "huge", "adversarial")
+DEFAULT_THRESHOLD = 0.25
+# Latency differences below this are timer noise, whatever the ratio.
+MIN_DELTA_MS = 0.05
+
+_QUANTITIES = ("1", "2", "1/2", "3/4", "1 1/2", "200")
+_UNITS = ("cup", "tbsp", "tsp", "g", "oz", "large", "pinch of")
+_FOODS = ("flour", "sugar", "butter", "eggs", "milk", "salt", "olive oil", "garlic", "onion", "chicken thighs",
+          "basil", "lemon juice", "parmesan", "rice", "black pepper")
+_VERBS = ("Mix", "Whisk", "Fold in", "Season", "Bake", "Simmer", "Stir", "Roast", "Chop", "Serve")
+_DETAILS = ("until golden", "for 10 minutes", "over medium heat", "at 350°F", "until smooth", "gently", "to taste")
+
+
+# The <recipe> block extraction that the reward functions ran before
+# parse_recipe_xml; kept here as a regex-scan reference point.
+_RECIPE_BLOCK_RE = re.compile(r"<recipe>[\s\S]*?</recipe>", re.IGNORECASE)
+
+
+def extract_recipe_xml(text: str) -> Optional[str]:
+    """Return the *first* <recipe>…</recipe> block or None."""
+    m = _RECIPE_BLOCK_RE.search(text)
+    return m.group(0) if m else None
+
+
+class RandomProjectionEncoder:
+    """Deterministic SentenceTransformer stand-in: hashed word vectors, summed and normalized."""
+
+    def __init__(self, dim: int = 384, buckets: int = 4096, seed: int = 0):
+        self.table = np.random.default_rng(seed).normal(size=(buckets, dim)).astype(np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.table.shape[1]
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.table.shape[1]), dtype=np.float32)
+        for i, text in enumerate(texts):
+            rows = [zlib.crc32(word.encode()) % len(self.table) for word in text.lower().split()]
+            if rows:
+                vectors[i] = self.table[rows].sum(axis=0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Synthetic inputs
+# ──────────────────────────────────────────────────────────────────────────────
+def synthetic_recipe(rng: random.Random, n_ingredients: int, n_steps: int) -> dict:
+    ingredients = [f"{rng.choice(_QUANTITIES)} {rng.choice(_UNITS)} {rng.choice(_FOODS)}" for _ in range(n_ingredients)]
+    steps = [f"{k + 1}. {rng.choice(_VERBS)} the {rng.choice(_FOODS)} {rng.choice(_DETAILS)}." for k in range(n_steps)]
+    return {'title': f"{rng.choice(_FOODS).title()} {rng.choice(('Bake', 'Stew', 'Salad', 'Pie'))}",
+            'ingredients': ingredients, 'steps': steps}
+
+
+def recipe_completion(recipe: dict, think: str = "Looks like a home-style dish.") -> str:
+    return (
+        f"<think>{think}</think>\n<recipe>\n  <title>{recipe['title']}</title>\n  <ingredients>\n"
+        + "".join(f"    <ingredient>{item}</ingredient>\n" for item in recipe['ingredients'])
+        + "  </ingredients>\n  <instructions>\n"
+        + "".join(f"    <step>{step}</step>\n" for step in recipe['steps'])
+        + "  </instructions>\n</recipe>"
+    )
+
+
+def _malformed(rng: random.Random, text: str) -> str:
+    """One structural defect that `check_format` rejects."""
+    mutations = (
+        lambda t: t.replace("</ingredients>", "", 1),                    # unclosed section
+        lambda t: t.replace("</ingredients>", "</instructions>", 1),     # mismatched closing tag
+        lambda t: t.replace("<think>", "", 1),                           # no reasoning block
+        lambda t: t.replace("</recipe>", "</recipe><recipe>", 1),        # trailing open recipe
+        lambda t: t.replace("<recipe>", "<recipe><recipe>", 1),          # nested recipe
+        lambda t: t.replace("<", "&lt;", 3),                             # escaped tags
+        lambda t: t[:t.index("<title>") + 7] + t[t.index("</title>"):],  # empty title
+        lambda t: t + " Enjoy!",                                         # prose after the recipe
+    )
+    return rng.choice(mutations)(text)
+
+
+def synthetic_completions(n: int = 50, seed: int = 0, huge_chars: int = 20_000) -> Dict[str, List[str]]:
+    """`n` model outputs of every kind in `COMPLETION_KINDS`."""
+    rng = random.Random(seed)
+
+    def valid():
+        return recipe_completion(synthetic_recipe(rng, rng.randint(3, 14), rng.randint(3, 10)))
+
+    huge_items = huge_chars // 80
+    adversarial = list(pathological_inputs(huge_chars).values())
+    return {
+        "valid": [valid() for _ in range(n)],
+        "truncated": [text[:rng.randint(1, len(text) - 1)] for text in (valid() for _ in range(n))],
+        "malformed": [_malformed(rng, valid()) for _ in range(n)],
+        "huge": [recipe_completion(synthetic_recipe(rng, huge_items, huge_items)) for _ in range(max(1, n // 10))],
+        "adversarial": [adversarial[i % len(adversarial)] for i in range(max(len(adversarial), n // 10))],
+    }
+
+
+def synthetic_golden(n: int, seed: int = 1) -> List[dict]:
+    """Preprocessed-style golden rows (parsed items plus their embeddings)."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        recipe = synthetic_recipe(rng, rng.randint(3, 14), rng.randint(3, 10))
+        ingredient_vectors, step_vectors = embeddings.encode_nested([recipe['ingredients'], recipe['steps']])
+        rows.append({
+            'parsed_ingredients': recipe['ingredients'],
+            'instruction_steps': recipe['steps'],
+            'ingredients_embeddings': ingredient_vectors,
+            'instructions_embeddings': step_vectors,
+        })
+    return rows
+
+
+def fixture_dataset(rows: int, workdir: str):
+    """First `rows` recipes of the CSV, or synthetic rows with real JPEGs when it is absent."""
+    from recipe_dataset import DEFAULT_CSV_PATH, load_recipe_dataset
+
+    if os.path.exists(DEFAULT_CSV_PATH):
+        return load_recipe_dataset().select(range(rows))
+
+    from datasets import Dataset
+    from PIL import Image
+
+    rng = random.Random(2)
+    records = []
+    for i in range(rows):
+        recipe = synthetic_recipe(rng, rng.randint(3, 14), rng.randint(3, 10))
+        image_path = os.path.join(workdir, f"{i}.jpg")
+        Image.new("RGB", (256, 256), (i % 256, 120, 60)).save(image_path, quality=85)
+        records.append({
+            'Title': recipe['title'],
+            'Ingredients': str(recipe['ingredients']),
+            'Cleaned_Ingredients': str(recipe['ingredients']),
+            'Instructions': "\n".join(recipe['steps']),
+            'Image_Name': str(i),
+            'full_image_path': image_path,
+        })
+    return Dataset.from_list(records)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Timing
+# ──────────────────────────────────────────────────────────────────────────────
+class Case(NamedTuple):
+    name: str
+    fn: Callable
+    inputs: list
+    items_per_call: int = 1
+    # run before every call, outside the timed region
+    setup: Optional[Callable] = None
+
+
+def time_case(case: Case, repeat: int, warmup: int = 2) -> dict:
+    """Latency percentiles (ms) and throughput (items/s) of `case`."""
+    for args in case.inputs[:warmup]:
+        if case.setup:
+            case.setup()
+        case.fn(args)
+    latencies = []
+    for _ in range(repeat):
+        for args in case.inputs:
+            if case.setup:
+                case.setup()
+            start = time.perf_counter()
+            case.fn(args)
+            latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1e3
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        'calls': len(latencies),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()),
+        'throughput': float(len(latencies) * case.items_per_call / (latencies.sum() / 1e3)),
+    }
+
+
+def _reset_reward_context():
+    rewards._batch_context = {"texts": None, "format": [], "recipes": [], "rewards": {}}
+
+
+def _punkt_available() -> bool:
+    import nltk
+
+    try:
+        nltk.word_tokenize("a b")
+    except LookupError:
+        return False
+    return True
+
+
+def build_cases(n: int = 50, reward_batch: int = 16, eval_examples: int = 32, preprocess_rows: int = 64,
+                workdir: Optional[str] = None) -> List[Case]:
+    """Every benchmark case, on inputs generated with fixed seeds."""
+    completions = synthetic_completions(n)
+    cases = []
+    for kind in COMPLETION_KINDS:
+        cases.append(Case(f"check_format/{kind}", check_format, completions[kind]))
+    for kind in COMPLETION_KINDS:
+        cases.append(Case(f"parse_recipe_xml/{kind}", parse_recipe_xml, completions[kind]))
+    for kind in COMPLETION_KINDS:
+        cases.append(Case(f"_extract_recipe_xml/{kind}", extract_recipe_xml, completions[kind]))
+
+    # Reward batches mix every kind of completion, like a GRPO step does.
+    mixed = [text for kind in COMPLETION_KINDS for text in completions[kind][:reward_batch]]
+    random.Random(3).shuffle(mixed)
+    golden = synthetic_golden(reward_batch)
+    gold_kwargs = {
+        'parsed_ingredients': [row['parsed_ingredients'] for row in golden],
+        'ingredients_embeddings': [row['ingredients_embeddings'] for row in golden],
+        'instruction_steps': [row['instruction_steps'] for row in golden],
+        'instructions_embeddings': [row['instructions_embeddings'] for row in golden],
+    }
+    batches = [
+        [[{"role": "assistant", "content": text}] for text in mixed[i:i + reward_batch]]
+        for i in range(0, len(mixed) - reward_batch + 1, reward_batch)
+    ]
+    for name, reward in (("cosine_ingredients_reward", cosine_ingredients_reward),
+                         ("cosine_steps_reward", cosine_steps_reward)):
+        cases.append(Case(
+            name, lambda batch, reward=reward: reward(batch, **gold_kwargs), batches,
+            items_per_call=reward_batch, setup=_reset_reward_context,
+        ))
+
+    if _punkt_available():
+        from evals import compute_evals, compute_evals_batch
+
+        eval_golden = synthetic_golden(eval_examples, seed=4)
+        predictions = [parse_recipe_xml(text) for text in completions["valid"][:eval_examples]]
+        pairs = [(pred, gold) for pred, gold in zip(predictions, eval_golden) if pred]
+
+        def quiet_evals(pair):
+            with contextlib.redirect_stdout(io.StringIO()):
+                compute_evals(*pair)
+
+        cases.append(Case("compute_evals", quiet_evals, pairs))
+        cases.append(Case(
+            "compute_evals_batch",
+            lambda pairs: compute_evals_batch([p for p, _ in pairs], [g for _, g in pairs], n_bootstrap=200),
+            [pairs], items_per_call=len(pairs),
+        ))
+    else:
+        print("Skipping compute_evals: the NLTK punkt tokenizer is not installed")
+
+    if workdir is not None:
+        from datasets.utils.logging import disable_progress_bar
+
+        from utils import preprocess_dataset
+
+        disable_progress_bar()
+        dataset = fixture_dataset(preprocess_rows, workdir)
+
+        def quiet_preprocess(dataset):
+            with contextlib.redirect_stdout(io.StringIO()):
+                preprocess_dataset(dataset)
+
+        cases.append(Case("preprocess_dataset", quiet_preprocess, [dataset], items_per_call=len(dataset)))
+    return cases
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Baselines
+# ──────────────────────────────────────────────────────────────────────────────
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Descriptions of the cases that regressed past `threshold` against `baseline`."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = stats['p50_ms'] - base['p50_ms']
+        if stats['p50_ms'] > base['p50_ms'] * (1 + threshold) and slower > MIN_DELTA_MS:
+            regressions.append(f"{name}: p50 {base['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms")
+        elif stats['throughput'] * (1 + threshold) < base['throughput'] and slower > MIN_DELTA_MS:
+            regressions.append(f"{name}: throughput {base['throughput']:.1f} -> {stats['throughput']:.1f}/s")
+    return regressions
+
+
+def environment(embedder: str) -> dict:
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'numpy': np.__version__,
+        'embedder': embedder,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--n", type=int, default=50, help="completions of each kind")
+    parser.add_argument("--rows", type=int, default=64, help="rows of the preprocess_dataset fixture")
+    parser.add_argument("--embedder", choices=("hashing", "model"), default="hashing")
+    parser.add_argument("--save", metavar="JSON", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="fail on regressions against this baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.embedder == "hashing":
+        embeddings.set_embedder(RandomProjectionEncoder(), model_name="bench-random-projection")
+    embeddings.configure_embedding_cache(None)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = [case for case in build_cases(args.n, preprocess_rows=args.rows, workdir=workdir)
+                 if args.filter in case.name]
+        results = {}
+        print(f"{'case':<36}{'calls':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'items/s':>12}")
+        for case in cases:
+            stats = results[case.name] = time_case(case, args.repeat)
+            print(f"{case.name:<36}{stats['calls']:>7}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}"
+                  f"{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}{stats['throughput']:>12.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({'environment': environment(args.embedder), 'results': results}, f, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline['environment'] != environment(args.embedder):
+            print(f"Warning: baseline was recorded on {baseline['environment']}")
+        regressions = compare(results, baseline['results'], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Persistent, content-addressed cache for sentence embeddings.
+
+Vectors are keyed by ``sha1(model name + normalized text)`` and appended to a
+raw float32 file that is read back through ``np.memmap``.  A small in-process
+LRU sits in front of the memory map so hot strings ("1 cup sugar", "salt")
+never touch the disk after their first lookup.
+
+On-disk layout, one directory per model:
+
+    <cache_dir>/<model>/index.tsv     # "<key>\\t<row>" per line, append-only
+    <cache_dir>/<model>/vectors.f32   # rows of `dim` float32 values
+    <cache_dir>/<model>/.lock         # flock()ed while appending
+
+Several processes (GRPO reward workers) may share one directory: appends are
+serialised with a file lock and readers pick up rows written by others the
+next time they miss.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_MEMORY_ENTRIES = 50_000
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace; the cache key is built from this."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content address of `text` for `model_name`."""
+    payload = f"{model_name}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Memory-mapped float32 embedding store behind an LRU of at most
+    `max_memory_entries` vectors.
+
+    Usage:
+        cache = EmbeddingCache("~/.cache/inverse_cooking/embeddings", "all-MiniLM-L6-v2", 384)
+        vectors = cache.get_many(texts)      # list with None for misses
+        cache.put_many(missing_texts, new_vectors)
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int,
+                 max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.directory = os.path.join(os.path.expanduser(cache_dir), safe_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self._index_path = os.path.join(self.directory, "index.tsv")
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock_path = os.path.join(self.directory, ".lock")
+        for path in (self._index_path, self._vectors_path):
+            open(path, "ab").close()
+
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._memmap: Optional[np.memmap] = None
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._refresh_index()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # ------------------------------------------------------------------ reads
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for every text, or None where it is missing."""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        if any(key not in self._lru and key not in self._rows for key in keys):
+            # Another process may have written them since we last looked.
+            self._refresh_index()
+
+        vectors: List[Optional[np.ndarray]] = []
+        for key in keys:
+            vector = self._lookup(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            vectors.append(vector)
+        return vectors
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            return vector
+
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        vector = np.array(self._vector_rows(row + 1)[row])
+        self._remember(key, vector)
+        return vector
+
+    def _vector_rows(self, min_rows: int) -> np.memmap:
+        """Memory map of the vector file, re-mapped when it has grown."""
+        if self._memmap is None or self._memmap.shape[0] < min_rows:
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+            self._memmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                     shape=(rows, self.dim))
+        return self._memmap
+
+    def _refresh_index(self) -> None:
+        """Read index lines appended since the last refresh."""
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]  # ignore a half-written last line
+        for line in complete.splitlines():
+            key, row = line.decode("ascii").split("\t")
+            self._rows[key] = int(row)
+        self._index_offset += len(complete)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_entries:
+            self._lru.popitem(last=False)
+
+    # ----------------------------------------------------------------- writes
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Persist `vectors[i]` as the embedding of `texts[i]`."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+        new_vectors: Dict[str, np.ndarray] = {}
+        for text, vector in zip(texts, vectors):
+            key = cache_key(self.model_name, text)
+            self._remember(key, vector)
+            if key not in self._rows:
+                new_vectors[key] = vector
+        if not new_vectors:
+            return
+
+        with open(self._lock_path, "ab") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh_index()
+                pending = [(k, v) for k, v in new_vectors.items() if k not in self._rows]
+                if not pending:
+                    return
+                row_bytes = 4 * self.dim
+                size = os.path.getsize(self._vectors_path)
+                if size % row_bytes:
+                    # Drop a torn row left behind by a crashed writer.
+                    os.truncate(self._vectors_path, size - size % row_bytes)
+                first_row = size // row_bytes
+                with open(self._vectors_path, "ab") as f:
+                    f.write(np.stack([v for _, v in pending]).tobytes())
+                lines = "".join(f"{key}\t{first_row + i}\n" for i, (key, _) in enumerate(pending))
+                with open(self._index_path, "ab") as f:
+                    f.write(lines.encode("ascii"))
+                self._refresh_index()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def clear_memory(self) -> None:
+        """Drop the in-process LRU (the on-disk store is kept)."""
+        self._lru.clear()
@@ -0,0 +1,233 @@
+"""
+Columnar storage for ragged per-row embeddings.
+
+A column such as ``ingredients_embeddings`` holds a variable number of
+fixed-width vectors per recipe.  Stored as Python lists it becomes Arrow
+``list<list<double>>`` and every reader rebuilds one small array per item.
+Here the column is typed ``list<fixed_size_list<float32|float16>[dim]>``, so
+Arrow keeps a single flat buffer of values plus one offset per row, and
+`RaggedEmbeddings` exposes it as a ``(total_items, dim)`` NumPy matrix with
+row ``i`` being the zero-copy view ``values[offsets[i]:offsets[i + 1]]``.
+
+    from embedding_store import embedding_column
+    gold = embedding_column(dataset, "ingredients_embeddings")
+    gold[3]          # (n_3, dim) view, no copy
+    gold[10:42]      # RaggedEmbeddings of a contiguous batch, no copy
+
+`RaggedEmbeddings` is accepted wherever the reward functions take gold
+embeddings (``ingredients_embeddings=`` / ``instructions_embeddings=``).
+
+To keep the gold vectors of the whole dataset resident in every worker,
+`quantize` shrinks them to float16 (half the memory) or int8 codes with one
+float32 scale per vector (about a quarter).  An `Int8Embeddings` row is
+dequantized only when it is read, so just the current batch is ever held
+in float32:
+
+    gold = embedding_column(dataset, "ingredients_embeddings", dtype="int8")
+"""
+from collections.abc import Sequence
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+def embedding_feature(dim: int, dtype: str = "float32"):
+    """`datasets` feature of a ragged embedding column with `dim`-wide vectors."""
+    from datasets import List, Value
+
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype!r}")
+    return List(List(Value(dtype), length=dim))
+
+
+class RaggedEmbeddings(Sequence):
+    """
+    Variable-length groups of vectors backed by one ``(N, dim)`` matrix.
+
+    `values` holds the vectors of every row back to back and `offsets`
+    (length ``len(self) + 1``) delimits the rows.  Indexing returns views;
+    nothing is copied unless the constructor has to concatenate.
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        values = np.asarray(values)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if values.ndim != 2:
+            raise ValueError(f"values must be 2-D, got shape {values.shape}")
+        if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] < 0 or offsets[-1] > len(values) \
+                or np.any(np.diff(offsets) < 0):
+            raise ValueError("offsets must be a non-decreasing 1-D array within the values")
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_rows(cls, rows: Iterable, dim: Optional[int] = None, dtype=np.float32) -> "RaggedEmbeddings":
+        """Pack per-row vectors (arrays or nested lists; None counts as empty) with one copy."""
+        matrices = []
+        for row in rows:
+            matrix = np.asarray(row if row is not None else [], dtype=dtype)
+            if matrix.size and matrix.ndim == 1:
+                matrix = matrix.reshape(1, -1)
+            matrices.append(matrix)
+        if dim is None:
+            dim = next((m.shape[1] for m in matrices if m.size), 0)
+        matrices = [m if m.size else m.reshape(0, dim) for m in matrices]
+        offsets = np.zeros(len(matrices) + 1, dtype=np.int64)
+        np.cumsum([len(m) for m in matrices], out=offsets[1:])
+        values = np.concatenate(matrices) if matrices else np.zeros((0, dim), dtype=dtype)
+        return cls(values, offsets)
+
+    @classmethod
+    def from_arrow(cls, array: Union[pa.Array, pa.ChunkedArray]) -> "RaggedEmbeddings":
+        """
+        View a ``list<fixed_size_list<float>[dim]>`` Arrow array.  Zero-copy
+        for a single chunk without nulls (chunks are combined otherwise).
+        """
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks() if array.num_chunks != 1 else array.chunk(0)
+        if not pa.types.is_list(array.type) and not pa.types.is_large_list(array.type) \
+                or not pa.types.is_fixed_size_list(array.type.value_type):
+            raise TypeError(f"expected list<fixed_size_list<float>>, got {array.type}")
+        if array.null_count:
+            array = array.fill_null(pa.scalar([], array.type))
+
+        vectors = array.values                       # fixed_size_list child, unsliced
+        dim = array.type.value_type.list_size
+        flat = vectors.values.to_numpy(zero_copy_only=True)
+        matrix = flat[vectors.offset * dim:(vectors.offset + len(vectors)) * dim].reshape(-1, dim)
+        return cls(matrix, array.offsets.to_numpy(zero_copy_only=True))
+
+    def to_arrow(self) -> pa.ListArray:
+        """The ``list<fixed_size_list<float>[dim]>`` Arrow array of these rows."""
+        start, stop = self.offsets[0], self.offsets[-1]
+        flat = pa.array(np.ascontiguousarray(self.values[start:stop]).reshape(-1))
+        vectors = pa.FixedSizeListArray.from_arrays(flat, self.dim)
+        return pa.ListArray.from_arrays(pa.array(self.offsets - start, pa.int32()), vectors)
+
+    @property
+    def dim(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Number of vectors in every row."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.take(range(start, stop, step))
+            return RaggedEmbeddings(self.values, self.offsets[start:max(start, stop) + 1])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("RaggedEmbeddings index out of range")
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def take(self, indices: Iterable[int]) -> "RaggedEmbeddings":
+        """Rows at `indices`, packed into a new (copied) store."""
+        return RaggedEmbeddings.from_rows((self[i] for i in indices), dim=self.dim, dtype=self.dtype)
+
+    def __repr__(self) -> str:
+        return f"RaggedEmbeddings(rows={len(self)}, vectors={self.offsets[-1] - self.offsets[0]}, " \
+               f"dim={self.dim}, dtype={self.dtype})"
+
+
+class Int8Embeddings(Sequence):
+    """
+    Ragged embeddings quantized to int8 with a per-vector scale:
+    ``vector ≈ codes * scale`` where ``scale = max(|vector|) / 127``.
+
+    Indexing a row returns its dequantized ``(n_i, dim)`` float32 matrix;
+    slicing returns another `Int8Embeddings` sharing the same buffers.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, offsets: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+        self.offsets = offsets
+
+    @classmethod
+    def quantize(cls, store: RaggedEmbeddings) -> "Int8Embeddings":
+        values = store.values.astype(np.float32, copy=False)
+        scales = np.abs(values).max(axis=1, initial=0.0) / 127.0
+        scales[scales == 0.0] = 1.0
+        codes = np.rint(values / scales[:, np.newaxis]).astype(np.int8)
+        return cls(codes, scales.astype(np.float32), store.offsets)
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.codes.dtype
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Int8Embeddings only supports contiguous slices")
+            return Int8Embeddings(self.codes, self.scales, self.offsets[start:max(start, stop) + 1])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Int8Embeddings index out of range")
+        rows = slice(self.offsets[index], self.offsets[index + 1])
+        return self.codes[rows] * self.scales[rows, np.newaxis]
+
+    def dequantize(self) -> RaggedEmbeddings:
+        """The float32 `RaggedEmbeddings` these codes approximate."""
+        return RaggedEmbeddings(self.codes * self.scales[:, np.newaxis], self.offsets)
+
+    def __repr__(self) -> str:
+        return f"Int8Embeddings(rows={len(self)}, vectors={self.offsets[-1] - self.offsets[0]}, dim={self.dim})"
+
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+def quantize(store: RaggedEmbeddings, dtype: str) -> Union[RaggedEmbeddings, Int8Embeddings]:
+    """`store` in ``"float32"``, ``"float16"`` or ``"int8"`` (per-vector scale) precision."""
+    if dtype == "int8":
+        return Int8Embeddings.quantize(store)
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"dtype must be one of {QUANTIZATIONS}, got {dtype!r}")
+    return RaggedEmbeddings(store.values.astype(dtype, copy=False), store.offsets)
+
+
+def embedding_column(dataset, column: str, dtype: Optional[str] = None) -> Union[RaggedEmbeddings, Int8Embeddings]:
+    """
+    `RaggedEmbeddings` over one embedding column of a `datasets.Dataset`
+    (respecting any ``select``/``shuffle`` indices mapping, which forces a
+    gather; a plain dataset is read without copying).  With `dtype` set,
+    the column is converted to that precision (see `quantize`).
+    """
+    store = RaggedEmbeddings.from_arrow(dataset.with_format("arrow")[column])
+    return quantize(store, dtype) if dtype else store
@@ -0,0 +1,314 @@
+"""
+Batched sentence-embedding service shared by utils, rewards and evals.
+
+Callers hand over *all* the strings they need for a batch (a whole GRPO reward
+batch, a chunk of dataset rows, every predicted line of a recipe).  The strings
+are flattened, de-duplicated, encoded in one or a few large ``embedder.encode``
+calls and the vectors are scattered back to the caller's layout.
+
+Every encode goes through a persistent ``EmbeddingCache`` (see
+embedding_cache.py) unless it is disabled with ``configure_embedding_cache``
+or ``EMBEDDING_CACHE_DIR=""``.
+
+The SentenceTransformer itself is a process-wide singleton that is only built
+on first use (``get_embedder``), so importing this module - and the parsing or
+format-reward code that depends on it - does not pull in torch.  The model and
+device come from ``configure_embedder`` or the ``EMBEDDING_MODEL`` /
+``EMBEDDING_DEVICE`` environment variables.
+
+Concurrent callers (eval threads, reward functions, generation callbacks)
+can share model calls through a `MicroBatcher`: with
+``configure_micro_batching(max_wait_ms=...)`` or ``EMBEDDING_MICROBATCH_MS``
+set, every model call is queued, and requests arriving within the wait
+window (up to ``max_batch_size`` strings) are encoded together.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import instrumentation
+from embedding_cache import DEFAULT_MAX_MEMORY_ENTRIES, EmbeddingCache
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Number of strings sent to the model per forward pass.
+DEFAULT_BATCH_SIZE = 256
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "inverse_cooking", "embeddings")
+
+_model_name = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL_NAME)
+_device = os.getenv("EMBEDDING_DEVICE") or None
+_embedder = None
+_embedder_lock = threading.Lock()
+
+_cache: Optional[EmbeddingCache] = None
+_cache_configured = False
+# EmbeddingCache is not thread-safe; model calls happen outside this lock.
+_cache_lock = threading.Lock()
+
+DEFAULT_MICROBATCH_SIZE = 1024
+_batcher: Optional["MicroBatcher"] = None
+_batcher_configured = False
+
+
+def configure_embedder(model_name: Optional[str] = None, device: Optional[str] = None) -> None:
+    """
+    Choose the model and device used by `get_embedder`.  An already loaded
+    model is dropped and rebuilt lazily with the new settings.
+    """
+    global _model_name, _device, _embedder, _cache_configured
+    with _embedder_lock:
+        if model_name is not None:
+            _model_name = model_name
+        if device is not None:
+            _device = device
+        _embedder = None
+        _cache_configured = False  # cache entries are keyed by model name
+
+
+def set_embedder(model, model_name: Optional[str] = None) -> None:
+    """
+    Install an already constructed encoder as the shared embedder.  It only
+    needs SentenceTransformer's `encode` and `get_sentence_embedding_dimension`.
+    """
+    global _model_name, _embedder, _cache_configured
+    with _embedder_lock:
+        _embedder = model
+        if model_name is not None:
+            _model_name = model_name
+        _cache_configured = False
+
+
+def get_model_name() -> str:
+    return _model_name
+
+
+def get_embedder():
+    """Return the shared SentenceTransformer, loading it on first call."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(_model_name, device=_device)
+    return _embedder
+
+
+def embedding_dim() -> int:
+    """Dimensionality of the vectors produced by the shared embedder."""
+    return get_embedder().get_sentence_embedding_dimension()
+
+
+def configure_embedding_cache(cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                              max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES) -> Optional[EmbeddingCache]:
+    """
+    (Re)configure the cache used by `encode_texts`.  Pass ``cache_dir=None``
+    to encode without any caching.
+    """
+    global _cache, _cache_configured
+    _cache = EmbeddingCache(cache_dir, _model_name, embedding_dim(), max_memory_entries) if cache_dir else None
+    _cache_configured = True
+    return _cache
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The active embedding cache, created from the environment on first use."""
+    if not _cache_configured:
+        configure_embedding_cache(
+            os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR),
+            int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_MEMORY_ENTRIES)),
+        )
+    return _cache
+
+
+class MicroBatcher:
+    """
+    Thread-safe queue that coalesces encode requests from concurrent callers.
+
+    A background thread takes the first pending request, keeps collecting
+    requests for up to `max_wait_ms` or until `max_batch_size` strings are
+    gathered, runs `encode_fn` once on all of them and resolves each
+    caller's future with its own rows.  Requests queued while the model is
+    busy are picked up by the next batch without any extra wait.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = DEFAULT_MICROBATCH_SIZE, max_wait_ms: float = 2.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embedding-microbatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> Future:
+        """Queue `texts`; the future resolves to their ``(len(texts), dim)`` matrix."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((list(texts), batch_size, future))
+        return future
+
+    def encode(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        return self.submit(texts, batch_size).result()
+
+    def close(self) -> None:
+        """Finish the queued requests and stop the worker thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self, first) -> tuple:
+        """The batch started by `first`, and the request that would overflow it (if any)."""
+        requests, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                # Take whatever queued up while the model was busy, then wait
+                # out the rest of the window for stragglers.
+                request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                # Starts the next batch; a request over the cap on its own runs alone.
+                return requests, request
+            requests.append(request)
+            size += len(request[0])
+        return requests, None
+
+    def _run(self) -> None:
+        carried = None
+        while True:
+            first = carried if carried is not None else self._queue.get()
+            if first is None:
+                return
+            requests, carried = self._collect(first)
+            texts = [text for request in requests for text in request[0]]
+            instrumentation.increment("embeddings.microbatch.batches")
+            instrumentation.increment("embeddings.microbatch.requests", len(requests))
+            try:
+                vectors = self.encode_fn(texts, max(request[1] for request in requests))
+            except BaseException as e:
+                for _, _, future in requests:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_texts, _, future in requests:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+
+def configure_micro_batching(max_wait_ms: Optional[float] = 2.0,
+                             max_batch_size: int = DEFAULT_MICROBATCH_SIZE) -> Optional[MicroBatcher]:
+    """
+    Route every model call through a shared `MicroBatcher` (or stop doing
+    so with ``max_wait_ms=None``).
+    """
+    global _batcher, _batcher_configured
+    previous = _batcher
+    _batcher = MicroBatcher(_run_model, max_batch_size, max_wait_ms) if max_wait_ms is not None else None
+    _batcher_configured = True
+    if previous is not None:
+        previous.close()
+    return _batcher
+
+
+def get_micro_batcher() -> Optional[MicroBatcher]:
+    """The active micro-batcher, created from ``EMBEDDING_MICROBATCH_MS`` on first use."""
+    if not _batcher_configured:
+        wait_ms = os.getenv("EMBEDDING_MICROBATCH_MS", "")
+        configure_micro_batching(
+            float(wait_ms) if wait_ms else None,
+            int(os.getenv("EMBEDDING_MICROBATCH_SIZE", DEFAULT_MICROBATCH_SIZE)),
+        )
+    return _batcher
+
+
+def _run_model(texts: Sequence[str], batch_size: int) -> np.ndarray:
+    """One call of the shared model on `texts`, encoding duplicate strings only once."""
+    unique_texts = list(dict.fromkeys(texts))
+    instrumentation.increment("embeddings.texts_encoded", len(unique_texts))
+    with instrumentation.stage("embeddings.model_encode"):
+        vectors = get_embedder().encode(
+            unique_texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(unique_texts), -1)
+
+    if len(unique_texts) == len(texts):
+        return vectors
+    position = {text: i for i, text in enumerate(unique_texts)}
+    return vectors[[position[text] for text in texts]]
+
+
+def _encode_uncached(texts: Sequence[str], batch_size: int) -> np.ndarray:
+    """Encode `texts` with the model, through the micro-batcher when one is configured."""
+    batcher = get_micro_batcher()
+    if batcher is None:
+        return _run_model(texts, batch_size)
+    return batcher.encode(texts, batch_size)
+
+
+def encode_texts(texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    Encode a flat list of strings into a ``(len(texts), dim)`` float32 matrix.
+
+    Cached strings are served from the embedding cache; the remaining ones are
+    encoded together (duplicates only once) and written back to it.  Row ``i``
+    of the result always corresponds to ``texts[i]``.
+    """
+    if len(texts) == 0:
+        return np.zeros((0, embedding_dim()), dtype=np.float32)
+
+    cache = get_embedding_cache()
+    if cache is None:
+        return _encode_uncached(texts, batch_size)
+
+    with _cache_lock:
+        cached = cache.get_many(texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+    instrumentation.increment("embeddings.cache_hits", len(texts) - sum(vector is None for vector in cached))
+    instrumentation.increment("embeddings.cache_misses", len(missing))
+    if not missing:
+        return np.stack(cached)
+
+    new_vectors = _encode_uncached(missing, batch_size)
+    with _cache_lock:
+        cache.put_many(missing, new_vectors)
+    position = {text: i for i, text in enumerate(missing)}
+    return np.stack([
+        vector if vector is not None else new_vectors[position[text]]
+        for text, vector in zip(texts, cached)
+    ])
+
+
+def encode_nested(groups: Sequence[Sequence[str]], batch_size: int = DEFAULT_BATCH_SIZE) -> List[np.ndarray]:
+    """
+    Gather every string of every group, encode them together and scatter back.
+
+    ex) groups = [["1 cup sugar", "2 eggs"], [], ["1 cup sugar"]]
+        output = [array (2, dim), array (0, dim), array (1, dim)]
+
+    ``None`` groups are treated as empty.
+    """
+    sizes = [len(group) if group else 0 for group in groups]
+    flat = [text for group in groups if group for text in group]
+    vectors = encode_texts(flat, batch_size=batch_size)
+
+    scattered = []
+    start = 0
+    for size in sizes:
+        scattered.append(vectors[start:start + size])
+        start += size
+    return scattered
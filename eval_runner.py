@@ -0,0 +1,151 @@
+"""
+Resumable evaluation runs.
+
+The baseline notebook keeps ``responses``, ``y_pred`` and ``result`` in
+memory, so a crash half-way through an eval throws away every generation
+made so far.  `run_eval` instead appends one JSON line per finished example
+(its id, raw response, parsed recipe and metrics) to a results file as soon
+as the example is scored.  Rerunning with the same file skips the ids that
+are already there, and the summary is always computed from the file:
+
+    from eval_runner import run_eval
+    from images import image_message
+    summary = run_eval(
+        test_dataset, "results/llama-vision.jsonl",
+        make_messages=lambda example: image_message(prompt, example),
+        max_concurrency=8,
+    )
+
+Generations that fail (after the client's own retries) are not recorded and
+are retried on the next run.  A line cut short by a crash is ignored.
+"""
+import json
+import os
+from typing import Callable, Dict, Iterator, Optional
+
+from evals import aggregate_metrics, compute_evals_batch
+from generation import generate_responses
+from utils import parse_recipe_xml
+
+
+def iter_results(path: str) -> Iterator[dict]:
+    """Records of a results file in write order, skipping a truncated last line."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    """Records of a results file keyed by example id (the latest record wins)."""
+    return {record["id"]: record for record in iter_results(path)}
+
+
+def _has_partial_line(path: str) -> bool:
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _append(f, records) -> None:
+    # One write per batch; a crash can only truncate the last line.
+    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def summarize_results(path: str, n_bootstrap: int = 1000, confidence: float = 0.95, seed: int = 0) -> dict:
+    """
+    Corpus summary of a results file: the number of examples, how many
+    responses could not be parsed, and the mean and bootstrap confidence
+    interval of every metric (as in `compute_evals_batch`).
+    """
+    records = list(load_results(path).values())
+    return {
+        'n': len(records),
+        'unparsed': sum(record['prediction'] is None for record in records),
+        'aggregate': aggregate_metrics([record['metrics'] for record in records], n_bootstrap, confidence, seed),
+    }
+
+
+def _example_ids(dataset, id_column: Optional[str]) -> list:
+    if id_column is None:
+        return list(range(len(dataset)))
+    if hasattr(dataset, "column_names"):
+        # One column read; indexing rows would decode images and embeddings too.
+        return dataset[id_column]
+    return [example[id_column] for example in dataset]
+
+
+def run_eval(
+    dataset,
+    results_path: str,
+    make_messages: Callable[[dict], list],
+    id_column: Optional[str] = None,
+    batch_size: int = 32,
+    generate: Optional[Callable[[list], list]] = None,
+    num_proc: Optional[int] = None,
+    n_bootstrap: int = 1000,
+    **generation_kwargs,
+) -> dict:
+    """
+    Generate, parse and score every example of `dataset`, appending each
+    result to `results_path` (JSONL), then summarize the file.
+
+    Args:
+        dataset: Preprocessed golden recipes (a Dataset or list of dicts).
+        results_path: Append-only results file; ids already in it are skipped.
+        make_messages: Builds the chat messages of one example.
+        id_column: Column holding a stable example id (row position if None).
+        batch_size: Examples generated and scored per flush to disk.
+        generate: Maps a list of conversations to responses (exceptions
+            allowed in place of a response); defaults to
+            `generation.generate_responses` with `generation_kwargs`.
+        num_proc: Worker processes for BLEU/ROUGE (see `compute_evals_batch`).
+        n_bootstrap: Bootstrap resamples of the summary.
+
+    Returns:
+        `summarize_results` of the whole file.
+    """
+    if generate is None:
+        def generate(batch):
+            return generate_responses(batch, return_exceptions=True, **generation_kwargs)
+
+    ids = [str(example_id) for example_id in _example_ids(dataset, id_column)]
+    done = set(load_results(results_path))
+    pending = [i for i, example_id in enumerate(ids) if example_id not in done]
+    print(f"{len(done & set(ids))} of {len(ids)} examples already evaluated, {len(pending)} to go...")
+
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+    failed = 0
+    with open(results_path, "a", encoding="utf-8") as f:
+        if _has_partial_line(results_path):
+            # Close a line left half-written by a crash so it stays one bad line.
+            f.write("\n")
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            golden = [dataset[i] for i in batch]
+            responses = generate([make_messages(example) for example in golden])
+
+            scored = [k for k, response in enumerate(responses) if not isinstance(response, BaseException)]
+            failed += len(batch) - len(scored)
+            if not scored:
+                continue
+            predictions = [parse_recipe_xml(responses[k]) if responses[k] else None for k in scored]
+            metrics = compute_evals_batch(
+                predictions, [golden[k] for k in scored], num_proc=num_proc, n_bootstrap=0
+            )['examples']
+            _append(f, (
+                {'id': ids[batch[k]], 'response': responses[k], 'prediction': prediction, 'metrics': example_metrics}
+                for k, prediction, example_metrics in zip(scored, predictions, metrics)
+            ))
+            print(f"Evaluated {min(start + batch_size, len(pending))}/{len(pending)}")
+    if failed:
+        print(f"Warning: {failed} generations failed and will be retried on the next run")
+    return summarize_results(results_path, n_bootstrap=n_bootstrap)
@@ -1,13 +1,20 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import functools
+import math
+from collections import Counter
+
 import nltk
+from nltk.translate import bleu_score as nltk_bleu
 from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-from rouge_score import rouge_scorer
+from nltk.util import ngrams
+from rouge_score import rouge_scorer, tokenize as rouge_tokenize
+from rouge_score.tokenizers import Tokenizer
 import numpy as np
 
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+import instrumentation
+from embeddings import encode_nested, encode_texts
+from similarity import as_matrix, best_match
 
-def compute_top_cosine_similarity(pred_string, reference_strings, reference_embeddings):
+def compute_top_cosine_similarity(pred_string, reference_strings, reference_embeddings, pred_embedding=None):
     """
     Compute the highest cosine similarity between an input string embedding and a list of string embeddings.
     ex) input_string = "Add 1 cup of rice"
@@ -19,6 +26,8 @@ def compute_top_cosine_similarity(pred_string, reference_strings, reference_embe
     Args:
         string: the string that we want to find the best match for (string)
         list_of_strings: List of strings (list of strings)
+        pred_embedding: optional precomputed embedding of pred_string, so callers
+            can encode all their predictions in one batch
     
     Returns:
         A tuple containing:
@@ -26,63 +35,226 @@ def compute_top_cosine_similarity(pred_string, reference_strings, reference_embe
         - best_idx: The index of the best matching string
         - best_string: The text of the best matching string
     """
-    # Ensure the step_embedding is 2D (batch size 1)
-
+    if pred_embedding is None:
+        pred_embedding = encode_texts([pred_string])
 
-    pred_sentence_embedding = embedder.encode([pred_string])
+    # Single normalized (1 × n_refs) product instead of one call per reference.
+    scores, indices = best_match(as_matrix(pred_embedding), as_matrix(reference_embeddings))
+    best_score, best_idx = scores[0], int(indices[0])
+    if best_idx < 0:
+        return best_score, best_idx, None
 
-    
-    if len(pred_sentence_embedding.shape) == 1:
-        pred_sentence_embedding = pred_sentence_embedding.reshape(1, -1)
-    
-    best_score = -1  # Initialize with impossible score
-    best_idx = -1
-    
-    # Compute similarity with each golden step
-    for i, reference_embedding in enumerate(reference_embeddings):
-        # Convert list to numpy array
-        reference_embedding_np = np.array(reference_embedding)
-        
-        # Ensure golden embedding is 2D
-        if len(reference_embedding_np.shape) == 1:
-            reference_embedding_np = reference_embedding_np.reshape(1, -1)
-        
-        # Compute cosine similarity
-        similarity = cosine_similarity(pred_sentence_embedding, reference_embedding_np)[0][0]
-        
-        # Update if this is the best score so far
-        if similarity > best_score:
-            best_score = similarity
-            best_idx = i
-    
     return best_score, best_idx, reference_strings[best_idx]
 
 
+_BLEU_WEIGHTS = (0.25, 0.25, 0.25, 0.25)
+_BLEU_SMOOTHING = SmoothingFunction().method4
+
+
 def compute_bleu_score(reference, hypothesis):
-    smoothie = SmoothingFunction().method4
     reference_tokens = [nltk.word_tokenize(reference.lower())]
     hypothesis_tokens = nltk.word_tokenize(hypothesis.lower())
-    return sentence_bleu(reference_tokens, hypothesis_tokens, smoothing_function=smoothie)
+    return sentence_bleu(reference_tokens, hypothesis_tokens, smoothing_function=_BLEU_SMOOTHING)
+
+
+def bleu_tokenize(text):
+    """Tokenization used by every BLEU score here (lower-cased NLTK word tokens)."""
+    return nltk.word_tokenize(text.lower())
+
+
+class BleuScorer:
+    """
+    Sentence BLEU of many hypotheses against one reference, identical to
+    `compute_bleu_score` (BLEU-4, smoothing method 4) but with the reference
+    tokenized and its n-grams counted once, in the constructor.
+
+        scorer = BleuScorer(golden_steps_string)
+        scores = scorer.score_many(pred_steps)
+    """
+
+    def __init__(self, reference):
+        tokens = bleu_tokenize(reference)
+        self.length = len(tokens)
+        self.ngram_counts = [
+            Counter(ngrams(tokens, n)) if len(tokens) >= n else Counter()
+            for n in range(1, len(_BLEU_WEIGHTS) + 1)
+        ]
+
+    def score_tokens(self, hypothesis_tokens):
+        """BLEU of an already tokenized hypothesis (see `bleu_tokenize`)."""
+        # Same steps as nltk's corpus_bleu for a single reference/hypothesis pair.
+        hyp_len = len(hypothesis_tokens)
+        p_n = []
+        for n, reference_counts in enumerate(self.ngram_counts, start=1):
+            counts = Counter(ngrams(hypothesis_tokens, n)) if hyp_len >= n else Counter()
+            numerator = sum(min(count, reference_counts[ngram]) for ngram, count in counts.items())
+            p_n.append(nltk_bleu.Fraction(numerator, max(1, sum(counts.values())), _normalize=False))
+        if p_n[0].numerator == 0:
+            return 0
+
+        bp = nltk_bleu.brevity_penalty(self.length, hyp_len)
+        p_n = _BLEU_SMOOTHING(p_n, references=None, hypothesis=hypothesis_tokens, hyp_len=hyp_len)
+        s = (w_i * math.log(p_i) for w_i, p_i in zip(_BLEU_WEIGHTS, p_n) if p_i > 0)
+        return bp * math.exp(math.fsum(s))
+
+    def score(self, hypothesis):
+        return self.score_tokens(bleu_tokenize(hypothesis))
+
+    def score_many(self, hypotheses):
+        return [self.score(hypothesis) for hypothesis in hypotheses]
+
+
+class BleuReferenceSet:
+    """One `BleuScorer` per reference item, for best-match BLEU of predicted items."""
+
+    def __init__(self, references):
+        self.scorers = [BleuScorer(reference) for reference in references]
+
+    def best_score(self, hypothesis):
+        """`compute_best_item_bleu` of `hypothesis`, tokenized once for all references."""
+        tokens = bleu_tokenize(hypothesis)
+        best_score = 0
+        for scorer in self.scorers:
+            score = scorer.score_tokens(tokens)
+            if score > best_score:
+                best_score = score
+        return best_score
+
+    def average_best_score(self, hypotheses):
+        """`compute_ingredient_bleu_score` of the predicted items."""
+        scores = [self.best_score(hypothesis) for hypothesis in hypotheses]
+        return sum(scores) / len(scores) if scores else 0
+
+
+class _CachedStemmer:
+    """Porter stemmer with a per-word memo (recipes reuse a small vocabulary)."""
+
+    def __init__(self):
+        from nltk.stem import porter
+
+        self.stem = functools.lru_cache(maxsize=100_000)(porter.PorterStemmer().stem)
+
+
+class _StemmingTokenizer(Tokenizer):
+    """rouge_score's default tokenizer with ``use_stemmer=True``, memoising stems."""
+
+    def __init__(self):
+        self._stemmer = _CachedStemmer()
+
+    def tokenize(self, text):
+        return rouge_tokenize.tokenize(text, self._stemmer)
+
+
+_rouge_tokenizer = _StemmingTokenizer()
+_rouge_scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], tokenizer=_rouge_tokenizer)
 
 
 def compute_rouge_scores(reference, hypothesis):
-    scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
-    return scorer.score(reference, hypothesis)
+    return _rouge_scorer.score(reference, hypothesis)
+
+
+def _fmeasure(precision, recall):
+    """`rouge_score.scoring.fmeasure`, element-wise."""
+    total = precision + recall
+    return np.where(total > 0, 2 * precision * recall / np.where(total > 0, total, 1), 0.0)
+
+
+class RougeReferenceSet:
+    """
+    ROUGE-1 and ROUGE-L F-measures (stemmed, as in `compute_rouge_scores`) of
+    hypotheses against a fixed list of references.
+
+    Every reference is tokenized once, into integer ids laid out back to back
+    (each preceded by a 0 sentinel) so one hypothesis is scored against all
+    of them in a single pass: ROUGE-1 from a (references x vocabulary) count
+    matrix, ROUGE-L from a column-wise LCS recurrence,
+
+        L[i, j] = max(L[i, j-1], L[i-1, j], L[i-1, j-1] + match(i, j)),
+
+    where the L[i-1, j] term is a running maximum (np.maximum.accumulate)
+    along the concatenated references, offset per reference so that it never
+    crosses a boundary.
+    """
+
+    def __init__(self, references):
+        self._vocabulary = {}
+        tokens = [[self._id(token) for token in _rouge_tokenizer.tokenize(reference)] for reference in references]
+        self.lengths = np.array([len(t) for t in tokens], dtype=np.int64)
+
+        # Concatenated layout: [0, ref_0 ..., 0, ref_1 ..., ...]
+        self._ids = np.full(len(tokens) + int(self.lengths.sum()), -1, dtype=np.int64)
+        starts = np.cumsum(self.lengths + 1) - (self.lengths + 1)
+        for start, ids in zip(starts, tokens):
+            self._ids[start + 1:start + 1 + len(ids)] = ids
+        self._ends = starts + self.lengths  # position of each reference's last token
+        # Offsets that keep the running maximum inside each reference
+        self._base = np.repeat(starts, self.lengths + 1)
+
+        self._counts = np.zeros((len(tokens), max(len(self._vocabulary), 1)), dtype=np.int64)
+        for row, ids in enumerate(tokens):
+            np.add.at(self._counts[row], ids, 1)
+
+    def _id(self, token):
+        return self._vocabulary.setdefault(token, len(self._vocabulary))
+
+    def _lcs_lengths(self, hypothesis_ids):
+        column = np.zeros(len(self._ids), dtype=np.int64)
+        candidate = np.empty_like(column)
+        for token in hypothesis_ids:
+            candidate[0] = 0
+            np.add(column[:-1], self._ids[1:] == token, out=candidate[1:])
+            np.maximum(candidate, column, out=candidate)
+            candidate[self._ids == -1] = 0  # sentinels stay 0
+            column = np.maximum.accumulate(candidate + self._base) - self._base
+        return column[self._ends]
+
+    def score(self, hypothesis):
+        """``(rouge1, rougeL)`` F-measure arrays, one entry per reference."""
+        if len(self.lengths) == 0:
+            return np.zeros(0), np.zeros(0)
+        tokens = _rouge_tokenizer.tokenize(hypothesis)
+        n_tokens = len(tokens)
+        known = [self._vocabulary[token] for token in tokens if token in self._vocabulary]
+
+        # ROUGE-1: clipped unigram overlap
+        if known:
+            ids, counts = np.unique(known, return_counts=True)
+            overlap = np.minimum(self._counts[:, ids], counts).sum(axis=1)
+        else:
+            overlap = np.zeros(len(self.lengths), dtype=np.int64)
+        rouge1 = _fmeasure(overlap / max(n_tokens, 1), overlap / np.maximum(self.lengths, 1))
+
+        # ROUGE-L: 0 when either side is empty
+        if n_tokens == 0:
+            return rouge1, np.zeros(len(self.lengths))
+        lcs = self._lcs_lengths([self._vocabulary.get(token, -2) for token in tokens])
+        rouge_l = _fmeasure(lcs / n_tokens, lcs / np.maximum(self.lengths, 1))
+        rouge_l[self.lengths == 0] = 0.0
+        return rouge1, rouge_l
+
+    def best(self, hypothesis):
+        """`compute_best_item_rouge`: the pair with the best (rouge1 + rougeL) / 2."""
+        if len(self.lengths) == 0:
+            return 0, 0
+        rouge1, rouge_l = self.score(hypothesis)
+        average = (rouge1 + rouge_l) / 2
+        best = int(np.argmax(average))
+        if not average[best] > 0:
+            return 0, 0
+        return float(rouge1[best]), float(rouge_l[best])
+
+    def average_best(self, hypotheses):
+        """`compute_ingredient_rouge_score` of the predicted items."""
+        if not hypotheses:
+            return 0, 0
+        best = [self.best(hypothesis) for hypothesis in hypotheses]
+        return sum(r1 for r1, _ in best) / len(best), sum(rl for _, rl in best) / len(best)
 
 def compute_best_item_bleu(pred_item, reference_items):
-    best_score = 0
-    for ref_item in reference_items:
-        score = compute_bleu_score(ref_item, pred_item) 
-        if score > best_score:
-            best_score = score
-    return best_score
+    return BleuReferenceSet(reference_items).best_score(pred_item)
 
 def compute_ingredient_bleu_score(pred_ingredients, golden_ingredients):
-    scores = []
-    for pred in pred_ingredients:
-        best = compute_best_item_bleu(pred, golden_ingredients)
-        scores.append(best)
-    return sum(scores) / len(scores) if scores else 0
+    return BleuReferenceSet(golden_ingredients).average_best_score(pred_ingredients)
 
 
 def compute_best_item_rouge(pred_item, reference_items):
@@ -90,31 +262,55 @@ def compute_best_item_rouge(pred_item, reference_items):
     For a single predicted ingredient, compute ROUGE scores against each reference and return the best match.
     Here we take the best average of ROUGE-1 and ROUGE-L f-measures.
     """
-    best_avg = 0
-    best_rouge1 = 0
-    best_rougeL = 0
-    for ref_item in reference_items:
-        scores = compute_rouge_scores(ref_item, pred_item)
-        avg_score = (scores['rouge1'].fmeasure + scores['rougeL'].fmeasure) / 2
-        if avg_score > best_avg:
-            best_avg = avg_score
-            best_rouge1 = scores['rouge1'].fmeasure
-            best_rougeL = scores['rougeL'].fmeasure
-    return best_rouge1, best_rougeL
+    return RougeReferenceSet(reference_items).best(pred_item)
 
 def compute_ingredient_rouge_score(pred_ingredients, reference_ingredients):
     """
     Compute the average best-match ROUGE scores (both rouge1 and rougeL) for all predicted ingredients.
     """
-    rouge1_scores = []
-    rougeL_scores = []
-    for pred in pred_ingredients:
-        r1, rL = compute_best_item_rouge(pred, reference_ingredients)
-        rouge1_scores.append(r1)
-        rougeL_scores.append(rL)
-    avg_r1 = sum(rouge1_scores) / len(rouge1_scores) if rouge1_scores else 0
-    avg_rL = sum(rougeL_scores) / len(rougeL_scores) if rougeL_scores else 0
-    return avg_r1, avg_rL
+    return RougeReferenceSet(reference_ingredients).average_best(pred_ingredients)
+
+def _average(values):
+    return sum(values) / len(values) if values else 0
+
+
+def _cosine_metrics(pred_steps_embeddings, pred_ingredients_embeddings, golden_recipe):
+    """Average best-match cosine similarity of the predicted steps and ingredients."""
+    # Best golden match for every predicted line in one matrix product per field.
+    step_scores, _ = best_match(pred_steps_embeddings, as_matrix(golden_recipe['instructions_embeddings']))
+    ingredient_scores, _ = best_match(pred_ingredients_embeddings, as_matrix(golden_recipe['ingredients_embeddings']))
+    return {
+        'steps': float(_average(list(step_scores))),
+        'ingredients': float(_average(list(ingredient_scores))),
+    }
+
+
+def _bleu_metrics(pred_steps, pred_ingredients, golden_steps, golden_ingredients):
+    # For steps, use the whole concatenated string (tokenized once).
+    bleu_steps = _average(BleuScorer(" ".join(golden_steps)).score_many(pred_steps))
+    # For ingredients, use per-item best-match BLEU.
+    bleu_ingredients = BleuReferenceSet(golden_ingredients).average_best_score(pred_ingredients)
+    return {"steps": bleu_steps, "ingredients": bleu_ingredients}
+
+
+def _rouge_metrics(pred_steps, pred_ingredients, golden_steps, golden_ingredients):
+    # For steps, compute ROUGE per step against the whole instructions
+    # (stemmed once).
+    golden_steps_rouge = RougeReferenceSet([" ".join(golden_steps)])
+    step_scores = [golden_steps_rouge.score(step) for step in pred_steps]
+    # For ingredients, use per-item best-match ROUGE.
+    rouge_ing_r1, rouge_ing_rL = RougeReferenceSet(golden_ingredients).average_best(pred_ingredients)
+    return {
+        'steps': {
+            'rouge1': _average([float(rouge1[0]) for rouge1, _ in step_scores]),
+            'rougeL': _average([float(rougeL[0]) for _, rougeL in step_scores]),
+        },
+        'ingredients': {
+            'rouge1': rouge_ing_r1,
+            'rougeL': rouge_ing_rL,
+        }
+    }
+
 
 def compute_evals(pred_recipe, golden_recipe):
     """
@@ -126,79 +322,159 @@ def compute_evals(pred_recipe, golden_recipe):
       * Cosine Similarity (per-item best match)
       * BLEU Score (steps: whole string; ingredients: per-item average)
       * ROUGE Scores (steps: per-item; ingredients: per-item best match averaged)
+    
+    To evaluate many predictions at once use `compute_evals_batch`.
     """
     # Assume these fields are lists of strings.
-    pred_steps_list = pred_recipe['steps']
-    golden_steps_list = golden_recipe['instruction_steps']
-    pred_ingredients_list = pred_recipe['ingredients']
-    golden_ingredients_list = golden_recipe['parsed_ingredients']
-
-    # Concatenate entire instructions for full-string comparisons.
-    pred_steps_string = " ".join(pred_steps_list)
-    golden_steps_string = " ".join(golden_steps_list)
-    # For ingredients, we'll use the list directly for per-item matching.
-
-    golden_steps_embeddings = golden_recipe['instructions_embeddings']
-    golden_ingredients_embeddings = golden_recipe['ingredients_embeddings']
+    texts = (
+        pred_recipe['steps'],
+        pred_recipe['ingredients'],
+        golden_recipe['instruction_steps'],
+        golden_recipe['parsed_ingredients'],
+    )
 
     print("Calculating cosine similarity...")
-    # --- Cosine Similarity ---
-    cosine_scores = {"steps": [], "ingredients": []}
-    for step in pred_steps_list:
-        score, _, _ = compute_top_cosine_similarity(step, golden_steps_list, golden_steps_embeddings)
-        cosine_scores["steps"].append(score)
-    for ingredient in pred_ingredients_list:
-        score, _, _ = compute_top_cosine_similarity(ingredient, golden_ingredients_list, golden_ingredients_embeddings)
-        cosine_scores["ingredients"].append(score)
+    # Encode every predicted step and ingredient in one batch.
+    with instrumentation.stage("evals.cosine"):
+        pred_steps_embeddings, pred_ingredients_embeddings = encode_nested([texts[0], texts[1]])
+        cosine_scores = _cosine_metrics(pred_steps_embeddings, pred_ingredients_embeddings, golden_recipe)
 
     print("Calculating BLEU scores...")
-    # --- BLEU Scores ---
-    bleu_scores = {"steps": None, "ingredients": None}
-    # For steps, use the whole concatenated string.
-    step_bleu_list = []
-    for step in pred_steps_list:
-        score = compute_bleu_score(golden_steps_string, step)
-        step_bleu_list.append(score)
-    bleu_steps = sum(step_bleu_list) / len(step_bleu_list) if step_bleu_list else 0
-    # For ingredients, use per-item best-match BLEU.
-    bleu_ingredients = compute_ingredient_bleu_score(pred_ingredients_list, golden_ingredients_list)
-    bleu_scores["steps"] = bleu_steps
-    bleu_scores["ingredients"] = bleu_ingredients
+    with instrumentation.stage("evals.bleu"):
+        bleu_scores = _bleu_metrics(*texts)
 
     print("Calculating ROUGE scores...")
-    # --- ROUGE Scores ---
-    rouge_scores = {"steps": {"rouge1": [], "rougeL": []}, "ingredients": {"rouge1": None, "rougeL": None}}
-    # For steps, compute ROUGE per step against the whole instructions.
-    for step in pred_steps_list:
-        scores = compute_rouge_scores(golden_steps_string, step)
-        rouge_scores["steps"]["rouge1"].append(scores['rouge1'].fmeasure)
-        rouge_scores["steps"]["rougeL"].append(scores['rougeL'].fmeasure)
-    rouge_steps_r1 = sum(rouge_scores["steps"]["rouge1"]) / len(rouge_scores["steps"]["rouge1"]) if rouge_scores["steps"]["rouge1"] else 0
-    rouge_steps_rL = sum(rouge_scores["steps"]["rougeL"]) / len(rouge_scores["steps"]["rougeL"]) if rouge_scores["steps"]["rougeL"] else 0
-
-    # For ingredients, use per-item best-match ROUGE.
-    rouge_ing_r1, rouge_ing_rL = compute_ingredient_rouge_score(pred_ingredients_list, golden_ingredients_list)
-
-    # --- Aggregate and Return ---
-    def average(lst):
-        return sum(lst) / len(lst) if lst else 0
+    with instrumentation.stage("evals.rouge"):
+        rouge_scores = _rouge_metrics(*texts)
 
     aggregated = {
-        'cosine_similarity': {
-            'steps': average(cosine_scores["steps"]),
-            'ingredients': average(cosine_scores["ingredients"])
-        },
+        'cosine_similarity': cosine_scores,
         'bleu_score': bleu_scores,
-        'rouge_scores': {
-            'steps': {
-                'rouge1': rouge_steps_r1,
-                'rougeL': rouge_steps_rL,
-            },
-            'ingredients': {
-                'rouge1': rouge_ing_r1,
-                'rougeL': rouge_ing_rL,
-            }
-        }
+        'rouge_scores': rouge_scores,
     }
     print("Evaluation metrics calculated.")
-    return aggregated
\ No newline at end of file
+    return aggregated
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Corpus-level evaluation
+# ──────────────────────────────────────────────────────────────────────────────
+_EMPTY_RECIPE = {'title': None, 'ingredients': [], 'steps': []}
+
+
+def _text_metrics_chunk(chunk):
+    """BLEU and ROUGE of a chunk of (pred steps, pred ingredients, golden steps, golden ingredients)."""
+    return [(_bleu_metrics(*texts), _rouge_metrics(*texts)) for texts in chunk]
+
+
+def flatten_metrics(metrics, prefix=""):
+    """{'bleu_score': {'steps': x}} -> {'bleu_score.steps': x}"""
+    flat = {}
+    for name, value in metrics.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, key + "."))
+        else:
+            flat[key] = float(value)
+    return flat
+
+
+def bootstrap_confidence_intervals(values, n_bootstrap=1000, confidence=0.95, seed=0, block=100):
+    """
+    Percentile bootstrap intervals of the column means of `values` (n, k).
+    All columns share the same resamples.  Returns ``(low, high)`` arrays
+    (NaN when there is nothing to resample).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0 or n_bootstrap <= 0:
+        nan = np.full(values.shape[1:], np.nan)
+        return nan, nan.copy()
+    rng = np.random.default_rng(seed)
+    means = []
+    # Resampling n rows with replacement == multinomial row counts.
+    for start in range(0, n_bootstrap, block):
+        counts = rng.multinomial(n, np.full(n, 1.0 / n), size=min(block, n_bootstrap - start))
+        means.append(counts @ values / n)
+    means = np.concatenate(means)
+    alpha = (1.0 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1.0 - alpha], axis=0)
+    return low, high
+
+
+def aggregate_metrics(examples, n_bootstrap=1000, confidence=0.95, seed=0):
+    """Mean and bootstrap interval of every metric over per-example `compute_evals` dicts."""
+    if not examples:
+        return {}
+    flat = [flatten_metrics(example) for example in examples]
+    names = list(flat[0])
+    values = np.array([[row[name] for name in names] for row in flat])
+    low, high = bootstrap_confidence_intervals(values, n_bootstrap, confidence, seed)
+    return {
+        name: {'mean': float(values[:, k].mean()), 'ci_low': float(low[k]), 'ci_high': float(high[k])}
+        for k, name in enumerate(names)
+    }
+
+
+def compute_evals_batch(pred_recipes, golden_recipes, num_proc=None, chunk_size=32,
+                        n_bootstrap=1000, confidence=0.95, seed=0):
+    """
+    `compute_evals` over a whole set of predictions, without per-example printing.
+    
+    All predicted steps and ingredients are embedded in one batched pass;
+    BLEU and ROUGE (pure text) are fanned out in chunks of `chunk_size`
+    examples over `num_proc` worker processes (None or 1 runs them here).
+    A prediction of None (unparseable output) is scored as an empty recipe.
+    
+    Args:
+        pred_recipes: Parsed predictions ({'steps', 'ingredients', ...} or None).
+        golden_recipes: Preprocessed dataset rows (a list of dicts or a Dataset).
+        num_proc: Worker processes for BLEU/ROUGE.
+        chunk_size: Examples per worker task.
+        n_bootstrap: Bootstrap resamples for the confidence intervals (0 skips them).
+        confidence: Confidence level of the intervals.
+        seed: Seed of the bootstrap.
+    
+    Returns:
+        {'examples': [per-example compute_evals dicts],
+         'aggregate': {'bleu_score.steps': {'mean', 'ci_low', 'ci_high'}, ...}}
+    """
+    if len(pred_recipes) != len(golden_recipes):
+        raise ValueError(f"{len(pred_recipes)} predictions for {len(golden_recipes)} golden recipes")
+    preds = [pred if pred is not None else _EMPTY_RECIPE for pred in pred_recipes]
+    instrumentation.increment("evals.empty_predictions", sum(pred is None for pred in pred_recipes))
+    golds = [golden_recipes[i] for i in range(len(golden_recipes))]
+    if not preds:
+        return {'examples': [], 'aggregate': {}}
+
+    # --- Cosine similarity: one encode call for the whole corpus ---
+    with instrumentation.stage("evals.batch.cosine"):
+        embedded = encode_nested([pred['steps'] for pred in preds] + [pred['ingredients'] for pred in preds])
+        cosine = [
+            _cosine_metrics(embedded[i], embedded[len(preds) + i], gold)
+            for i, gold in enumerate(golds)
+        ]
+
+    # --- BLEU / ROUGE: chunked over a process pool ---
+    texts = [
+        (pred['steps'], pred['ingredients'], gold['instruction_steps'], gold['parsed_ingredients'])
+        for pred, gold in zip(preds, golds)
+    ]
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with instrumentation.stage("evals.batch.text_metrics"):
+        if num_proc and num_proc > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=num_proc) as pool:
+                text_scores = [scores for chunk in pool.map(_text_metrics_chunk, chunks) for scores in chunk]
+        else:
+            text_scores = [scores for chunk in chunks for scores in _text_metrics_chunk(chunk)]
+
+    examples = [
+        {'cosine_similarity': cosine_scores, 'bleu_score': bleu_scores, 'rouge_scores': rouge_scores}
+        for cosine_scores, (bleu_scores, rouge_scores) in zip(cosine, text_scores)
+    ]
+
+    with instrumentation.stage("evals.batch.aggregate"):
+        aggregate = aggregate_metrics(examples, n_bootstrap, confidence, seed)
+    return {'examples': examples, 'aggregate': aggregate}
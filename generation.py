@@ -0,0 +1,202 @@
+"""
+Pooled, concurrent access to the Together chat-completions API.
+
+`generate_response` in utils.py used to build a new client (and HTTP session)
+per call, and the baseline notebook called it strictly one image at a time.
+This module keeps one client per process (one async client per event loop)
+and runs many conversations concurrently:
+
+    from generation import generate_responses
+    responses = generate_responses(message_batches, max_concurrency=8, requests_per_second=4)
+
+Concurrency is bounded by a semaphore, request starts are paced by a token
+bucket, and transient failures (connection errors, timeouts, 429 and 5xx) are
+retried with exponential backoff and full jitter.  Pass ``base_url`` (or set
+``TOGETHER_BASE_URL``) to point the client at a local stub server.
+
+Requests read through and write through the generation cache in
+response_cache.py, exactly like `utils.generate_response`.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+import response_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "meta-llama/Llama-Vision-Free"
+
+_client = None
+_client_lock = threading.Lock()
+# event loop → {base_url: AsyncTogether}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Process-wide synchronous Together client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from together import Together
+
+                _client = Together(api_key=os.getenv("TOGETHER_API_KEY"))
+    return _client
+
+
+def get_async_client(base_url: Optional[str] = None):
+    """
+    Async Together client shared by every request on the running event loop
+    (httpx connection pools are bound to the loop they were created on).
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if base_url not in clients:
+        from together import AsyncTogether
+
+        # Retries are handled in `agenerate_response`, with jitter, not by the SDK.
+        clients[base_url] = AsyncTogether(api_key=os.getenv("TOGETHER_API_KEY"), base_url=base_url, max_retries=0)
+    return clients[base_url]
+
+
+class TokenBucket:
+    """
+    Async token bucket: at most `rate` acquisitions per second on average,
+    with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+def _is_retryable(error: Exception) -> bool:
+    import together
+
+    if isinstance(error, (together.APIConnectionError, together.APITimeoutError)):
+        return True
+    if isinstance(error, together.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0.0, min(max_delay, base_delay * 2 ** attempt))
+
+
+async def agenerate_response(
+    messages: list,
+    *,
+    client=None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    rate_limiter: Optional[TokenBucket] = None,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1000,
+    temperature: float = 0.7,
+    max_retries: int = 4,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    base_url: Optional[str] = None,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    replay: bool = False,
+) -> str:
+    """Async counterpart of `utils.generate_response` for one conversation."""
+    # Hash the request (and its base64 images) only when a cache will use the key.
+    use_cache = use_cache and response_cache.get_response_cache() is not None
+    if use_cache:
+        key = response_cache.request_key(model, messages, max_tokens, temperature, seed)
+        cached = response_cache.lookup(key, temperature, replay)
+        if cached is not None:
+            return cached
+
+    client = client or get_async_client(base_url)
+    extra = {"seed": seed} if seed is not None else {}
+    semaphore = semaphore or asyncio.Semaphore(1)
+    attempt = 0
+    while True:
+        async with semaphore:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **extra,
+                )
+                content = response.choices[0].message.content
+                if use_cache:
+                    response_cache.store(key, content, model)
+                return content
+            except Exception as e:
+                if attempt >= max_retries or not _is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                logger.debug("Retrying generation in %.2fs after %r", delay, e)
+        # Sleep outside the semaphore so other requests can use the slot.
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def agenerate_responses(
+    message_batches: Sequence[list],
+    *,
+    max_concurrency: int = 8,
+    requests_per_second: Optional[float] = None,
+    burst: Optional[float] = None,
+    return_exceptions: bool = False,
+    **kwargs,
+) -> List[Optional[str]]:
+    """
+    Generate a response for every conversation in `message_batches`
+    concurrently, preserving order.  Extra keyword arguments go to
+    `agenerate_response` (model, max_tokens, temperature, max_retries, ...).
+
+    With ``return_exceptions=True`` a request that still fails after its
+    retries yields the exception in its slot instead of failing the batch.
+    """
+    base_url = kwargs.pop("base_url", None)
+    client = kwargs.pop("client", None) or get_async_client(base_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    rate_limiter = TokenBucket(requests_per_second, burst) if requests_per_second else None
+    tasks = [
+        agenerate_response(messages, client=client, semaphore=semaphore, rate_limiter=rate_limiter, **kwargs)
+        for messages in message_batches
+    ]
+    return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+
+def generate_responses(message_batches: Sequence[list], **kwargs) -> List[Optional[str]]:
+    """
+    Blocking wrapper around `agenerate_responses` for scripts.  Inside a
+    notebook (which already runs an event loop) use
+    ``await agenerate_responses(...)`` instead.
+    """
+    return asyncio.run(agenerate_responses(message_batches, **kwargs))
@@ -0,0 +1,252 @@
+"""
+Lazy, on-demand image encoding.
+
+Instead of materialising a base64 string per row in the dataset (about 33%
+larger than the JPEG, and copied by every ``.map``), ``preprocess_dataset(...,
+image_mode="path")`` only keeps a validated ``image_path``.  The payload is
+encoded when a request is built, through a byte-bounded LRU so images that
+are sent repeatedly (eval reruns, several samples per prompt) are read and
+encoded once.
+
+    from images import image_message
+    messages = image_message(prompt, example)   # works for either dataset mode
+
+`prepare_image` is an optional downscaling stage: it resizes an image to a
+maximum side length and re-encodes it as JPEG, storing the result in an
+on-disk thumbnail cache keyed by the source's content hash, so every image is
+converted only once.  It needs Pillow.
+"""
+import base64
+import hashlib
+import logging
+import os
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+DEFAULT_MAX_SIDE = 768
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_THUMBNAIL_DIR = os.path.join("~", ".cache", "inverse_cooking", "thumbnails")
+
+
+def image_is_valid(image_path) -> bool:
+    """Cheap existence check: a single stat(), no read."""
+    try:
+        st = os.stat(image_path)
+    except (OSError, TypeError, ValueError):
+        return False
+    return stat.S_ISREG(st.st_mode) and st.st_size > 0
+
+
+class EncodedImageCache:
+    """LRU of base64 payloads keyed by (path, mtime, size), capped at `max_bytes`."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, image_path: str) -> Optional[str]:
+        """Base64 payload of `image_path`, or None if it cannot be read."""
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            logger.warning("Image not found at %s", image_path)
+            return None
+        key = (image_path, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        try:
+            with open(image_path, "rb") as image_file:
+                payload = base64.b64encode(image_file.read()).decode('utf-8')
+        except OSError as e:
+            logger.warning("Error encoding image %s: %s", image_path, e)
+            return None
+
+        with self._lock:
+            self.misses += 1
+            if len(payload) <= self.max_bytes and key not in self._entries:
+                self._entries[key] = payload
+                self._bytes += len(payload)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_image_cache = EncodedImageCache(int(os.getenv("IMAGE_CACHE_MAX_BYTES", DEFAULT_MAX_CACHE_BYTES)))
+
+
+def configure_image_cache(max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> EncodedImageCache:
+    """Replace the process-wide encoded-image LRU."""
+    global _image_cache
+    _image_cache = EncodedImageCache(max_bytes)
+    return _image_cache
+
+
+def get_image_cache() -> EncodedImageCache:
+    return _image_cache
+
+
+def encode_image_cached(image_path: str) -> Optional[str]:
+    """Base64-encode `image_path` through the shared LRU."""
+    return _image_cache.encode(image_path)
+
+
+def example_image_base64(example) -> Optional[str]:
+    """
+    Base64 image of a preprocessed example, whichever mode it was built in:
+    the stored ``base64_image`` column, or lazily from ``image_path``.
+    """
+    payload = example.get('base64_image')
+    if payload is not None:
+        return payload
+    image_path = example.get('image_path')
+    return encode_image_cached(image_path) if image_path else None
+
+
+def image_message(prompt: str, example) -> list:
+    """Chat messages asking `prompt` about the example's image."""
+    payload = example_image_base64(example)
+    if payload is None:
+        raise ValueError("example has no image: neither a base64_image nor a readable image_path")
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{payload}",
+                    },
+                },
+            ],
+        }
+    ]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Downscaling stage with a content-addressed thumbnail cache
+# ──────────────────────────────────────────────────────────────────────────────
+_content_hashes: Dict[tuple, str] = {}
+
+
+def _content_hash(image_path: str, st: os.stat_result) -> str:
+    """sha256 of the file, memoised per (path, mtime, size)."""
+    key = (image_path, st.st_mtime_ns, st.st_size)
+    digest = _content_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = _content_hashes[key] = sha.hexdigest()
+    return digest
+
+
+def prepare_image(
+    image_path: str,
+    max_side: int = DEFAULT_MAX_SIDE,
+    quality: int = DEFAULT_JPEG_QUALITY,
+    cache_dir: str = DEFAULT_THUMBNAIL_DIR,
+) -> dict:
+    """
+    Downscale `image_path` so that its longest side is at most `max_side` and
+    re-encode it as JPEG at `quality`, caching the result on disk.
+
+    Returns a report:
+        {'path': <file to send>, 'original_bytes': int,
+         'thumbnail_bytes': int, 'bytes_saved': int, 'cached': bool}
+
+    When re-encoding would not make the file smaller (already small JPEGs),
+    the original is used and `bytes_saved` is 0.
+    """
+    st = os.stat(image_path)
+    digest = _content_hash(image_path, st)
+    directory = os.path.join(os.path.expanduser(cache_dir), digest[:2])
+    thumb_path = os.path.join(directory, f"{digest}_{max_side}_q{quality}.jpg")
+    original_marker = thumb_path + ".original"  # records "keep the original"
+
+    report = {'original_bytes': st.st_size, 'cached': True}
+    if os.path.exists(original_marker):
+        return dict(report, path=image_path, thumbnail_bytes=st.st_size, bytes_saved=0)
+    if os.path.exists(thumb_path):
+        size = os.path.getsize(thumb_path)
+        return dict(report, path=thumb_path, thumbnail_bytes=size, bytes_saved=st.st_size - size)
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise ImportError("prepare_image needs Pillow: pip install pillow") from e
+
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(image_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        # Write atomically so concurrent workers never read a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="JPEG", quality=quality, optimize=True)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    size = os.path.getsize(tmp_path)
+    report['cached'] = False
+    if size >= st.st_size:
+        os.remove(tmp_path)
+        open(original_marker, "w").close()
+        return dict(report, path=image_path, thumbnail_bytes=st.st_size, bytes_saved=0)
+    os.replace(tmp_path, thumb_path)
+    return dict(report, path=thumb_path, thumbnail_bytes=size, bytes_saved=st.st_size - size)
+
+
+def prepare_images(
+    image_paths: Iterable[str],
+    max_side: int = DEFAULT_MAX_SIDE,
+    quality: int = DEFAULT_JPEG_QUALITY,
+    cache_dir: str = DEFAULT_THUMBNAIL_DIR,
+) -> List[Optional[dict]]:
+    """
+    Run `prepare_image` over many files (None for unreadable ones) and print
+    the total bytes saved.
+    """
+    reports = []
+    for image_path in image_paths:
+        try:
+            reports.append(prepare_image(image_path, max_side, quality, cache_dir))
+        except Exception as e:
+            logger.warning("Could not downscale %s: %s", image_path, e)
+            reports.append(None)
+
+    done = [r for r in reports if r is not None]
+    original = sum(r['original_bytes'] for r in done)
+    saved = sum(r['bytes_saved'] for r in done)
+    if original:
+        print(f"Downscaled {len(done)} images: saved {saved / 1e6:.1f} MB of {original / 1e6:.1f} MB "
+              f"({100 * saved / original:.0f}%)")
+    return reports
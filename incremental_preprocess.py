@@ -0,0 +1,130 @@
+"""
+Incremental `preprocess_dataset`: only new or changed rows are recomputed.
+
+Each input row gets a fingerprint, the sha256 of:
+- its Ingredients, Cleaned_Ingredients and Instructions;
+- its image path and the image file's mtime and size;
+- the settings that shape the output: embedder model, image mode,
+  downscaling and embedding dtype.
+
+The fingerprint is stored in a ``_fingerprint`` column of the saved output.
+On a rerun, rows whose fingerprint is already in the saved output reuse the
+cached parsed columns, image and embeddings. Only the remaining rows go
+through `preprocess_dataset`, and the result is merged back in input order.
+
+    from incremental_preprocess import preprocess_dataset_incremental
+    dataset = preprocess_dataset_incremental(hf_dataset, "preprocessed/", image_mode="path")
+
+Rows dropped for a missing image are not cached, so they are retried on the
+next run and get picked up once their image appears.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+
+import numpy as np
+from datasets import concatenate_datasets, load_from_disk
+
+from embeddings import get_model_name
+from utils import preprocess_dataset
+
+FINGERPRINT_COLUMN = '_fingerprint'
+_POSITION_COLUMN = '_position'
+_TEXT_COLUMNS = ('Ingredients', 'Cleaned_Ingredients', 'Instructions')
+# preprocess_dataset arguments that change what a row turns into
+_OUTPUT_SETTINGS = ('image_mode', 'max_image_side', 'jpeg_quality', 'embedding_dtype')
+
+
+def settings_fingerprint(**settings) -> str:
+    """Hash of the embedder and the output-shaping preprocess settings."""
+    defaults = inspect.signature(preprocess_dataset).parameters
+    relevant = {name: settings.get(name, defaults[name].default) for name in _OUTPUT_SETTINGS}
+    relevant['embedder'] = get_model_name()
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _image_signature(image_path) -> str:
+    try:
+        st = os.stat(image_path)
+    except (OSError, TypeError, ValueError):
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def row_fingerprints(batch, settings: str) -> list:
+    """Fingerprint of every row of a batch (a dict of columns)."""
+    n = len(next(iter(batch.values())))
+    image_paths = batch.get('full_image_path', [None] * n)
+    fingerprints = []
+    for i in range(n):
+        parts = [settings] + [str(batch[column][i]) if column in batch else "" for column in _TEXT_COLUMNS]
+        parts += [str(image_paths[i]), _image_signature(image_paths[i])]
+        fingerprints.append(hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest())
+    return fingerprints
+
+
+def preprocess_dataset_incremental(hf_dataset, output_dir: str, batch_size: int = 256, num_proc=None, **kwargs):
+    """
+    `preprocess_dataset` with its result saved to `output_dir`, reusing every
+    row of a previous run whose fingerprint is unchanged.
+
+    Extra keyword arguments go to `preprocess_dataset`.  Returns the merged
+    dataset, loaded from `output_dir`, in input order.
+    """
+    settings = settings_fingerprint(**kwargs)
+    fingerprinted = hf_dataset.map(
+        lambda batch, indices: {
+            FINGERPRINT_COLUMN: row_fingerprints(batch, settings),
+            _POSITION_COLUMN: indices,
+        },
+        batched=True,
+        batch_size=batch_size,
+        with_indices=True,
+        num_proc=num_proc,
+    )
+    fingerprints = fingerprinted[FINGERPRINT_COLUMN]
+
+    cached = load_from_disk(output_dir) if os.path.isdir(output_dir) else None
+    cached_rows = {}
+    if cached is not None and FINGERPRINT_COLUMN in cached.column_names:
+        for i, fingerprint in enumerate(cached[FINGERPRINT_COLUMN]):
+            cached_rows.setdefault(fingerprint, i)
+
+    reused_positions = [i for i, fingerprint in enumerate(fingerprints) if fingerprint in cached_rows]
+    fresh_positions = [i for i, fingerprint in enumerate(fingerprints) if fingerprint not in cached_rows]
+    print(f"Reusing {len(reused_positions)} cached rows, processing {len(fresh_positions)} new or changed rows...")
+
+    parts = []
+    if fresh_positions:
+        parts.append(preprocess_dataset(
+            fingerprinted.select(fresh_positions), batch_size=batch_size, num_proc=num_proc, **kwargs
+        ))
+    if reused_positions:
+        # Derived columns come from the cache, the original columns from the
+        # current input (so edits to e.g. the title are picked up).
+        derived = [c for c in cached.column_names if c not in hf_dataset.column_names]
+        reused = concatenate_datasets([
+            fingerprinted.select(reused_positions).remove_columns(FINGERPRINT_COLUMN),
+            cached.select([cached_rows[fingerprints[i]] for i in reused_positions]).select_columns(derived),
+        ], axis=1)
+        if parts:
+            reused = reused.select_columns(parts[0].column_names)
+        parts.append(reused)
+
+    if not parts:
+        merged = fingerprinted.select([])
+    else:
+        merged = concatenate_datasets(parts) if len(parts) > 1 else parts[0]
+        merged = merged.select(np.argsort(merged[_POSITION_COLUMN], kind='stable'))
+    merged = merged.remove_columns(_POSITION_COLUMN)
+
+    # Write next to the old output and swap, since `cached` is memory-mapped from it.
+    staging_dir = output_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    merged.save_to_disk(staging_dir)
+    del cached, merged, parts
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(staging_dir, output_dir)
+    return load_from_disk(output_dir)
@@ -0,0 +1,178 @@
+"""
+Opt-in per-stage timing and counters for rewards, preprocessing and evals.
+
+Instrumentation is off by default and then costs one global check per
+instrumented call.  Turn it on with ``enable()`` or ``RECIPE_INSTRUMENTATION=1``:
+
+    import instrumentation
+    instrumentation.enable()
+    ...                                       # a few GRPO steps
+    instrumentation.snapshot()
+    # {'stages': {'rewards.parse': {'calls': 12, 'seconds': 0.41, 'max_seconds': 0.05}, ...},
+    #  'counters': {'rewards.parse_failures': 3, 'embeddings.cache_hits': 940, ...}}
+    instrumentation.write_prometheus("/var/lib/node_exporter/inverse_cooking.prom")
+
+Stages are wall-clock sections (``with stage("rewards.encode"):`` or the
+``@timed`` decorator); counters are plain event counts.  The Prometheus
+text file follows the exposition format read by node_exporter's textfile
+collector or any scraper that polls a file; `export_periodically` rewrites
+it in a background thread.
+
+Measurements live in the recording process: work that `preprocess_dataset`
+or `compute_evals_batch` hands to worker processes (``num_proc > 1``) is
+not included.
+"""
+import contextlib
+import functools
+import os
+import re
+import threading
+import time
+from typing import Dict
+
+_enabled = os.getenv("RECIPE_INSTRUMENTATION", "") not in ("", "0")
+_lock = threading.Lock()
+# stage name → [calls, total seconds, max seconds]
+_stages: Dict[str, list] = {}
+_counters: Dict[str, float] = {}
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Drop every recorded stage and counter."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def record(name: str, seconds: float) -> None:
+    """Add one call of `seconds` to stage `name`."""
+    with _lock:
+        entry = _stages.get(name)
+        if entry is None:
+            _stages[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name: str):
+    """Context manager timing the enclosed block as one call of stage `name`."""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def timed(name: str):
+    """Decorator timing every call of the function as stage `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add `value` to counter `name` (no-op while disabled)."""
+    if not _enabled or not value:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot() -> dict:
+    """Copy of every stage (calls, seconds, max_seconds) and counter recorded so far."""
+    with _lock:
+        return {
+            'stages': {
+                name: {'calls': calls, 'seconds': seconds, 'max_seconds': max_seconds}
+                for name, (calls, seconds, max_seconds) in sorted(_stages.items())
+            },
+            'counters': dict(sorted(_counters.items())),
+        }
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_text(prefix: str = "inverse_cooking") -> str:
+    """The current snapshot in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    for metric, kind, help_text, field in (
+        ("stage_calls_total", "counter", "Calls of each instrumented stage.", 'calls'),
+        ("stage_seconds_total", "counter", "Wall-clock seconds spent in each stage.", 'seconds'),
+        ("stage_max_seconds", "gauge", "Slowest single call of each stage.", 'max_seconds'),
+    ):
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, stats in data['stages'].items():
+            lines.append(f'{prefix}_{metric}{{stage="{name}"}} {stats[field]!r}')
+    for name, value in data['counters'].items():
+        metric = f"{prefix}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, prefix: str = "inverse_cooking") -> None:
+    """Atomically (re)write `path` with `prometheus_text`, so a scraper never reads half a file."""
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(prefix))
+    os.replace(staging, path)
+
+
+def export_periodically(path: str, interval: float = 15.0, prefix: str = "inverse_cooking") -> threading.Event:
+    """
+    Rewrite the Prometheus file every `interval` seconds from a daemon
+    thread.  Set the returned event to stop it (the file is written once more).
+    """
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            write_prometheus(path, prefix)
+        write_prometheus(path, prefix)
+
+    threading.Thread(target=_loop, name="instrumentation-export", daemon=True).start()
+    return stop
+
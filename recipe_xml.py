@@ -0,0 +1,260 @@
+"""
+Linear-time scanning of the recipe XML emitted by the model.
+
+The only markup that matters for the rewards is a handful of tags (think,
+recipe, title, ingredients, ingredient, instructions, step).  A single regex
+pass finds every occurrence of those tags (case-insensitively); everything
+else - prose, comments, entities, unknown tags - is plain text between them.
+`validate_recipe_format` runs a small state machine over that token stream,
+so its cost is O(len(text)) no matter how adversarial the input is.
+
+`RecipeStreamParser` reuses the same tag scanner to pull the title,
+ingredients and steps out of (possibly malformed, possibly partial) output.
+"""
+import html
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+_TAG_RE = re.compile(r"<(/?)(think|recipe|title|ingredients?|instructions|step)>", re.IGNORECASE)
+
+
+class Tag(NamedTuple):
+    name: str        # lower-cased tag name
+    closing: bool    # True for </name>
+    start: int       # offset of "<"
+    end: int         # offset just past ">"
+
+
+def scan_tags(text: str) -> List[Tag]:
+    """Every recipe-vocabulary tag in `text`, in order."""
+    return [
+        Tag(m.group(2).lower(), bool(m.group(1)), m.start(), m.end())
+        for m in _TAG_RE.finditer(text)
+    ]
+
+
+def _is(tag: Tag, name: str, closing: bool = False) -> bool:
+    return tag.name == name and tag.closing == closing
+
+
+def _find_leaf(text: str, tags: List[Tag], start: int, stop: int, name: str) -> Optional[int]:
+    """
+    Index of the first ``<name>`` in ``tags[start:stop]`` that is immediately
+    closed by ``</name>`` around non-empty text without any "<", i.e. the
+    regex ``<name>[^<]+</name>``.  Returns the index of the closing tag.
+    """
+    for i in range(start, min(stop, len(tags)) - 1):
+        open_tag, close_tag = tags[i], tags[i + 1]
+        if _is(open_tag, name) and _is(close_tag, name, closing=True):
+            inner = text[open_tag.end:close_tag.start]
+            if inner and "<" not in inner:
+                return i + 1
+    return None
+
+
+def _find_section(text: str, tags: List[Tag], start: int, section: str, leaf: str) -> Optional[int]:
+    """
+    Starting at ``tags[start]``, find the first ``<section>`` whose content up to
+    the next ``</section>`` holds a valid ``<leaf>`` element.  Returns the index
+    of that ``</section>`` tag.
+
+    Any later ``<section>`` opened before the same ``</section>`` sees a suffix
+    of the same content, so each closing tag only needs to be checked once.
+    """
+    i = start
+    while i < len(tags):
+        if not _is(tags[i], section):
+            i += 1
+            continue
+        close = next((j for j in range(i + 1, len(tags)) if _is(tags[j], section, closing=True)), None)
+        if close is None:
+            return None
+        if _find_leaf(text, tags, i + 1, close, leaf) is not None:
+            return close
+        i = close + 1
+    return None
+
+
+def validate_recipe_format(text: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check `text` against the grammar documented in `rewards.check_format`:
+
+        <think> … </think>
+        <recipe>
+          <title>…</title>
+          <ingredients> … <ingredient>…</ingredient> … </ingredients>
+          <instructions> … <step>…</step> … </instructions>
+        </recipe>
+
+    with the semantics of the regex it replaces: tags are matched
+    case-insensitively, nothing may surround the two sections, the think
+    section may not open another <think>, title/ingredient/step leaves need
+    non-empty text without "<", and ingredients must precede instructions.
+    Extra tags, comments and unterminated items elsewhere are tolerated.
+    The one difference is that a second <recipe> is rejected anywhere in the
+    recipe body (the regex only noticed it between sections).
+
+    Returns ``(True, None)`` or ``(False, reason)``.
+    """
+    text = text.strip()
+    # Cheap rejections before tokenizing the whole output.
+    if text[:7].lower() != "<think>":
+        return False, "output must start with <think>"
+    if text[-9:].lower() != "</recipe>":
+        return False, "output must end with </recipe>"
+
+    tags = scan_tags(text)
+
+    if not tags or not _is(tags[0], "think") or tags[0].start != 0:
+        return False, "output must start with <think>"
+    if not _is(tags[-1], "recipe", closing=True) or tags[-1].end != len(text):
+        return False, "output must end with </recipe>"
+
+    # The recipe body may not contain another <recipe>, so it must open at the
+    # last <recipe> tag, directly (modulo whitespace) after a </think>.
+    recipe_open = max((i for i, tag in enumerate(tags) if _is(tag, "recipe")), default=None)
+    if recipe_open is None:
+        return False, "missing <recipe> section"
+    think_close = recipe_open - 1
+    if think_close <= 0 or not _is(tags[think_close], "think", closing=True) \
+            or text[tags[think_close].end:tags[recipe_open].start].strip():
+        return False, "<recipe> must directly follow a closing </think>"
+    if any(_is(tag, "think") for tag in tags[1:think_close]):
+        return False, "nested <think> inside the think section"
+
+    body_end = len(tags) - 1  # index of the final </recipe>
+    title = _find_leaf(text, tags, recipe_open + 1, body_end, "title")
+    if title is None:
+        return False, "missing or empty <title>"
+    ingredients = _find_section(text, tags[:body_end], title + 1, "ingredients", "ingredient")
+    if ingredients is None:
+        return False, "no <ingredients> section with a non-empty <ingredient> after the title"
+    instructions = _find_section(text, tags[:body_end], ingredients + 1, "instructions", "step")
+    if instructions is None:
+        return False, "no <instructions> section with a non-empty <step> after the ingredients"
+    return True, None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Incremental, fault-tolerant recipe parser
+# ──────────────────────────────────────────────────────────────────────────────
+_MARKUP_RE = re.compile(r"<!--.*?-->|<[^<>]*>", re.DOTALL)
+_MAX_TAG_LEN = len("</instructions>")
+
+_LEAVES = ("title", "ingredient", "step")
+
+
+def _leaf_text(parts: List[str]) -> str:
+    """Join the text of one element, dropping comments/unknown tags and decoding entities."""
+    text = "".join(parts)
+    if "<" in text:
+        text = _MARKUP_RE.sub("", text)
+    if "&" in text:
+        text = html.unescape(text)
+    return text.strip()
+
+
+class RecipeStreamParser:
+    """
+    Pull-style recipe parser that can be fed text incrementally.
+
+        parser = RecipeStreamParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        recipe = parser.close()   # {'title', 'ingredients', 'steps'} or None
+
+    Only the first <recipe> … </recipe> block is read; anything before it
+    (e.g. the <think> section) is skipped.  Unlike ``ET.fromstring`` it never
+    gives up on malformed XML: unclosed items end at the next recipe tag,
+    stray "&" and unknown tags are kept as text or dropped, and a truncated
+    output still yields every item seen so far.  `close` returns None only
+    when no <recipe> tag was seen at all; `complete` tells whether the block
+    was closed by </recipe>.
+    """
+
+    def __init__(self):
+        self._pending = ""          # unprocessed tail that may hold a split tag
+        self._in_recipe = False
+        self._done = False
+        self.complete = False       # True once </recipe> has been read
+        self._leaf: Optional[str] = None
+        self._parts: List[str] = []
+        self.title: Optional[str] = None
+        self.ingredients: List[str] = []
+        self.steps: List[str] = []
+
+    def feed(self, chunk: str) -> None:
+        if self._done:
+            return
+        data = self._pending + chunk
+        # Hold back a trailing "<…" that could be the start of a tag split
+        # across chunks (tags are short, so this stays bounded).
+        cut = data.rfind("<")
+        if cut != -1 and ">" not in data[cut:] and len(data) - cut <= _MAX_TAG_LEN:
+            data, self._pending = data[:cut], data[cut:]
+        else:
+            self._pending = ""
+        self._consume(data)
+
+    def close(self) -> Optional[dict]:
+        if not self._done:
+            self._consume(self._pending)
+            self._pending = ""
+            self._end_leaf()
+            self._done = True
+        if not self._in_recipe:
+            return None
+        return {
+            'title': self.title if self.title is not None else "Unknown",
+            'ingredients': self.ingredients,
+            'steps': self.steps,
+        }
+
+    def _consume(self, data: str) -> None:
+        position = 0
+        for m in _TAG_RE.finditer(data):
+            if self._done:
+                return
+            if self._leaf is not None:
+                self._parts.append(data[position:m.start()])
+            position = m.end()
+            self._handle(m.group(2).lower(), bool(m.group(1)))
+        if self._leaf is not None and not self._done:
+            self._parts.append(data[position:])
+
+    def _handle(self, name: str, closing: bool) -> None:
+        if not self._in_recipe:
+            self._in_recipe = name == "recipe" and not closing
+            return
+        if name == "recipe":
+            if closing:
+                self._end_leaf()
+                self._done = self.complete = True
+            return
+        # Any other recipe tag ends the element being collected, which is how
+        # unclosed <ingredient>/<step> items are recovered.
+        self._end_leaf()
+        if not closing and name in _LEAVES:
+            self._leaf = name
+
+    def _end_leaf(self) -> None:
+        if self._leaf is None:
+            return
+        text = _leaf_text(self._parts)
+        if text:
+            if self._leaf == "title":
+                if self.title is None:
+                    self.title = text
+            elif self._leaf == "ingredient":
+                self.ingredients.append(text)
+            else:
+                self.steps.append(text)
+        self._leaf = None
+        self._parts = []
+
+
+def parse_recipe_stream(text: str) -> Optional[dict]:
+    """One-shot convenience wrapper around `RecipeStreamParser`."""
+    parser = RecipeStreamParser()
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,129 @@
+"""
+Deterministic on-disk cache of model generations.
+
+Every request is addressed by ``sha256`` of a canonical JSON encoding of
+(model, messages, max_tokens, temperature, seed), where inline base64 images
+are replaced by the digest of their payload so keys stay small.  Responses
+are appended to a SQLite table (never updated in place); a lookup returns
+the most recent response stored for a key.
+
+`generate_response` (utils.py) and `agenerate_response` (generation.py) read
+through and write through the cache.  Replaying a cached response is
+automatic for ``temperature == 0`` and opt-in (``replay=True``) otherwise,
+since a sampled response is only one draw from the model.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join("~", ".cache", "inverse_cooking", "generations.sqlite")
+
+_DATA_URL_PREFIX = "data:"
+
+
+def _digest_images(value):
+    """Copy of `value` with every data: URL replaced by the sha256 of its payload."""
+    if isinstance(value, dict):
+        return {k: _digest_images(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_digest_images(v) for v in value]
+    if isinstance(value, str) and value.startswith(_DATA_URL_PREFIX) and ";base64," in value:
+        header, payload = value.split(",", 1)
+        return f"{header},sha256:{hashlib.sha256(payload.encode('ascii')).hexdigest()}"
+    return value
+
+
+def request_key(model: str, messages: list, max_tokens: int, temperature: float, seed: Optional[int] = None) -> str:
+    """Content address of one chat-completion request."""
+    canonical = json.dumps(
+        {
+            "model": model,
+            "messages": _digest_images(messages),
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "seed": seed,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Append-only SQLite store of generations keyed by `request_key`."""
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_key ON responses (key)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? ORDER BY id DESC LIMIT 1", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, response: str, model: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time()),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_configured = False
+
+
+def configure_response_cache(path: Optional[str] = DEFAULT_CACHE_PATH) -> Optional[ResponseCache]:
+    """(Re)configure the generation cache; ``path=None`` disables it."""
+    global _cache, _cache_configured
+    _cache = ResponseCache(path) if path else None
+    _cache_configured = True
+    return _cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The active generation cache, created from ``GENERATION_CACHE_PATH`` on first use."""
+    if not _cache_configured:
+        configure_response_cache(os.getenv("GENERATION_CACHE_PATH", DEFAULT_CACHE_PATH))
+    return _cache
+
+
+def lookup(key: str, temperature: float, replay: bool) -> Optional[str]:
+    """Cached response for `key`, if caching is on and replay is allowed at this temperature."""
+    cache = get_response_cache()
+    if cache is None or (temperature > 0 and not replay):
+        return None
+    return cache.get(key)
+
+
+def store(key: str, response: Optional[str], model: str) -> None:
+    """Write a fresh response through to the cache (no-op when disabled)."""
+    cache = get_response_cache()
+    if cache is not None and response is not None:
+        cache.put(key, response, model)
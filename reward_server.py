@@ -0,0 +1,292 @@
+"""
+Local reward service: one embedder shared by every trainer process.
+
+Each GRPO worker that imports rewards.py loads its own copy of the
+sentence-embedding model.  Instead, run one server per machine:
+
+    python reward_server.py --port 8765                          # localhost HTTP
+    python reward_server.py --unix-socket /tmp/recipe-rewards.sock
+
+and give the trainer the client's callables, which have the same signature
+as the functions in rewards.py:
+
+    from reward_server import RewardClient
+    client = RewardClient("http://127.0.0.1:8765")      # or "unix:///tmp/recipe-rewards.sock"
+    trainer = GRPOTrainer(..., reward_funcs=[client.format_reward,
+                                             client.cosine_ingredients_reward,
+                                             client.cosine_steps_reward])
+
+The client sends the completions and whichever gold fields are present in
+one request per batch (gold embeddings as packed float32 buffers) and
+reuses the answer for the other reward callables of the same batch, like
+the per-batch context in rewards.py.  The server scores requests one at a
+time with `rewards.compute_recipe_rewards`, so the model is loaded once and
+sees larger, better-utilised batches.
+
+Endpoints: ``POST /rewards``, ``GET /health`` and ``GET /metrics`` (the
+instrumentation.py counters in Prometheus text format).
+"""
+import argparse
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import embeddings
+import instrumentation
+import rewards
+from embedding_store import RaggedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# gold items kwarg → gold embeddings kwarg, as expected by rewards.compute_recipe_rewards
+_GOLD_FIELDS = {
+    "parsed_ingredients": "ingredients_embeddings",
+    "instruction_steps": "instructions_embeddings",
+}
+
+
+class RewardServerError(RuntimeError):
+    """The reward server rejected a request or failed while scoring it."""
+
+
+def pack_embeddings(rows) -> dict:
+    """Ragged gold embeddings (lists, arrays or an embedding_store column) as a JSON-safe dict."""
+    store = rows if isinstance(rows, RaggedEmbeddings) else RaggedEmbeddings.from_rows(rows)
+    start, stop = store.offsets[0], store.offsets[-1]
+    values = np.ascontiguousarray(store.values[start:stop], dtype="<f4")
+    return {
+        "dim": store.dim,
+        "offsets": (store.offsets - start).tolist(),
+        "values": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+
+
+def unpack_embeddings(packed: dict) -> RaggedEmbeddings:
+    values = np.frombuffer(base64.b64decode(packed["values"]), dtype="<f4")
+    return RaggedEmbeddings(values.reshape(-1, packed["dim"]), np.asarray(packed["offsets"], dtype=np.int64))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Server
+# ──────────────────────────────────────────────────────────────────────────────
+class RewardRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port) address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "model": embeddings.get_model_name()})
+        elif self.path == "/metrics":
+            self._send(200, instrumentation.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/rewards":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            completions = [[{"role": "assistant", "content": text}] for text in request["completions"]]
+            kwargs = {}
+            for items_key, embeds_key in _GOLD_FIELDS.items():
+                if items_key in request:
+                    kwargs[items_key] = request[items_key]
+                    kwargs[embeds_key] = unpack_embeddings(request[embeds_key])
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {"error": f"bad request: {e!r}"})
+            return
+        try:
+            with self.server.score_lock:
+                scores = rewards.compute_recipe_rewards(completions, **kwargs)
+        except Exception as e:
+            logger.exception("Scoring failed")
+            self._send_json(500, {"error": repr(e)})
+            return
+        self._send_json(200, scores)
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def make_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: Optional[str] = None):
+    """
+    Build (but do not start) the reward server on localhost `port`, or on
+    `unix_socket` when given.  Call ``serve_forever()`` on the result.
+    """
+    if unix_socket:
+        server = _ThreadingUnixHTTPServer(unix_socket, RewardRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RewardRequestHandler)
+    # compute_recipe_rewards keeps per-batch state in rewards.py, and one
+    # request at a time is also what keeps a single model busy with big batches.
+    server.score_lock = threading.Lock()
+    return server
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Client
+# ──────────────────────────────────────────────────────────────────────────────
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RewardClient:
+    """
+    Drop-in replacements for the reward callables of rewards.py, scored by a
+    reward server at `address` (``http://host:port`` or ``unix:///path``).
+    """
+
+    def __init__(self, address: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 300.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        # (texts, gold kwargs objects, rewards) of the last batch
+        self._last = (None, (), None)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            parts = urlsplit(self.address)
+            if parts.scheme == "unix":
+                connection = _UnixHTTPConnection(parts.path, self.timeout)
+            elif parts.scheme == "http":
+                connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+            else:
+                raise ValueError(f"address must be http://host:port or unix:///path, got {self.address!r}")
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, payload: Optional[dict] = None) -> bytes:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed a kept-alive connection; reconnect once.
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            try:
+                message = json.loads(data)["error"]
+            except (ValueError, KeyError):
+                message = data.decode("utf-8", "replace")
+            raise RewardServerError(f"{method} {path} failed with {response.status}: {message}")
+        return data
+
+    def health(self) -> dict:
+        return json.loads(self._request("GET", "/health"))
+
+    def compute_recipe_rewards(self, completions: List[List[dict]], **kwargs) -> Dict[str, List[float]]:
+        """Remote `rewards.compute_recipe_rewards`; repeated calls on the same batch are answered locally."""
+        texts = tuple(comp[0]["content"] for comp in completions)
+        present = [key for key in _GOLD_FIELDS if key in kwargs and _GOLD_FIELDS[key] in kwargs]
+        gold = [kwargs[key] for items_key in present for key in (items_key, _GOLD_FIELDS[items_key])]
+        last_texts, last_gold, last_scores = self._last
+        if last_texts == texts and len(last_gold) == len(gold) and all(a is b for a, b in zip(last_gold, gold)):
+            return {name: list(values) for name, values in last_scores.items()}
+
+        payload = {"completions": list(texts)}
+        for items_key in present:
+            payload[items_key] = list(kwargs[items_key])
+            payload[_GOLD_FIELDS[items_key]] = pack_embeddings(kwargs[_GOLD_FIELDS[items_key]])
+        scores = json.loads(self._request("POST", "/rewards", payload))
+        self._last = (texts, gold, scores)
+        return {name: list(values) for name, values in scores.items()}
+
+    def format_reward(self, completions: List[List[dict]], **kwargs) -> List[float]:
+        return self.compute_recipe_rewards(completions, **kwargs)["format"]
+
+    def cosine_ingredients_reward(self, completions: List[List[dict]], **kwargs) -> List[float]:
+        return self.compute_recipe_rewards(completions, **kwargs)["ingredients"]
+
+    def cosine_steps_reward(self, completions: List[List[dict]], **kwargs) -> List[float]:
+        return self.compute_recipe_rewards(completions, **kwargs)["steps"]
+
+    def recipe_reward(self, completions: List[List[dict]], **kwargs) -> List[float]:
+        """`rewards.recipe_reward` computed from one server round trip."""
+        scores = self.compute_recipe_rewards(completions, **kwargs)
+        return [
+            sum(rewards.REWARD_WEIGHTS[name] * scores[name][i] for name in rewards.REWARD_WEIGHTS if name in scores)
+            for i in range(len(completions))
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--model", help="embedding model (default: EMBEDDING_MODEL or all-MiniLM-L6-v2)")
+    parser.add_argument("--device", help="embedding device, e.g. cuda or cpu")
+    args = parser.parse_args()
+
+    embeddings.configure_embedder(args.model, args.device)
+    embeddings.get_embedder()  # load the model before accepting requests
+    server = make_server(args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Serving rewards with {embeddings.get_model_name()} on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,11 @@
+from typing import Dict, List
 
+import numpy as np
+
+import instrumentation
+from embeddings import encode_nested, encode_texts
+from recipe_xml import RecipeStreamParser, validate_recipe_format
+from similarity import as_matrix, avg_best_cosine, batch_avg_best_cosine
 
 
 def check_format(text: str) -> float:
@@ -18,150 +25,180 @@ def check_format(text: str) -> float:
 
     If – and only if – **all** structural constraints are met, return 1.0;
     otherwise return 0.0.  (GRPO expects a deterministic binary reward.)
-    """
 
-    try:
-
-        text = completion.strip()
-
-        # ──────────────────────────────────────────────────────────────
-        # Regex design notes
-        # ──────────────────────────────────────────────────────────────
-        #  • ^ … $         → anchor entire string (no junk before/after)
-        #  • (?:(?!<tag>).)*?  → tempered greedy token: consumes anything
-        #                       *except* the opening of that <tag> again,
-        #                       so we guarantee “exactly one” occurrence.
-        #  • [^<]+          → at least one character inside the leaf tags
-        #  • DOTALL flag    → "." matches newlines so pretty printing works
-        #  • IGNORECASE     → tags are case-insensitive (conservative choice)
-        #
-        # We only insist on *one* <ingredient> and *one* <step> to keep the
-        # check simple; the generator is free to add more – the look-ahead
-        # guards allow multiple as long as the outer structure is intact.
-        # ──────────────────────────────────────────────────────────────
-        recipe_regex = r"""
-            ^<think>                             # single think section …
-                (?:(?!<think>).)*?               #   … no nested <think>
-            </think>\s*                          # end </think> (trim ws)
-            <recipe>                             # single recipe section
-                (?:(?!<recipe>).)*?              #   … no nested <recipe>
-
-                <title>[^<]+</title>             # required title text
-
-                (?:(?!<recipe>).)*?              # anything until ingredients
-                <ingredients>                    # open ingredients
-                    (?:(?!</ingredients>).)*?    #   stuff but not </ingredients>
-                    <ingredient>[^<]+</ingredient> # ≥1 ingredient
-                    (?:(?!</ingredients>).)*?    #   (possibly more)
-                </ingredients>                   # close ingredients
-
-                (?:(?!<recipe>).)*?              # anything until instructions
-                <instructions>                   # open instructions
-                    (?:(?!</instructions>).)*?   #   stuff but not </instructions>
-                    <step>[^<]+</step>           # ≥1 step
-                    (?:(?!</instructions>).)*?   #   (possibly more)
-                </instructions>                  # close instructions
-
-                (?:(?!<recipe>).)*?              # anything else but no new <recipe>
-            </recipe>$                           # close recipe – end of string
-        """
-
-        # Compile once for speed and readability
-        pattern = re.compile(recipe_regex, re.DOTALL | re.IGNORECASE | re.VERBOSE)
-        return 1.0 if pattern.search(text) else 0.0
-
-    except Exception:        # any parsing or regex failure ⇒ 0 reward
-        return 0.0
+    The check is a single linear scan over the tags (see
+    `recipe_xml.validate_recipe_format`, which also reports *why* an output
+    was rejected), so long or adversarial completions cannot make it
+    backtrack.
+    """
+    with instrumentation.stage("rewards.check_format"):
+        ok, _ = validate_recipe_format(text)
+    return 1.0 if ok else 0.0
 
 
 def _avg_best_cosine(
     pred_items: List[str],
     golden_items: List[str],
     golden_embeddings: List[np.ndarray],
+    pred_embeddings: np.ndarray | None = None,
 ) -> float:
     """
     For every *predicted* item find its best cosine similarity against the
     *golden* items and average the scores.
 
+    `pred_embeddings` may carry the already-encoded predicted items (one row
+    per item); otherwise they are encoded here in a single batch.
+    `golden_embeddings` may be a row of a float16 or int8 gold store
+    (`embedding_store.quantize`).
+
     Returns 0 when either side is empty.
     """
     if not pred_items or not golden_items:
         return 0.0
 
-    scores: List[float] = []
+    if pred_embeddings is None:
+        pred_embeddings = encode_texts(pred_items)
 
-    # (Pre-encode golden once → ndarray list)
-    golden_emb_arr = [np.asarray(e).reshape(1, -1) for e in golden_embeddings]
+    # One (pred × gold) product on normalized rows, then a row-wise max.
+    return avg_best_cosine(pred_embeddings, as_matrix(golden_embeddings))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Per-batch context: every completion is parsed exactly once
+# ──────────────────────────────────────────────────────────────────────────────
+# The trainer calls each reward function with the same `completions` batch.
+# The first call parses every completion (format check + recipe) and later
+# calls, or the fused `compute_recipe_rewards`, reuse that work.
+_batch_context: dict = {"texts": None, "format": [], "recipes": [], "rewards": {}}
+
+# reward name → (recipe field, gold items kwarg, gold embeddings kwarg)
+_COSINE_FIELDS = {
+    "ingredients": ("ingredients", "parsed_ingredients", "ingredients_embeddings"),
+    "steps": ("steps", "instruction_steps", "instructions_embeddings"),
+}
 
-    for item in pred_items:
-        try:
-            pred_emb = embedder.encode([item]).reshape(1, -1)
-        except Exception:
-            # encoding failed – skip this item
-            continue
 
-        # find best similarity to any golden item
-        best = max(
-            cosine_similarity(pred_emb, gold_emb)[0][0] for gold_emb in golden_emb_arr
-        )
-        scores.append(best)
+def _parse_completion(text: str) -> tuple[float, dict | None]:
+    """
+    Format reward and parsed recipe of one completion.  The streaming parser
+    tolerates malformed XML inside the recipe, but a block never closed by
+    </recipe> (truncated output) yields None, so partial recipes earn no
+    cosine reward.  Text around the block does not matter here; that is what
+    the format reward scores.
+    """
+    fmt = check_format(text)
+    with instrumentation.stage("rewards.parse_recipe"):
+        parser = RecipeStreamParser()
+        parser.feed(text)
+        recipe = parser.close()
+    if recipe is None:
+        instrumentation.increment("rewards.parse_failures")
+    elif not parser.complete:
+        instrumentation.increment("rewards.incomplete_recipes")
+        recipe = None
+    if not fmt:
+        instrumentation.increment("rewards.format_failures")
+    return fmt, recipe
+
+
+def _get_batch_context(completions: List[List[dict]]) -> dict:
+    """Parse the batch, or return the context of the previous call on the same batch."""
+    global _batch_context
+    texts = tuple(comp[0]["content"] for comp in completions)
+    if _batch_context["texts"] != texts:
+        with instrumentation.stage("rewards.parse_batch"):
+            parsed = [_parse_completion(text) for text in texts]
+        _batch_context = {
+            "texts": texts,
+            "format": [fmt for fmt, _ in parsed],
+            "recipes": [recipe for _, recipe in parsed],
+            "rewards": {},
+        }
+    else:
+        instrumentation.increment("rewards.batch_context_hits")
+    return _batch_context
+
+
+def compute_recipe_rewards(completions: List[List[dict]], **kwargs) -> Dict[str, List[float]]:
+    """
+    Fused entry point: parse each completion once and return
 
-    return float(np.mean(scores)) if scores else 0.0
+        {"format": [...], "ingredients": [...], "steps": [...]}
 
+    "ingredients" / "steps" are only present when their gold kwargs (see
+    `cosine_ingredients_reward` / `cosine_steps_reward`) are supplied.
+    Completions without a complete <recipe> block score 0 without any
+    embedding work, and the predicted items of both fields are encoded together in one call.
+    """
+    context = _get_batch_context(completions)
+    cached = context["rewards"]
+    rewards: Dict[str, List[float]] = {"format": list(context["format"])}
 
+    todo = []
+    for name, (field, items_key, embeds_key) in _COSINE_FIELDS.items():
+        if items_key not in kwargs or embeds_key not in kwargs:
+            continue
+        gold_items, gold_embeds = kwargs[items_key], kwargs[embeds_key]
+        entry = cached.get(name)
+        if entry is not None and entry[0] is gold_items and entry[1] is gold_embeds:
+            rewards[name] = list(entry[2])
+            instrumentation.increment("rewards.cached_rewards")
+        else:
+            todo.append((name, field, gold_items, gold_embeds))
+    if not todo:
+        return rewards
+
+    # Only completions with a complete recipe and gold items need their lines encoded.
+    pred_lists = []
+    for _, field, gold_items, _ in todo:
+        pred_lists.append([
+            recipe[field] if recipe is not None and recipe[field] and gold_items[i] else []
+            for i, recipe in enumerate(context["recipes"])
+        ])
+    for (name, _, _, _), preds in zip(todo, pred_lists):
+        instrumentation.increment(f"rewards.{name}.empty_predictions", sum(not items for items in preds))
+    with instrumentation.stage("rewards.encode"):
+        pred_embeds = encode_nested([items for preds in pred_lists for items in preds])
+
+    for k, (name, _, gold_items, gold_embeds) in enumerate(todo):
+        embeds = pred_embeds[k * len(completions):(k + 1) * len(completions)]
+        gold_matrices = [
+            as_matrix(gold_embeds[i]) if pred_lists[k][i] else as_matrix([])
+            for i in range(len(completions))
+        ]
+        with instrumentation.stage("rewards.similarity"):
+            scores = batch_avg_best_cosine(embeds, gold_matrices)
+        # Map cosine range [-1,1] → [0,1]  (MiniLM usually >=0, but be safe)
+        rewards[name] = [max(0.0, float(score)) for score in scores]
+        cached[name] = (gold_items, gold_embeds, rewards[name])
 
-def _extract_recipe_xml(text: str) -> str | None:
-    """Return the *first* <recipe>…</recipe> block or None."""
-    _xml_pat = re.compile(r"<recipe>[\s\S]*?</recipe>", re.IGNORECASE)  # first recipe only
-    m = _xml_pat.search(text)
-    return m.group(0) if m else None
+    return rewards
 
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # GRPO-ready reward callables
 # ──────────────────────────────────────────────────────────────────────────────
+def format_reward(completions: List[List[dict]], **kwargs) -> List[float]:
+    """Binary `check_format` reward for every completion."""
+    return compute_recipe_rewards(completions)["format"]
+
+
 def cosine_ingredients_reward(completions: List[List[dict]], **kwargs) -> List[float]:
     """
     Soft reward in [0,1] based on average best-match cosine similarity of the
     *ingredient* lines.  Expects the dataset batch to supply
 
         kwargs["parsed_ingredients"]      # List[List[str]]
-        kwargs["ingredients_embeddings"]  # List[List[np.ndarray]]
-
-    """
-    gold_ing_list   = kwargs["parsed_ingredients"]      # batch-aligned
-    gold_ing_embeds = kwargs["ingredients_embeddings"]  # batch-aligned
+        kwargs["ingredients_embeddings"]  # List[List[np.ndarray]] or RaggedEmbeddings
 
-    rewards: List[float] = []
+    A `embedding_store.RaggedEmbeddings` batch is read through zero-copy
+    per-row views instead of rebuilding one array per item.
 
-    for i, comp in enumerate(completions):
-        text = comp[0]["content"]
-
-        # -------- parse predicted recipe ----------
-        xml_block = _extract_recipe_xml(text)
-        if xml_block is None:
-            rewards.append(0.0)
-            continue
-
-        parsed = parse_recipe_xml(xml_block)
-        if parsed is None:
-            rewards.append(0.0)
-            continue
-
-        pred_ingredients = parsed["ingredients"]
-
-        # -------- compute reward ----------
-        score = _avg_best_cosine(
-            pred_ingredients,
-            gold_ing_list[i],
-            gold_ing_embeds[i],
-        )
-
-        # Map cosine range [-1,1] → [0,1]  (MiniLM usually >=0, but be safe)
-        rewards.append(max(0.0, score))
-
-    return rewards
+    """
+    # Parsing (and, when the step kwargs are present too, encoding) is shared
+    # with the other reward callables through the per-batch context.
+    return compute_recipe_rewards(completions, **kwargs)["ingredients"]
 
 
 
@@ -173,34 +210,19 @@ def cosine_steps_reward(completions: List[List[dict]], **kwargs) -> List[float]:
         kwargs["instruction_steps"]
         kwargs["instructions_embeddings"]
     """
-    gold_steps_list   = kwargs["instruction_steps"]
-    gold_steps_embeds = kwargs["instructions_embeddings"]
+    return compute_recipe_rewards(completions, **kwargs)["steps"]
 
-    rewards: List[float] = []
 
-    for i, comp in enumerate(completions):
-        text = comp[0]["content"]
-
-        xml_block = _extract_recipe_xml(text)
-        if xml_block is None:
-            rewards.append(0.0)
-            continue
-
-        parsed = parse_recipe_xml(xml_block)
-        if parsed is None:
-            rewards.append(0.0)
-            continue
-
-        pred_steps = parsed["steps"]
-
-        score = _avg_best_cosine(
-            pred_steps,
-            gold_steps_list[i],
-            gold_steps_embeds[i],
-        )
-
-        rewards.append(max(0.0, score))
-
-    return rewards
+REWARD_WEIGHTS = {"format": 1.0, "ingredients": 1.0, "steps": 1.0}
 
 
+def recipe_reward(completions: List[List[dict]], **kwargs) -> List[float]:
+    """
+    All three rewards fused into one trainer callable: the `REWARD_WEIGHTS`
+    weighted sum of format, ingredient and step rewards.
+    """
+    rewards = compute_recipe_rewards(completions, **kwargs)
+    return [
+        sum(REWARD_WEIGHTS[name] * rewards[name][i] for name in rewards)
+        for i in range(len(completions))
+    ]
@@ -0,0 +1,131 @@
+"""
+Vectorized best-match cosine scoring.
+
+Both the GRPO rewards and the evals need, for every predicted line, its best
+cosine similarity against the golden lines.  Instead of one sklearn
+``cosine_similarity`` call per (pred, gold) pair, the rows are L2-normalized
+once and scored with a single ``pred @ gold.T`` product followed by a
+row-wise max/argmax.  ``batch_avg_best_cosine`` does the same for a whole GRPO
+group at once over zero-padded ``(batch, rows, dim)`` tensors.
+
+Normalization and dtype promotion follow sklearn's ``cosine_similarity``
+(zero vectors stay zero, float32 only when both sides are float32), so scores
+match the previous implementation up to float rounding.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def as_matrix(embeddings, dim: Optional[int] = None) -> np.ndarray:
+    """
+    Turn a list of vectors (lists, 1-D arrays) or a 2-D array into a 2-D array
+    without copying when it already is one.
+    """
+    matrix = np.asarray(embeddings)
+    if matrix.size == 0:
+        return matrix.reshape(0, dim if dim is not None else 0)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return matrix
+
+
+def _result_dtype(*arrays: np.ndarray) -> type:
+    """float32 only if every input is float32 (as sklearn does), else float64."""
+    return np.float32 if all(a.dtype == np.float32 for a in arrays) else np.float64
+
+
+def normalize_rows(matrix: np.ndarray, dtype=None) -> np.ndarray:
+    """L2-normalize the last axis; all-zero rows are left as zeros."""
+    matrix = np.asarray(matrix, dtype=dtype or _result_dtype(np.asarray(matrix)))
+    norms = np.sqrt(np.einsum("...ij,...ij->...i", matrix, matrix))
+    norms[norms == 0.0] = 1.0
+    return matrix / norms[..., np.newaxis]
+
+
+def cosine_matrix(pred: np.ndarray, gold: np.ndarray) -> np.ndarray:
+    """``(P, G)`` cosine similarities between the rows of `pred` and `gold`."""
+    pred, gold = as_matrix(pred), as_matrix(gold)
+    dtype = _result_dtype(pred, gold)
+    return normalize_rows(pred, dtype) @ normalize_rows(gold, dtype).T
+
+
+def best_match(pred: np.ndarray, gold: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best golden match for every predicted row.
+
+    Returns ``(scores, indices)`` of shape ``(P,)``; with no golden rows the
+    scores are -1 and the indices -1.
+    """
+    pred, gold = as_matrix(pred), as_matrix(gold)
+    if gold.shape[0] == 0 or pred.shape[0] == 0:
+        return np.full(pred.shape[0], -1.0), np.full(pred.shape[0], -1, dtype=np.int64)
+    similarities = cosine_matrix(pred, gold)
+    indices = similarities.argmax(axis=1)
+    return similarities[np.arange(len(indices)), indices], indices
+
+
+def avg_best_cosine(pred: np.ndarray, gold: np.ndarray) -> float:
+    """Mean over predicted rows of their best cosine against `gold`; 0 when either is empty."""
+    pred, gold = as_matrix(pred), as_matrix(gold)
+    if pred.shape[0] == 0 or gold.shape[0] == 0:
+        return 0.0
+    scores, _ = best_match(pred, gold)
+    return float(np.mean(scores))
+
+
+def _pad(matrices: Sequence[np.ndarray], dim: int, dtype) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack ragged ``(n_i, dim)`` matrices into ``(B, max n_i, dim)`` plus lengths."""
+    lengths = np.array([m.shape[0] for m in matrices], dtype=np.int64)
+    padded = np.zeros((len(matrices), max(lengths.max(initial=0), 1), dim), dtype=dtype)
+    for i, m in enumerate(matrices):
+        padded[i, :m.shape[0]] = m
+    return padded, lengths
+
+
+def batch_avg_best_cosine(
+    preds: Sequence[np.ndarray],
+    golds: Sequence[np.ndarray],
+    pred_lengths: Optional[np.ndarray] = None,
+    gold_lengths: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    `avg_best_cosine` for a whole batch in one NumPy product.
+
+    `preds` / `golds` are either ragged sequences of ``(n_i, dim)`` matrices or
+    already padded ``(B, N, dim)`` arrays together with their row lengths.
+    Returns a ``(B,)`` float64 array; rows with no predicted or no golden
+    items score 0.
+    """
+    if pred_lengths is None:
+        preds = [as_matrix(p) for p in preds]
+    if gold_lengths is None:
+        golds = [as_matrix(g) for g in golds]
+    if len(preds) == 0:
+        return np.zeros(0)
+
+    dims = [m.shape[-1] for m in list(preds) + list(golds) if m.size]
+    if not dims:
+        return np.zeros(len(preds))
+    dim = dims[0]
+    dtype = _result_dtype(*[m for m in list(preds) + list(golds) if m.size])
+
+    if pred_lengths is None:
+        pred_pad, pred_lengths = _pad([p if p.size else p.reshape(0, dim) for p in preds], dim, dtype)
+    else:
+        pred_pad, pred_lengths = np.asarray(preds, dtype=dtype), np.asarray(pred_lengths)
+    if gold_lengths is None:
+        gold_pad, gold_lengths = _pad([g if g.size else g.reshape(0, dim) for g in golds], dim, dtype)
+    else:
+        gold_pad, gold_lengths = np.asarray(golds, dtype=dtype), np.asarray(gold_lengths)
+
+    similarities = normalize_rows(pred_pad) @ normalize_rows(gold_pad).transpose(0, 2, 1)
+
+    gold_mask = np.arange(gold_pad.shape[1]) < gold_lengths[:, None]          # (B, G)
+    similarities = np.where(gold_mask[:, None, :], similarities, -np.inf)
+    best = similarities.max(axis=2)                                             # (B, P)
+
+    pred_mask = np.arange(pred_pad.shape[1]) < pred_lengths[:, None]           # (B, P)
+    valid = (pred_lengths > 0) & (gold_lengths > 0)
+    totals = np.where(pred_mask & valid[:, None], best, 0.0).sum(axis=1, dtype=np.float64)
+    return np.where(valid, totals / np.maximum(pred_lengths, 1), 0.0)
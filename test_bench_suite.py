@@ -0,0 +1,48 @@
+import unittest
+
+from benchmarks.bench_suite import COMPLETION_KINDS, Case, compare, synthetic_completions, time_case
+from rewards import check_format
+from utils import parse_recipe_xml
+
+
+class TestSyntheticCompletions(unittest.TestCase):
+    def setUp(self):
+        self.completions = synthetic_completions(20)
+
+    def test_kinds(self):
+        self.assertEqual(tuple(self.completions), COMPLETION_KINDS)
+        self.assertEqual(synthetic_completions(20), self.completions)  # seeded
+        self.assertTrue(all(len(text) > 15_000 for text in self.completions["huge"]))
+
+    def test_valid_and_broken_outputs(self):
+        for text in self.completions["valid"] + self.completions["huge"]:
+            self.assertEqual(check_format(text), 1.0)
+            self.assertIsNotNone(parse_recipe_xml(text))
+        for text in self.completions["truncated"] + self.completions["malformed"]:
+            self.assertEqual(check_format(text), 0.0, text)
+
+
+class TestBaselineComparison(unittest.TestCase):
+    BASELINE = {"parse": {"p50_ms": 1.0, "throughput": 1000.0}, "tiny": {"p50_ms": 0.01, "throughput": 1e5}}
+
+    def test_regressions_past_threshold(self):
+        results = {"parse": {"p50_ms": 1.2, "throughput": 830.0}, "tiny": {"p50_ms": 0.01, "throughput": 1e5}}
+        self.assertEqual(compare(results, self.BASELINE, threshold=0.25), [])
+        results["parse"]["p50_ms"] = 1.5
+        self.assertEqual(len(compare(results, self.BASELINE, threshold=0.25)), 1)
+
+    def test_timer_noise_and_new_cases_ignored(self):
+        results = {"tiny": {"p50_ms": 0.03, "throughput": 3e4}, "new": {"p50_ms": 9.0, "throughput": 1.0}}
+        self.assertEqual(compare(results, self.BASELINE), [])
+
+    def test_time_case(self):
+        calls = []
+        stats = time_case(Case("len", len, ["ab", "cde"], setup=lambda: calls.append(1)), repeat=3, warmup=1)
+        self.assertEqual(stats["calls"], 6)
+        self.assertEqual(len(calls), 7)
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertGreater(stats["throughput"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
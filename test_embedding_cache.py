@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, cache_key
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_cache(self, **kwargs):
+        return EmbeddingCache(self.tmp.name, "test-model", 4, **kwargs)
+
+    def test_miss_then_hit(self):
+        """Vectors written with put_many are returned by get_many."""
+        cache = self.make_cache()
+        self.assertEqual(cache.get_many(["1 cup sugar"]), [None])
+        cache.put_many(["1 cup sugar"], np.array([[1, 2, 3, 4]], dtype=np.float32))
+        np.testing.assert_array_equal(cache.get_many(["1 cup sugar"])[0], [1, 2, 3, 4])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_persists_across_instances(self):
+        """A new process sees vectors written by an earlier one through the memory map."""
+        vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+        self.make_cache().put_many(["salt", "2 eggs"], vectors)
+
+        reopened = self.make_cache()
+        self.assertEqual(len(reopened), 2)
+        np.testing.assert_array_equal(np.stack(reopened.get_many(["2 eggs", "salt"])), vectors[::-1])
+
+    def test_sees_rows_written_by_other_instance(self):
+        """A miss re-reads the index, picking up rows appended by another writer."""
+        reader = self.make_cache()
+        self.make_cache().put_many(["butter"], np.ones((1, 4), dtype=np.float32))
+        np.testing.assert_array_equal(reader.get_many(["butter"])[0], np.ones(4))
+
+    def test_key_uses_normalized_text_and_model(self):
+        """Whitespace differences share a key; different models do not."""
+        self.assertEqual(cache_key("m", "1  cup\nsugar "), cache_key("m", "1 cup sugar"))
+        self.assertNotEqual(cache_key("m", "1 cup sugar"), cache_key("other", "1 cup sugar"))
+
+    def test_lru_is_capped(self):
+        """The in-process LRU never holds more than max_memory_entries vectors."""
+        cache = self.make_cache(max_memory_entries=2)
+        texts = ["a", "b", "c"]
+        cache.put_many(texts, np.eye(3, 4, dtype=np.float32))
+        self.assertEqual(len(cache._lru), 2)
+        # Evicted entries are still served from disk.
+        np.testing.assert_array_equal(cache.get_many(["a"])[0], np.eye(3, 4)[0])
+
+if __name__ == '__main__':
+    unittest.main()
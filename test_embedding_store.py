@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+from datasets import Dataset, Features, Value
+
+import embeddings
+from embedding_store import Int8Embeddings, RaggedEmbeddings, embedding_column, embedding_feature, quantize
+from rewards import _avg_best_cosine, compute_recipe_rewards
+from test_support import VALID, completion, use_hashing_embedder
+
+
+class TestRaggedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.rows = [rng.normal(size=(n, 4)).astype(np.float32) for n in (2, 0, 3, 1)]
+        self.store = RaggedEmbeddings.from_rows(self.rows)
+
+    def test_rows_are_views_of_one_matrix(self):
+        self.assertEqual(self.store.values.shape, (6, 4))
+        self.assertEqual(self.store.lengths.tolist(), [2, 0, 3, 1])
+        for expected, row in zip(self.rows, self.store):
+            np.testing.assert_array_equal(row, expected)
+            self.assertTrue(row.base is self.store.values or row.size == 0)
+        self.assertEqual(self.store[-1].shape, (1, 4))
+        with self.assertRaises(IndexError):
+            self.store[4]
+
+    def test_slices(self):
+        batch = self.store[1:3]
+        self.assertEqual(len(batch), 2)
+        self.assertIs(batch.values, self.store.values)
+        np.testing.assert_array_equal(batch[1], self.rows[2])
+        self.assertEqual(len(self.store[3:1]), 0)
+        np.testing.assert_array_equal(self.store[::2][1], self.rows[2])
+
+    def test_arrow_round_trip_is_zero_copy(self):
+        array = self.store[1:].to_arrow()
+        self.assertEqual(str(array.type), "list<item: fixed_size_list<item: float>[4]>")
+        back = RaggedEmbeddings.from_arrow(array)
+        self.assertEqual(len(back), 3)
+        np.testing.assert_array_equal(back[1], self.rows[2])
+        flat = array.values.values.to_numpy(zero_copy_only=True)
+        self.assertTrue(np.shares_memory(back.values, flat))
+        # Sliced arrays keep their offsets into the shared child buffer.
+        np.testing.assert_array_equal(RaggedEmbeddings.from_arrow(array.slice(2))[0], self.rows[3])
+
+    def test_dataset_column(self):
+        features = Features({'id': Value('int64'), 'e': embedding_feature(4, "float16")})
+        dataset = Dataset.from_dict({'id': list(range(4)), 'e': self.rows}, features=features)
+        column = embedding_column(dataset, 'e')
+        self.assertEqual(column.dtype, np.float16)
+        np.testing.assert_allclose(column[2], self.rows[2], atol=1e-2)
+        reordered = embedding_column(dataset.select([3, 0]), 'e')
+        np.testing.assert_allclose(reordered[0], self.rows[3], atol=1e-2)
+        with self.assertRaises(ValueError):
+            embedding_feature(4, "float64")
+
+
+class TestQuantizedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.rows = [rng.normal(size=(n, 64)).astype(np.float32) for n in (3, 0, 5, 2)]
+        self.rows[3][1] = 0.0
+        self.store = RaggedEmbeddings.from_rows(self.rows)
+
+    def test_int8_round_trip(self):
+        q = quantize(self.store, "int8")
+        self.assertIsInstance(q, Int8Embeddings)
+        self.assertEqual(q.codes.dtype, np.int8)
+        self.assertLess(q.nbytes, self.store.nbytes * 0.3)
+        for expected, row in zip(self.rows, q):
+            self.assertEqual(row.shape, expected.shape)
+            # Rounding error is at most half a step of each vector's scale.
+            step = np.abs(expected).max(axis=1, initial=0.0, keepdims=True) / 127
+            self.assertTrue(np.all(np.abs(row - expected) <= step / 2 + 1e-6))
+        np.testing.assert_array_equal(q[3][1], 0.0)
+        np.testing.assert_array_equal(q[2:][0], q[2])
+        np.testing.assert_allclose(q.dequantize()[0], q[0])
+
+    def test_float16(self):
+        half = quantize(self.store, "float16")
+        self.assertEqual((half.dtype, half.nbytes < self.store.nbytes * 0.6), (np.float16, True))
+        with self.assertRaises(ValueError):
+            quantize(self.store, "int4")
+
+    def test_reward_error_is_small(self):
+        rng = np.random.default_rng(2)
+        pred = rng.normal(size=(4, 64)).astype(np.float32)
+        exact = _avg_best_cosine(["p"] * 4, ["g"], self.store[2], pred_embeddings=pred)
+        for dtype, tolerance in (("float16", 1e-3), ("int8", 1e-2)):
+            store = quantize(self.store, dtype)
+            approx = _avg_best_cosine(["p"] * 4, ["g"], store[2], pred_embeddings=pred)
+            self.assertAlmostEqual(approx, exact, delta=tolerance)
+
+    def test_dataset_column(self):
+        dataset = Dataset.from_dict({'e': self.rows}, features=Features({'e': embedding_feature(64)}))
+        self.assertIsInstance(embedding_column(dataset, 'e', dtype="int8"), Int8Embeddings)
+
+
+class TestRewardsWithRaggedGold(unittest.TestCase):
+    def setUp(self):
+        use_hashing_embedder(self)
+
+    def test_same_rewards_as_lists(self):
+        gold_items = [["2 cups flour", "1 egg"], ["sugar"], []]
+        gold_steps = [["Mix.", "Bake."], [], ["Serve."]]
+        ingredient_vectors = [embeddings.encode_texts(items) for items in gold_items]
+        step_vectors = [embeddings.encode_texts(steps) for steps in gold_steps]
+        completions = [completion(VALID), completion(VALID), completion("nope")]
+
+        as_lists = compute_recipe_rewards(
+            completions,
+            parsed_ingredients=gold_items, ingredients_embeddings=[list(v) for v in ingredient_vectors],
+            instruction_steps=gold_steps, instructions_embeddings=[list(v) for v in step_vectors],
+        )
+        as_ragged = compute_recipe_rewards(
+            completions,
+            parsed_ingredients=gold_items, ingredients_embeddings=RaggedEmbeddings.from_rows(ingredient_vectors),
+            instruction_steps=gold_steps, instructions_embeddings=RaggedEmbeddings.from_rows(step_vectors),
+        )
+        self.assertEqual(as_lists, as_ragged)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import embeddings
+from embeddings import MicroBatcher
+from test_support import HashingEncoder, use_hashing_embedder
+
+
+class RecordingEncoder(HashingEncoder):
+    """HashingEncoder that records the size of every model call."""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.sizes = []
+
+    def encode(self, texts, **kwargs):
+        self.sizes.append(len(texts))
+        time.sleep(self.delay)
+        return super().encode(texts, **kwargs)
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def make_batcher(self, encoder, **kwargs):
+        batcher = MicroBatcher(lambda texts, batch_size: encoder.encode(texts), **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def requests(self, n):
+        return [[f"request {i} item {j}" for j in range(i % 3 + 1)] for i in range(n)]
+
+    def test_concurrent_requests_are_coalesced(self):
+        encoder = RecordingEncoder(delay=0.01)
+        batcher = self.make_batcher(encoder, max_wait_ms=50)
+        requests = self.requests(16)
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(batcher.encode, requests))
+
+        reference = HashingEncoder()
+        for texts, vectors in zip(requests, results):
+            np.testing.assert_array_equal(vectors, reference.encode(texts))
+        self.assertLess(len(encoder.sizes), len(requests))
+        self.assertEqual(sum(encoder.sizes), sum(len(texts) for texts in requests))
+
+    def test_max_batch_size(self):
+        encoder = RecordingEncoder()
+        batcher = self.make_batcher(encoder, max_batch_size=4, max_wait_ms=20)
+        futures = [batcher.submit(["a", "b", "c"]) for _ in range(4)] + [batcher.submit(list("defghi"))]
+        futures += [batcher.submit(["j"]) for _ in range(3)]
+        self.assertEqual([len(future.result()) for future in futures], [3, 3, 3, 3, 6, 1, 1, 1])
+        # No batch overshoots the cap; the oversized request runs on its own.
+        self.assertTrue(all(size <= 4 or size == 6 for size in encoder.sizes), encoder.sizes)
+        self.assertEqual(encoder.sizes.count(6), 1)
+        self.assertEqual(sum(encoder.sizes), 21)
+
+    def test_errors_reach_every_caller(self):
+        def failing(texts, batch_size):
+            raise ValueError("model crashed")
+
+        batcher = MicroBatcher(failing, max_wait_ms=20)
+        self.addCleanup(batcher.close)
+        futures = [batcher.submit(["x"]) for _ in range(3)]
+        for future in futures:
+            with self.assertRaisesRegex(ValueError, "model crashed"):
+                future.result()
+        self.assertIsInstance(batcher.submit(["y"]).exception(), ValueError)  # the worker survives
+
+    def test_close_finishes_queued_requests(self):
+        batcher = MicroBatcher(lambda texts, batch_size: HashingEncoder().encode(texts), max_wait_ms=0)
+        future = batcher.submit(["late"])
+        batcher.close()
+        self.assertEqual(future.result().shape, (1, 32))
+        with self.assertRaises(RuntimeError):
+            batcher.submit(["after close"])
+
+
+class TestEncodeTextsMicroBatching(unittest.TestCase):
+    def setUp(self):
+        self.encoder = use_hashing_embedder(self, RecordingEncoder(delay=0.01))
+        embeddings.configure_micro_batching(max_wait_ms=50)
+        self.addCleanup(embeddings.configure_micro_batching, None)
+
+    def test_threads_share_model_calls(self):
+        groups = [[f"{i} cups flour", "1 egg"] for i in range(12)]
+        barrier = threading.Barrier(len(groups))
+
+        def encode(group):
+            barrier.wait()
+            return embeddings.encode_nested([group, group[:1]])
+
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            results = list(pool.map(encode, groups))
+
+        reference = HashingEncoder()
+        for group, (vectors, first) in zip(groups, results):
+            np.testing.assert_array_equal(vectors, reference.encode(group))
+            np.testing.assert_array_equal(first, reference.encode(group[:1]))
+        self.assertLess(len(self.encoder.sizes), len(groups))
+        # Strings shared across callers are sent to the model once per batch.
+        self.assertLess(sum(self.encoder.sizes), 2 * len(groups))
+
+
+if __name__ == "__main__":
+    unittest.main()
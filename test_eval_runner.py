@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import nltk
+import numpy as np
+
+import embeddings
+from eval_runner import load_results, run_eval, summarize_results
+from test_support import VALID, use_hashing_embedder
+
+_tokenize = nltk.tokenize.TreebankWordTokenizer().tokenize
+
+
+def golden_recipe(name, as_lists=True):
+    steps = [f"Mix the {name} and eggs.", "Bake."]
+    ingredients = [f"1 cup {name}", "2 eggs"]
+    instructions_embeddings = embeddings.encode_texts(steps)
+    ingredients_embeddings = embeddings.encode_texts(ingredients)
+    if as_lists:
+        instructions_embeddings = instructions_embeddings.tolist()
+        ingredients_embeddings = ingredients_embeddings.tolist()
+    return {
+        'id': f"recipe-{name}",
+        'instruction_steps': steps,
+        'parsed_ingredients': ingredients,
+        'instructions_embeddings': instructions_embeddings,
+        'ingredients_embeddings': ingredients_embeddings,
+    }
+
+
+@mock.patch("nltk.word_tokenize", _tokenize)
+class TestRunEval(unittest.TestCase):
+    def setUp(self):
+        use_hashing_embedder(self)
+
+        self.dataset = [golden_recipe(name) for name in ("sugar", "flour", "salt", "butter", "milk")]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "runs", "results.jsonl")
+        self.generated = []
+
+    def generate(self, conversations):
+        self.generated.extend(conversations)
+        return [VALID if "salt" not in messages else "no recipe here" for messages in conversations]
+
+    def run_eval(self, generate=None, **kwargs):
+        return run_eval(
+            self.dataset, self.path,
+            make_messages=lambda example: example['id'],
+            id_column='id', batch_size=2, generate=generate or self.generate, n_bootstrap=50, **kwargs
+        )
+
+    def test_results_streamed_and_summarized(self):
+        summary = self.run_eval()
+        records = load_results(self.path)
+        self.assertEqual(sorted(records), sorted(example['id'] for example in self.dataset))
+        self.assertIsNone(records["recipe-salt"]['prediction'])
+        self.assertEqual(records["recipe-sugar"]['prediction']['title'], "Cookies")
+        self.assertEqual(summary['n'], 5)
+        self.assertEqual(summary['unparsed'], 1)
+        self.assertEqual(summary, summarize_results(self.path, n_bootstrap=50))
+        self.assertIn('bleu_score.steps', summary['aggregate'])
+
+    def test_float32_gold_embeddings(self):
+        self.dataset = [golden_recipe(name, as_lists=False) for name in ("sugar", "salt")]
+        self.assertEqual(self.dataset[0]['ingredients_embeddings'].dtype, np.float32)
+        summary = self.run_eval()
+        self.assertEqual(summary['n'], 2)
+        metrics = load_results(self.path)["recipe-sugar"]['metrics']
+        self.assertIsInstance(metrics['cosine_similarity']['ingredients'], float)
+
+    def test_dataset_ids_read_as_one_column(self):
+        from datasets import Dataset
+
+        self.dataset = Dataset.from_list(self.dataset)
+        with mock.patch.object(Dataset, "__getitem__", wraps=self.dataset.__getitem__) as getitem:
+            self.assertEqual(self.run_eval()['n'], 5)
+        self.assertIn(mock.call('id'), getitem.call_args_list)
+        # Rows are only read once, when their batch is generated and scored.
+        self.assertEqual(sum(isinstance(call.args[0], int) for call in getitem.call_args_list), 5)
+        self.assertEqual(sorted(load_results(self.path)), sorted(self.dataset['id']))
+
+    def test_resume_skips_completed_ids(self):
+        def crash_after_first_batch(conversations):
+            if self.generated:
+                raise RuntimeError("out of memory")
+            return self.generate(conversations)
+
+        with self.assertRaises(RuntimeError):
+            self.run_eval(crash_after_first_batch)
+        self.assertEqual(len(load_results(self.path)), 2)
+
+        self.generated = []
+        summary = self.run_eval()
+        self.assertEqual(self.generated, ["recipe-salt", "recipe-butter", "recipe-milk"])
+        self.assertEqual(summary['n'], 5)
+
+    def test_failed_generations_are_retried(self):
+        def flaky(conversations):
+            self.generated.extend(conversations)
+            return [TimeoutError() if messages == "recipe-flour" else VALID for messages in conversations]
+
+        self.assertEqual(self.run_eval(flaky)['n'], 4)
+        self.generated = []
+        self.assertEqual(self.run_eval()['n'], 5)
+        self.assertEqual(self.generated, ["recipe-flour"])
+
+    def test_truncated_line_is_ignored(self):
+        self.run_eval()
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(lines[:-1])
+            f.write(lines[-1][:20])
+
+        self.generated = []
+        summary = self.run_eval()
+        self.assertEqual(self.generated, [json.loads(lines[-1])['id']])
+        self.assertEqual(summary['n'], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import contextlib
+import functools
+import io
+import multiprocessing
+import random
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import nltk
+import numpy as np
+from rouge_score import rouge_scorer
+
+import embeddings
+import evals
+from test_support import use_hashing_embedder
+
+# nltk.word_tokenize needs the punkt models, which are not available offline;
+# the Treebank tokenizer it wraps is enough to compare the two code paths.
+_tokenize = nltk.tokenize.TreebankWordTokenizer().tokenize
+
+WORDS = "the a cup of flour sugar mix bake until golden , . 350 ° stir in eggs".split()
+
+
+def sentence(rng, max_words):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, max_words)))
+
+
+@mock.patch("nltk.word_tokenize", _tokenize)
+class TestBleuScorer(unittest.TestCase):
+    def test_identical_to_sentence_bleu(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            reference, hypothesis = sentence(rng, 25), sentence(rng, 12)
+            self.assertEqual(
+                evals.BleuScorer(reference).score(hypothesis),
+                evals.compute_bleu_score(reference, hypothesis),
+                (reference, hypothesis),
+            )
+
+    def test_best_item_matches_pairwise_loop(self):
+        rng = random.Random(1)
+        gold = [sentence(rng, 8) for _ in range(12)]
+        preds = [sentence(rng, 8) for _ in range(12)]
+        expected = []
+        for pred in preds:
+            expected.append(max([0] + [evals.compute_bleu_score(ref, pred) for ref in gold]))
+        references = evals.BleuReferenceSet(gold)
+        self.assertEqual([references.best_score(pred) for pred in preds], expected)
+        self.assertEqual(references.average_best_score(preds), sum(expected) / len(expected))
+        self.assertEqual(evals.BleuReferenceSet(gold).average_best_score([]), 0)
+
+    def test_reference_is_tokenized_once(self):
+        with mock.patch("evals.bleu_tokenize", wraps=evals.bleu_tokenize) as tokenize:
+            scorer = evals.BleuScorer("Mix the flour. Bake until golden.")
+            scorer.score_many(["mix flour", "bake", "stir in eggs"])
+        self.assertEqual(tokenize.call_count, 4)
+
+
+class TestRougeReferenceSet(unittest.TestCase):
+    WORDS = WORDS + ["mixing", "baked", "stirring", "Eggs", "running", "ran"]
+
+    def sentence(self, rng, max_words):
+        return " ".join(rng.choice(self.WORDS) for _ in range(rng.randint(0, max_words)))
+
+    def test_identical_to_rouge_score(self):
+        reference_scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
+        rng = random.Random(0)
+        for _ in range(300):
+            references = [self.sentence(rng, 12) for _ in range(rng.randint(1, 6))]
+            hypothesis = self.sentence(rng, 10)
+            rouge1, rougeL = evals.RougeReferenceSet(references).score(hypothesis)
+            for k, reference in enumerate(references):
+                expected = reference_scorer.score(reference, hypothesis)
+                self.assertEqual(rouge1[k], expected['rouge1'].fmeasure, (reference, hypothesis))
+                self.assertEqual(rougeL[k], expected['rougeL'].fmeasure, (reference, hypothesis))
+                self.assertEqual(evals.compute_rouge_scores(reference, hypothesis), expected)
+
+    def test_best_item_matches_pairwise_loop(self):
+        reference_scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
+        rng = random.Random(1)
+        for _ in range(100):
+            references = [self.sentence(rng, 8) for _ in range(rng.randint(0, 8))]
+            hypothesis = self.sentence(rng, 8)
+            best_avg, expected = 0, (0, 0)
+            for reference in references:
+                scores = reference_scorer.score(reference, hypothesis)
+                avg = (scores['rouge1'].fmeasure + scores['rougeL'].fmeasure) / 2
+                if avg > best_avg:
+                    best_avg, expected = avg, (scores['rouge1'].fmeasure, scores['rougeL'].fmeasure)
+            self.assertEqual(evals.compute_best_item_rouge(hypothesis, references), expected)
+
+    def test_lcs_does_not_cross_references(self):
+        """A subsequence spread over two references must not count for either."""
+        references = evals.RougeReferenceSet(["flour sugar", "eggs butter"])
+        _, rougeL = references.score("sugar eggs")
+        self.assertEqual(rougeL.tolist(), [0.5, 0.5])
+        self.assertEqual(evals.RougeReferenceSet([]).average_best(["flour"]), (0, 0))
+
+
+@mock.patch("nltk.word_tokenize", _tokenize)
+class TestComputeEvalsBatch(unittest.TestCase):
+    def setUp(self):
+        use_hashing_embedder(self)
+
+        rng = random.Random(0)
+        self.golden, self.preds = [], []
+        for _ in range(9):
+            steps = [sentence(rng, 10) for _ in range(rng.randint(1, 4))]
+            ingredients = [sentence(rng, 4) for _ in range(rng.randint(1, 5))]
+            self.golden.append({
+                'instruction_steps': steps,
+                'parsed_ingredients': ingredients,
+                'instructions_embeddings': embeddings.encode_texts(steps).tolist(),
+                'ingredients_embeddings': embeddings.encode_texts(ingredients).tolist(),
+            })
+            self.preds.append({
+                'title': "Dish",
+                'steps': [sentence(rng, 10) for _ in range(rng.randint(0, 4))],
+                'ingredients': [sentence(rng, 4) for _ in range(rng.randint(0, 5))],
+            })
+        self.preds[4] = None
+
+    def test_matches_compute_evals(self):
+        result = evals.compute_evals_batch(self.preds, self.golden, chunk_size=4, n_bootstrap=200)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [
+                evals.compute_evals(pred or {'steps': [], 'ingredients': []}, gold)
+                for pred, gold in zip(self.preds, self.golden)
+            ]
+        self.assertEqual(len(result['examples']), len(expected))
+        for got, want in zip(result['examples'], expected):
+            got, want = evals.flatten_metrics(got), evals.flatten_metrics(want)
+            self.assertEqual(got.keys(), want.keys())
+            for name in want:
+                self.assertAlmostEqual(got[name], want[name], places=6, msg=name)
+
+        for name, stats in result['aggregate'].items():
+            values = [evals.flatten_metrics(example)[name] for example in expected]
+            self.assertAlmostEqual(stats['mean'], float(np.mean(values)), places=6)
+            self.assertLessEqual(stats['ci_low'], stats['mean'] + 1e-12)
+            self.assertGreaterEqual(stats['ci_high'], stats['mean'] - 1e-12)
+
+    def test_single_encode_pass_and_no_printing(self):
+        encoder = embeddings.get_embedder()
+        calls = encoder.calls
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            evals.compute_evals_batch(self.preds, self.golden, n_bootstrap=10)
+        self.assertEqual(encoder.calls - calls, 1)
+        self.assertEqual(out.getvalue(), "")
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs the fork start method")
+    def test_process_pool_matches_serial(self):
+        # Forked workers inherit the word_tokenize patch; spawned ones would need punkt.
+        fork_pool = functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("fork"))
+        serial = evals.compute_evals_batch(self.preds, self.golden, chunk_size=2, seed=3)
+        with mock.patch("concurrent.futures.ProcessPoolExecutor", fork_pool):
+            parallel = evals.compute_evals_batch(self.preds, self.golden, num_proc=2, chunk_size=2, seed=3)
+        self.assertEqual(parallel, serial)
+
+    def test_length_mismatch_and_empty(self):
+        with self.assertRaises(ValueError):
+            evals.compute_evals_batch(self.preds, self.golden[:-1])
+        self.assertEqual(evals.compute_evals_batch([], []), {'examples': [], 'aggregate': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
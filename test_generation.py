@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import together  # noqa: F401
+except ImportError:
+    together = None
+
+import response_cache
+from generation import TokenBucket, generate_responses
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-style /chat/completions endpoint that echoes the prompt."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][0]["content"]
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            fail = server.failures.get(prompt, 0) > 0
+            if fail:
+                server.failures[prompt] -= 1
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        if fail:
+            payload, status = {"error": {"message": "overloaded"}}, 503
+        else:
+            payload, status = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"echo: {prompt}"}}],
+            }, 200
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(together is None, "together SDK not installed")
+class TestConcurrentGeneration(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = self.server.in_flight = self.server.max_in_flight = 0
+        self.server.failures = {}
+        self.server.delay = 0.05
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        env = mock.patch.dict(os.environ, {"TOGETHER_API_KEY": "stub-key"})
+        env.start()
+        self.addCleanup(env.stop)
+        response_cache.configure_response_cache(None)
+        self.addCleanup(response_cache.configure_response_cache, None)
+
+    def batches(self, n):
+        return [[{"role": "user", "content": f"image {i}"}] for i in range(n)]
+
+    def test_results_keep_order_and_concurrency_is_bounded(self):
+        responses = generate_responses(self.batches(12), base_url=self.base_url, max_concurrency=4)
+        self.assertEqual(responses, [f"echo: image {i}" for i in range(12)])
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def test_transient_errors_are_retried(self):
+        self.server.failures = {"image 1": 2}
+        responses = generate_responses(self.batches(3), base_url=self.base_url, base_delay=0.01)
+        self.assertEqual(responses[1], "echo: image 1")
+        self.assertEqual(self.server.requests, 5)
+
+    def test_exhausted_retries_can_be_returned(self):
+        self.server.failures = {"image 0": 10}
+        responses = generate_responses(self.batches(2), base_url=self.base_url, base_delay=0.01,
+                                       max_retries=1, return_exceptions=True)
+        self.assertIsInstance(responses[0], together.APIStatusError)
+        self.assertEqual(responses[1], "echo: image 1")
+
+    def test_cache_replays_greedy_requests_only(self):
+        """temperature=0 is served from the cache; sampled requests need replay=True."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        response_cache.configure_response_cache(os.path.join(tmp.name, "generations.sqlite"))
+
+        for _ in range(2):
+            generate_responses(self.batches(2), base_url=self.base_url, temperature=0)
+        self.assertEqual(self.server.requests, 2)
+
+        generate_responses(self.batches(2), base_url=self.base_url, temperature=0.7)
+        self.assertEqual(self.server.requests, 4)
+        replayed = generate_responses(self.batches(2), base_url=self.base_url, temperature=0.7, replay=True)
+        self.assertEqual(self.server.requests, 4)
+        self.assertEqual(replayed, ["echo: image 0", "echo: image 1"])
+
+    def test_requests_are_not_hashed_without_a_cache(self):
+        with mock.patch.object(response_cache, "request_key", wraps=response_cache.request_key) as key:
+            generate_responses(self.batches(2), base_url=self.base_url, temperature=0)
+        key.assert_not_called()
+
+
+class TestRequestKey(unittest.TestCase):
+    def image_message(self, payload):
+        return [{"role": "user", "content": [
+            {"type": "text", "text": "recipe?"},
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{payload}"}},
+        ]}]
+
+    def test_key_depends_on_image_and_sampling_params(self):
+        key = response_cache.request_key("m", self.image_message("AAAA"), 1000, 0.0, seed=1)
+        self.assertEqual(key, response_cache.request_key("m", self.image_message("AAAA"), 1000, 0.0, seed=1))
+        self.assertNotEqual(key, response_cache.request_key("m", self.image_message("BBBB"), 1000, 0.0, seed=1))
+        self.assertNotEqual(key, response_cache.request_key("m", self.image_message("AAAA"), 1000, 0.0, seed=2))
+        self.assertNotEqual(key, response_cache.request_key("m", self.image_message("AAAA"), 500, 0.0, seed=1))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_is_enforced_after_burst(self):
+        async def run():
+            bucket = TokenBucket(rate=50, capacity=1)
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - start
+        self.assertGreaterEqual(asyncio.run(run()), 0.09)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import base64
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from images import (
+    EncodedImageCache,
+    example_image_base64,
+    image_is_valid,
+    image_message,
+    prepare_image,
+    prepare_images,
+)
+
+
+class TestLazyImageEncoding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_image_is_valid(self):
+        self.assertTrue(image_is_valid(self.write("a.jpg", b"jpeg")))
+        self.assertFalse(image_is_valid(self.write("empty.jpg", b"")))
+        self.assertFalse(image_is_valid(os.path.join(self.tmp.name, "missing.jpg")))
+        self.assertFalse(image_is_valid(self.tmp.name))
+        self.assertFalse(image_is_valid(None))
+
+    def test_cache_hits_and_byte_cap(self):
+        """Payloads are encoded once and the LRU never exceeds its byte budget."""
+        cache = EncodedImageCache(max_bytes=16)
+        a = self.write("a.jpg", b"x" * 9)  # 12 base64 chars
+        b = self.write("b.jpg", b"y" * 9)
+        self.assertEqual(cache.encode(a), base64.b64encode(b"x" * 9).decode())
+        cache.encode(a)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.encode(b)
+        self.assertLessEqual(cache._bytes, 16)
+        self.assertEqual(len(cache._entries), 1)
+
+    def test_rewritten_file_is_re_encoded(self):
+        cache = EncodedImageCache()
+        path = self.write("a.jpg", b"old")
+        cache.encode(path)
+        os.utime(path, ns=(0, 0))
+        self.write("a.jpg", b"newer")
+        self.assertEqual(cache.encode(path), base64.b64encode(b"newer").decode())
+
+    def test_example_in_either_mode(self):
+        path = self.write("a.jpg", b"jpeg")
+        expected = base64.b64encode(b"jpeg").decode()
+        self.assertEqual(example_image_base64({"image_path": path}), expected)
+        self.assertEqual(example_image_base64({"base64_image": expected}), expected)
+
+    def test_image_message_needs_an_image(self):
+        path = self.write("a.jpg", b"jpeg")
+        url = image_message("recipe?", {"image_path": path})[0]["content"][1]["image_url"]["url"]
+        self.assertEqual(url, "data:image/jpeg;base64," + base64.b64encode(b"jpeg").decode())
+        with self.assertRaisesRegex(ValueError, "no image"):
+            image_message("recipe?", {"base64_image": None, "image_path": None})
+
+
+class TestPrepareImage(unittest.TestCase):
+    def setUp(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest("Pillow is not installed")
+        self.Image = Image
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_dir = os.path.join(self.tmp.name, "thumbs")
+
+    def write_image(self, name, size, fmt="PNG", **save_args):
+        path = os.path.join(self.tmp.name, name)
+        noise = os.urandom(size[0] * size[1] * 3)
+        self.Image.frombytes("RGB", size, noise).save(path, format=fmt, **save_args)
+        return path
+
+    def test_downscales_and_reports_savings(self):
+        path = self.write_image("big.png", (640, 320))
+        report = prepare_image(path, max_side=128, quality=70, cache_dir=self.cache_dir)
+        self.assertFalse(report['cached'])
+        self.assertNotEqual(report['path'], path)
+        with self.Image.open(report['path']) as thumb:
+            self.assertEqual(thumb.format, "JPEG")
+            self.assertEqual(thumb.size, (128, 64))
+        self.assertEqual(report['original_bytes'], os.path.getsize(path))
+        self.assertEqual(report['bytes_saved'], report['original_bytes'] - report['thumbnail_bytes'])
+        self.assertGreater(report['bytes_saved'], 0)
+
+    def test_thumbnail_is_reused_by_content_hash(self):
+        """A byte-identical copy under another name hits the same thumbnail."""
+        path = self.write_image("a.png", (300, 300))
+        first = prepare_image(path, max_side=100, cache_dir=self.cache_dir)
+        copy_path = os.path.join(self.tmp.name, "copy.png")
+        with open(path, "rb") as src, open(copy_path, "wb") as dst:
+            dst.write(src.read())
+        second = prepare_image(copy_path, max_side=100, cache_dir=self.cache_dir)
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['path'], first['path'])
+        # Different settings produce a different thumbnail.
+        other = prepare_image(path, max_side=50, cache_dir=self.cache_dir)
+        self.assertNotEqual(other['path'], first['path'])
+
+    def test_keeps_original_when_not_smaller(self):
+        path = self.write_image("tiny.jpg", (32, 32), fmt="JPEG", quality=20)
+        report = prepare_image(path, max_side=512, quality=100, cache_dir=self.cache_dir)
+        self.assertEqual((report['path'], report['bytes_saved']), (path, 0))
+        self.assertTrue(prepare_image(path, max_side=512, quality=100, cache_dir=self.cache_dir)['cached'])
+
+    def test_prepare_images_skips_unreadable_files(self):
+        path = self.write_image("a.png", (200, 100))
+        missing = os.path.join(self.tmp.name, "missing.jpg")
+        with contextlib.redirect_stdout(io.StringIO()):
+            reports = prepare_images([path, missing], max_side=64, cache_dir=self.cache_dir)
+        self.assertIsNotNone(reports[0])
+        self.assertIsNone(reports[1])
+
+    def test_failed_save_leaves_no_temp_file(self):
+        path = self.write_image("a.png", (200, 100))
+        with mock.patch.object(self.Image.Image, "save", side_effect=OSError("disk full")):
+            with self.assertRaisesRegex(OSError, "disk full"):
+                prepare_image(path, max_side=64, cache_dir=self.cache_dir)
+        leftovers = [name for _, _, names in os.walk(self.cache_dir) for name in names]
+        self.assertEqual(leftovers, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from datasets import Dataset
+
+from incremental_preprocess import FINGERPRINT_COLUMN, preprocess_dataset_incremental, settings_fingerprint
+from test_support import use_hashing_embedder
+
+
+class TestIncrementalPreprocess(unittest.TestCase):
+    def setUp(self):
+        self.encoder = use_hashing_embedder(self)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output_dir = os.path.join(self.tmp.name, "out")
+        self.rows = [self.row(i) for i in range(6)]
+
+    def row(self, i):
+        image_path = os.path.join(self.tmp.name, f"{i}.jpg")
+        if not os.path.exists(image_path):
+            with open(image_path, "wb") as f:
+                f.write(b"jpeg %d" % i)
+        return {
+            'Title': f"Dish {i}",
+            'Ingredients': str([f"{i} cups flour", "1 egg"]),
+            'Cleaned_Ingredients': str(["flour", "egg"]),
+            'Instructions': f"Mix {i}.\nBake.",
+            'full_image_path': image_path,
+        }
+
+    def run_incremental(self, rows, **kwargs):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            result = preprocess_dataset_incremental(Dataset.from_list(rows), self.output_dir, image_mode="path", **kwargs)
+        return result, out.getvalue()
+
+    def test_only_changed_rows_are_recomputed(self):
+        first, log = self.run_incremental(self.rows)
+        self.assertIn("Reusing 0 cached rows, processing 6", log)
+
+        rows = self.rows + [self.row(6), self.row(7)]
+        rows[2] = dict(rows[2], Instructions="Fry.")   # changed text
+        rows[4] = dict(rows[4], Title="Renamed")        # not fingerprinted
+        os.utime(rows[5]['full_image_path'], ns=(0, 0))  # touched image
+        second, log = self.run_incremental(rows)
+        self.assertIn("Reusing 4 cached rows, processing 4 new or changed rows", log)
+
+        self.assertEqual(second['Title'], [r['Title'] for r in rows])
+        self.assertEqual(second[2]['instruction_steps'], ["Fry."])
+        self.assertEqual(second[0]['ingredients_embeddings'], first[0]['ingredients_embeddings'])
+
+        # A full rebuild gives the same rows.
+        rebuilt, _ = self.run_incremental(rows, embed_batch_size=3)
+        self.assertEqual(rebuilt.to_list(), second.to_list())
+
+    def test_unchanged_rerun_reuses_everything(self):
+        first, _ = self.run_incremental(self.rows)
+        calls = self.encoder.calls
+        second, log = self.run_incremental(self.rows)
+        self.assertIn("processing 0 new or changed rows", log)
+        self.assertEqual(self.encoder.calls, calls)
+        self.assertEqual(second.to_list(), first.to_list())
+
+    def test_missing_images_are_retried(self):
+        os.remove(self.rows[1]['full_image_path'])
+        first, _ = self.run_incremental(self.rows)
+        self.assertEqual(len(first), 5)
+        self.row(1)  # the image appears
+        second, log = self.run_incremental(self.rows)
+        self.assertIn("Reusing 5 cached rows, processing 1", log)
+        self.assertEqual(len(second), 6)
+
+    def test_settings_are_fingerprinted(self):
+        self.assertEqual(settings_fingerprint(), settings_fingerprint(image_mode="base64"))
+        self.assertNotEqual(settings_fingerprint(), settings_fingerprint(embedding_dtype="float16"))
+        self.run_incremental(self.rows)
+        result, log = self.run_incremental(self.rows, embedding_dtype="float16")
+        self.assertIn("Reusing 0 cached rows", log)
+        self.assertIn(FINGERPRINT_COLUMN, result.column_names)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+import embeddings
+import instrumentation
+import rewards
+from test_support import VALID, completion, use_hashing_embedder
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        use_hashing_embedder(self)
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+        instrumentation.reset()
+
+        rewards._batch_context = {"texts": None, "format": [], "recipes": [], "rewards": {}}
+        self.completions = [completion(VALID), completion("no recipe"), completion(VALID.replace("</recipe>", ""))]
+        self.gold = {
+            'parsed_ingredients': [["1 cup sugar"], ["2 eggs"], ["1 cup sugar"]],
+            'ingredients_embeddings': [embeddings.encode_texts(["1 cup sugar"])] * 3,
+            'instruction_steps': [["Mix."], ["Bake."], ["Mix."]],
+            'instructions_embeddings': [embeddings.encode_texts(["Mix."])] * 3,
+        }
+
+    def test_disabled_records_nothing(self):
+        rewards.compute_recipe_rewards(self.completions, **self.gold)
+        self.assertEqual(instrumentation.snapshot(), {'stages': {}, 'counters': {}})
+
+    def test_reward_stages_and_counters(self):
+        instrumentation.enable()
+        rewards.cosine_ingredients_reward(self.completions, **self.gold)
+        rewards.cosine_steps_reward(self.completions, **self.gold)
+        snapshot = instrumentation.snapshot()
+
+        self.assertEqual(snapshot['stages']['rewards.parse_batch']['calls'], 1)
+        self.assertEqual(snapshot['stages']['rewards.check_format']['calls'], 3)
+        self.assertEqual(snapshot['stages']['rewards.encode']['calls'], 1)
+        self.assertGreaterEqual(snapshot['stages']['rewards.similarity']['seconds'], 0.0)
+        self.assertEqual(snapshot['counters']['rewards.parse_failures'], 1)
+        self.assertEqual(snapshot['counters']['rewards.format_failures'], 2)
+        self.assertEqual(snapshot['counters']['rewards.batch_context_hits'], 1)
+        self.assertEqual(snapshot['counters']['rewards.cached_rewards'], 2)
+        self.assertEqual(snapshot['counters']['rewards.ingredients.empty_predictions'], 2)
+
+    def test_embedding_cache_counters(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            embeddings.configure_embedding_cache(cache_dir)
+            instrumentation.enable()
+            embeddings.encode_texts(["a", "b", "a"])
+            embeddings.encode_texts(["a", "c"])
+            counters = instrumentation.snapshot()['counters']
+            embeddings.configure_embedding_cache(None)
+        self.assertEqual(counters['embeddings.cache_misses'], 3)
+        self.assertEqual(counters['embeddings.cache_hits'], 1)
+        self.assertEqual(counters['embeddings.texts_encoded'], 3)
+
+    def test_prometheus_text_file(self):
+        instrumentation.enable()
+        with instrumentation.stage("rewards.encode"):
+            pass
+        instrumentation.increment("utils.parse_failures", 2)
+        text = instrumentation.prometheus_text()
+        self.assertIn('# TYPE inverse_cooking_stage_seconds_total counter', text)
+        self.assertIn('inverse_cooking_stage_calls_total{stage="rewards.encode"} 1', text)
+        self.assertIn('inverse_cooking_utils_parse_failures_total 2', text)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.prom")
+            instrumentation.write_prometheus(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), text)
+            self.assertEqual(os.listdir(tmp), ["metrics.prom"])
+
+
+if __name__ == "__main__":
+    unittest.main()
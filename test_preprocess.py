@@ -0,0 +1,106 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+from datasets import Dataset
+
+from embedding_store import embedding_column
+from test_support import use_hashing_embedder
+from utils import (
+    parse_ingredients,
+    parse_ingredients_column,
+    parse_instructions,
+    parse_instructions_column,
+    preprocess_dataset,
+)
+
+
+class TestColumnParsing(unittest.TestCase):
+    """The column-level parsers must agree with the per-row functions exactly."""
+
+    def texts(self):
+        rng = random.Random(0)
+        pieces = ["'", "\\", "\n", "\r\n", " ", "\t", "\x85", "a", "é", ", ", "', '", "['", "']", '"', "[", "]"]
+        texts = [None, "", "[]", "['']", "\n \n", "['1 cup flour', '2 eggs']",
+                 str(["Kellogg's cereal", 'milk']), "['a\\'b', 'c']", "['unterminated"]
+        texts += ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 25))) for _ in range(3000)]
+        # Well-formed list literals with awkward items
+        texts += [str(["".join(rng.choice(pieces[:9]) for _ in range(rng.randint(0, 6)))
+                       for _ in range(rng.randint(1, 4))]) for _ in range(3000)]
+        return texts
+
+    def test_ingredients(self):
+        texts = self.texts()
+        expected = [parse_ingredients(text) for text in texts]
+        self.assertEqual(parse_ingredients_column(texts).to_pylist(), expected)
+        chunked = pa.chunked_array([pa.array(texts[:100]), pa.array(texts[100:])])
+        self.assertEqual(parse_ingredients_column(chunked).to_pylist(), expected)
+        self.assertEqual(parse_ingredients_column([["already", "parsed"], None]).to_pylist(), [["already", "parsed"], []])
+        self.assertEqual(parse_ingredients_column([]).to_pylist(), [])
+
+    def test_instructions(self):
+        texts = self.texts()
+        column = parse_instructions_column(pa.array(texts))
+        self.assertEqual(column.type, pa.list_(pa.string()))
+        self.assertEqual(column.to_pylist(), [parse_instructions(text) for text in texts])
+        self.assertEqual(parse_instructions_column([]).to_pylist(), [])
+
+
+class TestPreprocessDataset(unittest.TestCase):
+    def setUp(self):
+        self.encoder = use_hashing_embedder(self)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rows = []
+        for i in range(12):
+            image_path = os.path.join(self.tmp.name, f"{i}.jpg")
+            if i % 4:  # every fourth image is missing
+                with open(image_path, "wb") as f:
+                    f.write(b"jpeg %d" % i)
+            rows.append({
+                'Title': f"Dish {i}",
+                'Ingredients': str([f"{i} cups flour", "1 egg"]),
+                'Cleaned_Ingredients': str(["flour", "egg"]),
+                'Instructions': f"Mix {i}.\n\nBake.\n",
+                'full_image_path': image_path,
+            })
+        self.dataset = Dataset.from_list(rows)
+
+    def preprocess(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return preprocess_dataset(self.dataset, **kwargs)
+
+    def test_parses_filters_and_embeds(self):
+        result = self.preprocess(image_mode="path", batch_size=5, embed_batch_size=8)
+        self.assertEqual(result['Title'], [f"Dish {i}" for i in range(12) if i % 4])
+        row = result[0]
+        self.assertEqual(row['parsed_ingredients'], parse_ingredients(self.dataset[1]['Ingredients']))
+        self.assertEqual(row['instruction_steps'], parse_instructions(self.dataset[1]['Instructions']))
+        self.assertEqual(np.asarray(row['ingredients_embeddings']).shape, (2, 32))
+        gold = embedding_column(result, 'ingredients_embeddings')
+        self.assertEqual((gold.values.shape, gold.dtype), ((18, 32), np.float32))
+        # 9 surviving rows in batches of 8 rows: two encode calls in the main process.
+        self.assertEqual(self.encoder.calls, 2)
+
+    def test_float16_storage(self):
+        result = self.preprocess(image_mode="path", embedding_dtype="float16")
+        self.assertEqual(embedding_column(result, 'instructions_embeddings').dtype, np.float16)
+
+    def test_unsupported_dtype_fails_before_any_work(self):
+        with self.assertRaisesRegex(ValueError, "embedding_dtype"):
+            self.preprocess(embedding_dtype="bfloat16")
+        self.assertEqual(self.encoder.calls, 0)
+
+    def test_worker_pool_matches_single_process(self):
+        serial = self.preprocess(batch_size=4)
+        parallel = self.preprocess(batch_size=4, num_proc=2)
+        self.assertEqual(serial.to_list(), parallel.to_list())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+from datasets import Dataset
+
+from recipe_dataset import load_recipe_dataset
+
+
+class TestLoadRecipeDataset(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.image_dir = os.path.join(self.tmp.name, "Food Images")
+        os.mkdir(self.image_dir)
+        rows = []
+        for i in range(40):
+            rows.append({
+                'Title': f"Dish, \"number\" {i}",
+                'Ingredients': str([f"{i} cups flour", "1 egg, beaten"]),
+                'Instructions': f"Mix {i}.\nBake until golden.\n\nServe.",
+                'Image_Name': f"dish-{i}",
+                'Cleaned_Ingredients': str(["flour", "egg"]),
+            })
+            if i % 7:
+                open(os.path.join(self.image_dir, f"dish-{i}.jpg"), "wb").close()
+        self.csv_path = os.path.join(self.tmp.name, "recipes.csv")
+        pd.DataFrame(rows).to_csv(self.csv_path)
+
+    def load(self, **kwargs):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            dataset = load_recipe_dataset(self.csv_path, self.image_dir, block_size=512, **kwargs)
+        return dataset, out.getvalue()
+
+    def baseline(self):
+        """The notebook's pandas loader."""
+        df = pd.read_csv(self.csv_path)
+        df['full_image_path'] = df['Image_Name'].apply(lambda x: os.path.join(self.image_dir, f"{x}.jpg"))
+        return Dataset.from_pandas(df)
+
+    def test_matches_pandas_loader(self):
+        dataset, log = self.load(drop_missing_images=False)
+        expected = self.baseline()
+        self.assertEqual(dataset.column_names, expected.column_names)
+        self.assertEqual(dataset.to_list(), expected.to_list())
+        self.assertIn("Warning: 6 of 40 recipes have no image (dish-0, dish-7, dish-14, dish-21, dish-28, ...)", log)
+
+    def test_drops_missing_images(self):
+        dataset, _ = self.load()
+        self.assertEqual(len(dataset), 34)
+        self.assertTrue(all(os.path.exists(path) for path in dataset['full_image_path']))
+
+    def test_missing_image_name(self):
+        with open(self.csv_path, "a") as f:
+            f.write('40,Mystery,[],,,[]\n')
+        dataset, log = self.load(drop_missing_images=False)
+        self.assertIsNone(dataset[-1]['Image_Name'])
+        self.assertIsNone(dataset[-1]['full_image_path'])
+        self.assertIn("7 of 41", log)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import io
+import random
+import unittest
+
+from recipe_xml import RecipeStreamParser, parse_recipe_stream
+from utils import parse_recipe_xml
+
+VALID = """<think>Looks like toast</think>
+<recipe>
+    <title>Toast &amp; Jam</title>
+    <ingredients>
+        <ingredient>1 slice bread</ingredient>
+        <!-- optional -->
+        <ingredient>1 tbsp jam</ingredient>
+    </ingredients>
+    <instructions>
+        <step>1. Toast the bread.</step>
+        <step>2. Spread the jam.</step>
+    </instructions>
+</recipe>
+Trailing chatter."""
+
+
+class TestRecipeStreamParser(unittest.TestCase):
+    def test_matches_elementtree_on_valid_xml(self):
+        """Streaming mode returns the same recipe as the ElementTree parser on valid input."""
+        self.assertEqual(parse_recipe_xml(VALID, streaming=True), parse_recipe_xml(VALID))
+
+    def test_incremental_feed_matches_one_shot(self):
+        """Feeding arbitrary chunks (splitting tags) gives the same result."""
+        rng = random.Random(0)
+        expected = parse_recipe_stream(VALID)
+        for _ in range(50):
+            parser = RecipeStreamParser()
+            position = 0
+            while position < len(VALID):
+                step = rng.randint(1, 12)
+                parser.feed(VALID[position:position + step])
+                position += step
+            self.assertEqual(parser.close(), expected)
+
+    def test_recovers_from_malformed_xml(self):
+        """Stray '&', unknown entities and unclosed items do not lose the recipe."""
+        malformed = """<recipe><title>Mac & Cheese</title>
+        <ingredients><ingredient>2 cups macaroni<ingredient>1 cup cheddar &mdash; grated</ingredient></ingredients>
+        <instructions><step>1. Boil pasta.</step><step>2. Stir in cheese.
+        </instructions></recipe>"""
+        self.assertIsNone(parse_recipe_xml(malformed))
+        self.assertEqual(parse_recipe_xml(malformed, streaming=True), {
+            'title': 'Mac & Cheese',
+            'ingredients': ['2 cups macaroni', '1 cup cheddar — grated'],
+            'steps': ['1. Boil pasta.', '2. Stir in cheese.'],
+        })
+
+    def test_truncated_output_keeps_items_seen_so_far(self):
+        truncated = "<think>hmm</think><recipe><title>Soup</title><ingredients><ingredient>water</ingredient><ingredient>sal"
+        self.assertEqual(parse_recipe_stream(truncated), {'title': 'Soup', 'ingredients': ['water', 'sal'], 'steps': []})
+        parser = RecipeStreamParser()
+        parser.feed(truncated)
+        parser.close()
+        self.assertFalse(parser.complete)
+        parser = RecipeStreamParser()
+        parser.feed(truncated + "t</ingredient></ingredients></recipe>")
+        parser.close()
+        self.assertTrue(parser.complete)
+
+    def test_no_recipe_tag(self):
+        self.assertIsNone(parse_recipe_stream("I cannot identify this dish."))
+
+    def test_only_first_recipe_is_read(self):
+        text = "<recipe><title>A</title></recipe><recipe><title>B</title><step>x</step></recipe>"
+        self.assertEqual(parse_recipe_stream(text), {'title': 'A', 'ingredients': [], 'steps': []})
+
+    def test_failures_are_not_printed(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            parse_recipe_xml("<recipe><title>x</recipe>")
+        self.assertEqual(out.getvalue(), "")
+
+if __name__ == '__main__':
+    unittest.main()
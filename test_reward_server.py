@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import embeddings
+import rewards
+from embedding_store import RaggedEmbeddings
+from reward_server import RewardClient, RewardServerError, make_server, pack_embeddings, unpack_embeddings
+from test_support import VALID, completion, use_hashing_embedder
+
+
+class RewardServerTestMixin:
+    def start_server(self, **kwargs):
+        server = make_server(**kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def setUp(self):
+        self.encoder = use_hashing_embedder(self)
+
+        self.completions = [
+            completion(VALID),
+            completion("no recipe at all"),
+            completion(VALID.replace("2 eggs", "3 eggs and milk")),
+        ]
+        ingredients = [["1 cup sugar", "2 eggs"], ["flour"], []]
+        steps = [["Mix the sugar and eggs.", "Bake."], ["Knead."], ["Bake."]]
+        self.gold = {
+            'parsed_ingredients': ingredients,
+            'ingredients_embeddings': [embeddings.encode_texts(items) for items in ingredients],
+            'instruction_steps': steps,
+            'instructions_embeddings': RaggedEmbeddings.from_rows(embeddings.encode_texts(items) for items in steps),
+        }
+
+    def local_rewards(self):
+        rewards._batch_context = {"texts": None, "format": [], "recipes": [], "rewards": {}}
+        return rewards.compute_recipe_rewards(self.completions, **self.gold)
+
+    def check_drop_in(self, client):
+        expected = self.local_rewards()
+        self.assertEqual(client.format_reward(self.completions, **self.gold), expected["format"])
+        self.assertEqual(client.cosine_ingredients_reward(self.completions, **self.gold), expected["ingredients"])
+        self.assertEqual(client.cosine_steps_reward(self.completions, **self.gold), expected["steps"])
+        rewards._batch_context = {"texts": None, "format": [], "recipes": [], "rewards": {}}
+        self.assertEqual(client.recipe_reward(self.completions, **self.gold),
+                         rewards.recipe_reward(self.completions, **self.gold))
+
+
+class TestRewardServer(RewardServerTestMixin, unittest.TestCase):
+    def test_http_client_matches_local_rewards(self):
+        server = self.start_server(port=0)
+        client = RewardClient(f"http://127.0.0.1:{server.server_address[1]}")
+        self.assertEqual(client.health(), {"status": "ok", "model": "hashing-test"})
+        self.check_drop_in(client)
+
+    def test_unix_socket_client_matches_local_rewards(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "rewards.sock")
+        self.start_server(unix_socket=path)
+        self.check_drop_in(RewardClient(f"unix://{path}"))
+
+    def test_one_round_trip_per_batch(self):
+        server = self.start_server(port=0)
+        client = RewardClient(f"http://127.0.0.1:{server.server_address[1]}")
+        client.cosine_ingredients_reward(self.completions, **self.gold)
+        calls = self.encoder.calls
+        client.cosine_steps_reward(self.completions, **self.gold)
+        client.format_reward(self.completions, **self.gold)
+        self.assertEqual(self.encoder.calls, calls)
+
+        # The same gold objects are answered locally; new ones go to the server.
+        client.cosine_ingredients_reward(self.completions, **dict(self.gold))
+        self.assertEqual(self.encoder.calls, calls)
+        client.cosine_ingredients_reward(self.completions, **dict(self.gold, parsed_ingredients=[["salt"], [], []]))
+        self.assertEqual(self.encoder.calls, calls + 1)
+
+    def test_bad_request(self):
+        server = self.start_server(port=0)
+        client = RewardClient(f"http://127.0.0.1:{server.server_address[1]}")
+        with self.assertRaises(RewardServerError):
+            client._request("POST", "/rewards", {"texts": []})
+        self.assertEqual(client.health()["status"], "ok")  # the connection survives an error
+
+    def test_pack_round_trip(self):
+        rows = [[[1.0, 2.0]], [], [[3.0, 4.0], [5.0, 6.0]]]
+        unpacked = unpack_embeddings(pack_embeddings(rows))
+        self.assertEqual([unpacked[i].tolist() for i in range(3)], rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
+import time
 import unittest
+from benchmarks.bench_check_format import pathological_inputs
+from recipe_xml import validate_recipe_format
 from rewards import check_format
 
 class TestRewardXmlFormat(unittest.TestCase):
@@ -33,7 +36,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(valid_xml)
+        result = check_format(valid_xml)
         self.assertTrue(result, "Valid complete XML should be accepted")
 
     def test_valid_minimal_format(self):
@@ -54,7 +57,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(valid_minimal_xml)
+        result = check_format(valid_minimal_xml)
         self.assertTrue(result, "Valid minimal XML should be accepted")
 
     def test_missing_think_tag(self):
@@ -72,7 +75,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_think_xml)
+        result = check_format(missing_think_xml)
         self.assertFalse(result, "XML missing think tag should be rejected")
 
     def test_missing_recipe_tag(self):
@@ -91,7 +94,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         <step>2. Spread butter on toast.</step>
     </instructions>
         """
-        result = reward_xml_format(missing_recipe_xml)
+        result = check_format(missing_recipe_xml)
         self.assertFalse(result, "XML missing recipe tag should be rejected")
 
     def test_missing_title(self):
@@ -111,7 +114,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_title_xml)
+        result = check_format(missing_title_xml)
         self.assertFalse(result, "XML missing title should be rejected")
 
     def test_missing_ingredients(self):
@@ -128,7 +131,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_ingredients_xml)
+        result = check_format(missing_ingredients_xml)
         self.assertFalse(result, "XML missing ingredients should be rejected")
 
     def test_missing_instructions(self):
@@ -145,7 +148,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </ingredients>
     </recipe>
         """
-        result = reward_xml_format(missing_instructions_xml)
+        result = check_format(missing_instructions_xml)
         self.assertFalse(result, "XML missing instructions should be rejected")
 
     def test_missing_ingredient_items(self):
@@ -164,7 +167,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_ingredient_items_xml)
+        result = check_format(missing_ingredient_items_xml)
         self.assertFalse(result, "XML missing ingredient items should be rejected")
 
     def test_missing_step_items(self):
@@ -183,7 +186,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_step_items_xml)
+        result = check_format(missing_step_items_xml)
         self.assertFalse(result, "XML missing step items should be rejected")
 
     def test_malformed_xml(self):
@@ -204,7 +207,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """  # Missing closing tag for last step
-        result = reward_xml_format(malformed_xml)
+        result = check_format(malformed_xml)
         self.assertTrue(result, "Malformed XML is accepted")
 
     def test_extra_tags(self):
@@ -228,7 +231,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         """
         # This test might pass or fail depending on how strict the implementation is
         # If extra tags are allowed, this should pass
-        result = reward_xml_format(extra_tags_xml)
+        result = check_format(extra_tags_xml)
         self.assertTrue(result, "XML with extra tags might be accepted depending on implementation")
 
     def test_wrong_nesting(self):
@@ -250,7 +253,7 @@ class TestRewardXmlFormat(unittest.TestCase):
     </recipe>
         """
         # The function is strict about order - ingredients must come before instructions
-        result = reward_xml_format(wrong_nesting_xml)
+        result = check_format(wrong_nesting_xml)
         self.assertFalse(result, "XML with wrong nesting is rejected because the function enforces order")
 
     def test_whitespace_handling(self):
@@ -285,7 +288,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         
     </recipe>
         """
-        result = reward_xml_format(whitespace_xml)
+        result = check_format(whitespace_xml)
         self.assertTrue(result, "XML with excessive whitespace should be accepted")
 
     def test_xml_with_comments(self):
@@ -312,7 +315,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(xml_with_comments)
+        result = check_format(xml_with_comments)
         self.assertTrue(result, "XML with comments should be accepted")
 
     def test_xml_with_entities(self):
@@ -335,7 +338,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(xml_with_entities)
+        result = check_format(xml_with_entities)
         self.assertTrue(result, "XML with HTML entities should be accepted")
 
     def test_xml_with_unicode(self):
@@ -359,7 +362,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(xml_with_unicode)
+        result = check_format(xml_with_unicode)
         self.assertTrue(result, "XML with Unicode characters should be accepted")
 
     def test_multiple_ingredients_and_steps(self):
@@ -393,7 +396,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(xml_many_items)
+        result = check_format(xml_many_items)
         self.assertTrue(result, "XML with many ingredients and steps should be accepted")
 
     def test_missing_think_closing_tag(self):
@@ -413,7 +416,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(missing_think_close_xml)
+        result = check_format(missing_think_close_xml)
         self.assertFalse(result, "XML missing think closing tag should be rejected")
 
     def test_missing_recipe_closing_tag(self):
@@ -433,7 +436,7 @@ class TestRewardXmlFormat(unittest.TestCase):
             <step>2. Spread butter on toast.</step>
         </instructions>
         """
-        result = reward_xml_format(missing_recipe_close_xml)
+        result = check_format(missing_recipe_close_xml)
         self.assertFalse(result, "XML missing recipe closing tag should be rejected")
 
     def test_empty_content_in_required_tags(self):
@@ -454,7 +457,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(empty_content_xml)
+        result = check_format(empty_content_xml)
         self.assertFalse(result, "XML with empty title should be rejected")
 
     def test_case_sensitivity(self):
@@ -475,7 +478,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </Instructions>
     </Recipe>
         """
-        result = reward_xml_format(mixed_case_xml)
+        result = check_format(mixed_case_xml)
         self.assertTrue(result, "XML with mixed case tags should be accepted (case insensitive)")
 
     def test_additional_content_before_think(self):
@@ -497,7 +500,7 @@ class TestRewardXmlFormat(unittest.TestCase):
         </instructions>
     </recipe>
         """
-        result = reward_xml_format(additional_content_before_xml)
+        result = check_format(additional_content_before_xml)
         self.assertFalse(result, "XML with content before think tag should be rejected")
 
     def test_additional_content_after_recipe(self):
@@ -519,8 +522,24 @@ class TestRewardXmlFormat(unittest.TestCase):
     </recipe>
     Some text after the XML.
         """
-        result = reward_xml_format(additional_content_after_xml)
+        result = check_format(additional_content_after_xml)
         self.assertFalse(result, "XML with content after recipe tag should be rejected")
 
+
+class TestRecipeFormatValidator(unittest.TestCase):
+    def test_reports_rejection_reason(self):
+        """validate_recipe_format explains why an output was rejected."""
+        ok, reason = validate_recipe_format("<think>x</think><recipe><title>t</title></recipe>")
+        self.assertFalse(ok)
+        self.assertIn("<ingredients>", reason)
+        self.assertEqual(validate_recipe_format("hello"), (False, "output must start with <think>"))
+
+    def test_pathological_inputs_are_bounded(self):
+        """~20k-character adversarial outputs are checked in linear time."""
+        for name, text in pathological_inputs(20_000).items():
+            start = time.perf_counter()
+            check_format(text)
+            self.assertLess(time.perf_counter() - start, 0.25, name)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import embeddings
+import rewards
+from test_support import VALID, completion, use_hashing_embedder
+
+
+class TestFusedRewards(unittest.TestCase):
+    def setUp(self):
+        self.encoder = use_hashing_embedder(self)
+
+        gold_ingredients = [["1 cup sugar", "3 eggs"], ["salt"]]
+        gold_steps = [["Mix sugar and eggs.", "Bake it."], ["Boil."]]
+        self.kwargs = {
+            "parsed_ingredients": gold_ingredients,
+            "ingredients_embeddings": [list(embeddings.encode_texts(g)) for g in gold_ingredients],
+            "instruction_steps": gold_steps,
+            "instructions_embeddings": [list(embeddings.encode_texts(g)) for g in gold_steps],
+        }
+        self.completions = [completion(VALID), completion("no recipe here")]
+        self.encoder.calls = 0
+
+    def test_fused_matches_per_field_scores(self):
+        """compute_recipe_rewards returns the same scores as _avg_best_cosine per completion."""
+        result = rewards.compute_recipe_rewards(self.completions, **self.kwargs)
+        expected = rewards._avg_best_cosine(
+            ["1 cup sugar", "2 eggs"],
+            self.kwargs["parsed_ingredients"][0],
+            self.kwargs["ingredients_embeddings"][0],
+        )
+        self.assertAlmostEqual(result["ingredients"][0], expected, places=6)
+        self.assertEqual(result["ingredients"][1], 0.0)
+        self.assertEqual(result["steps"][1], 0.0)
+        self.assertEqual(set(result), {"format", "ingredients", "steps"})
+
+    def test_parses_and_encodes_once_per_batch(self):
+        """Separate reward callables on one batch share parsing and a single encode call."""
+        ingredients = rewards.cosine_ingredients_reward(self.completions, **self.kwargs)
+        steps = rewards.cosine_steps_reward(self.completions, **self.kwargs)
+        rewards.format_reward(self.completions, **self.kwargs)
+        self.assertEqual(self.encoder.calls, 1)
+        self.assertGreater(ingredients[0], 0.0)
+        self.assertGreater(steps[0], 0.0)
+
+    def test_recipe_reward_is_weighted_sum(self):
+        fused = rewards.compute_recipe_rewards(self.completions, **self.kwargs)
+        total = rewards.recipe_reward(self.completions, **self.kwargs)
+        self.assertAlmostEqual(total[0], fused["format"][0] + fused["ingredients"][0] + fused["steps"][0], places=6)
+
+    def test_truncated_recipes_earn_no_cosine_reward(self):
+        """Items recovered from output cut off before </recipe> are not embedded or scored."""
+        truncated = "<recipe><title>x</title><ingredients><ingredient>1 cup sugar"
+        result = rewards.compute_recipe_rewards([completion(truncated)] * 2, **self.kwargs)
+        self.assertEqual(result, {"format": [0.0, 0.0], "ingredients": [0.0, 0.0], "steps": [0.0, 0.0]})
+        self.assertEqual(self.encoder.calls, 0)
+
+    def test_content_rewards_ignore_text_around_the_recipe(self):
+        """A complete recipe is scored even when check_format rejects its surroundings."""
+        recipe = VALID[VALID.index("<recipe>"):]
+        reference = rewards.compute_recipe_rewards([completion(VALID)] * 2, **self.kwargs)
+        for text in (recipe, f"Sure!\n{recipe}", f"{VALID}\nDone!"):
+            result = rewards.compute_recipe_rewards([completion(text)] * 2, **self.kwargs)
+            self.assertEqual(result["format"], [0.0, 0.0])
+            self.assertEqual(result["ingredients"], reference["ingredients"])
+            self.assertEqual(result["steps"], reference["steps"])
+            self.assertGreater(result["ingredients"][0], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+
+from similarity import avg_best_cosine, batch_avg_best_cosine, best_match
+
+try:
+    from sklearn.metrics.pairwise import cosine_similarity
+except ImportError:  # sklearn is only needed for the reference implementation
+    cosine_similarity = None
+
+
+def reference_avg_best_cosine(pred, gold):
+    """The per-pair loop previously used by rewards._avg_best_cosine."""
+    if len(pred) == 0 or len(gold) == 0:
+        return 0.0
+    gold_arr = [np.asarray(e).reshape(1, -1) for e in gold]
+    scores = [
+        max(cosine_similarity(p.reshape(1, -1), g)[0][0] for g in gold_arr)
+        for p in pred
+    ]
+    return float(np.mean(scores))
+
+
+@unittest.skipIf(cosine_similarity is None, "scikit-learn not installed")
+class TestBestMatchCosine(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.preds = [rng.normal(size=(n, 384)).astype(np.float32) for n in (3, 0, 7, 1)]
+        self.golds = [rng.normal(size=(n, 384)).astype(np.float32) for n in (5, 2, 0, 9)]
+
+    def test_avg_best_cosine_matches_pairwise_loop(self):
+        """The single matrix product reproduces the per-pair sklearn scores."""
+        for pred, gold in zip(self.preds, self.golds):
+            self.assertAlmostEqual(avg_best_cosine(pred, gold), reference_avg_best_cosine(pred, gold), places=6)
+
+    def test_gold_as_list_of_lists(self):
+        """Golden embeddings read back from the dataset arrive as nested lists."""
+        pred, gold = self.preds[0], self.golds[0]
+        gold_lists = [list(map(float, g)) for g in gold]
+        self.assertAlmostEqual(avg_best_cosine(pred, gold_lists), reference_avg_best_cosine(pred, gold_lists), places=10)
+
+    def test_best_match_argmax(self):
+        """best_match returns the first index of the highest similarity."""
+        gold = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+        scores, indices = best_match(np.array([[2.0, 0.1], [0.0, 3.0]]), gold)
+        np.testing.assert_array_equal(indices, [0, 1])
+        self.assertAlmostEqual(scores[1], 1.0)
+
+    def test_best_match_without_gold(self):
+        scores, indices = best_match(np.ones((2, 4)), np.zeros((0, 4)))
+        np.testing.assert_array_equal(indices, [-1, -1])
+
+    def test_batch_matches_single(self):
+        """The padded batch form agrees with scoring each row on its own."""
+        batch = batch_avg_best_cosine(self.preds, self.golds)
+        expected = [reference_avg_best_cosine(p, g) for p, g in zip(self.preds, self.golds)]
+        np.testing.assert_allclose(batch, expected, rtol=0, atol=1e-6)
+
+    def test_batch_with_padded_input(self):
+        """Already padded (B, N, dim) tensors are accepted together with their lengths."""
+        preds = np.zeros((2, 4, 384), dtype=np.float32)
+        preds[0, :3] = self.preds[0]
+        preds[1, :1] = self.preds[3]
+        golds = np.zeros((2, 9, 384), dtype=np.float32)
+        golds[0, :5] = self.golds[0]
+        golds[1, :9] = self.golds[3]
+        batch = batch_avg_best_cosine(preds, golds, pred_lengths=[3, 1], gold_lengths=[5, 9])
+        expected = [reference_avg_best_cosine(self.preds[0], self.golds[0]),
+                    reference_avg_best_cosine(self.preds[3], self.golds[3])]
+        np.testing.assert_allclose(batch, expected, rtol=0, atol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Shared fixtures for the test modules: a deterministic stand-in for the
+SentenceTransformer and a well-formed completion to score.
+"""
+import hashlib
+
+import numpy as np
+
+import embeddings
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words stand-in for the SentenceTransformer."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return 32
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        vectors = np.zeros((len(texts), 32), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, hashlib.md5(word.encode()).digest()[0] % 32] += 1.0
+        return vectors
+
+
+def use_hashing_embedder(test, encoder=None):
+    """
+    Install `encoder` (a new HashingEncoder by default) as the shared
+    embedder with caching off for the duration of `test`.  On cleanup the
+    previous model name is restored and the encoder dropped, so the next
+    test starts from a fresh global embedder.
+    """
+    encoder = encoder if encoder is not None else HashingEncoder()
+    test.addCleanup(embeddings.configure_embedder, embeddings.get_model_name())
+    embeddings.set_embedder(encoder, model_name="hashing-test")
+    embeddings.configure_embedding_cache(None)
+    return encoder
+
+
+def completion(text):
+    return [{"role": "assistant", "content": text}]
+
+
+VALID = """<think>cookies</think>
+<recipe>
+  <title>Cookies</title>
+  <ingredients>
+    <ingredient>1 cup sugar</ingredient>
+    <ingredient>2 eggs</ingredient>
+  </ingredients>
+  <instructions>
+    <step>1. Mix the sugar and eggs.</step>
+    <step>2. Bake.</step>
+  </instructions>
+</recipe>"""
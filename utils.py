@@ -1,33 +1,63 @@
-from together import Together
-from sentence_transformers import SentenceTransformer
 import base64
 import re
 from dotenv import load_dotenv
 import os
+import logging
 import xml.etree.ElementTree as ET
 import copy
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import instrumentation
+from embedding_store import SUPPORTED_DTYPES, embedding_feature
+from embeddings import embedding_dim, encode_nested, encode_texts
+from generation import DEFAULT_MODEL, get_client
+from images import DEFAULT_JPEG_QUALITY, DEFAULT_THUMBNAIL_DIR, image_is_valid, prepare_image
+from recipe_xml import parse_recipe_stream
+import response_cache
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-
-def generate_response(messages, max_tokens=1000, temperature=0.7):
-    # Access the API key from environment variables
-    api_key = os.getenv("TOGETHER_API_KEY")         
-    client = Together(api_key=api_key)
+def generate_response(messages, max_tokens=1000, temperature=0.7, seed=None, use_cache=True, replay=False):
+    """
+    Generate one chat completion.
+    
+    Requests read through and write through the on-disk generation cache
+    (response_cache.py) unless use_cache=False. A cached response is replayed
+    automatically when temperature == 0, and only with replay=True otherwise.
+    """
+    # Hash the request (and its base64 images) only when a cache will use the key.
+    use_cache = use_cache and response_cache.get_response_cache() is not None
+    if use_cache:
+        key = response_cache.request_key(DEFAULT_MODEL, messages, max_tokens, temperature, seed)
+        cached = response_cache.lookup(key, temperature, replay)
+        if cached is not None:
+            return cached
 
+    # One pooled client per process (see generation.py for the concurrent API)
+    client = get_client()
 
+    extra = {"seed": seed} if seed is not None else {}
     response = client.chat.completions.create(
-        model="meta-llama/Llama-Vision-Free",
+        model=DEFAULT_MODEL,
         messages=messages,
         max_tokens=max_tokens,
         temperature=temperature,
+        **extra,
     )
 
-    return response.choices[0].message.content
+    content = response.choices[0].message.content
+    if use_cache:
+        response_cache.store(key, content, DEFAULT_MODEL)
+    return content
 
-def parse_recipe_xml(xml_string):
+@instrumentation.timed("utils.parse_recipe_xml")
+def parse_recipe_xml(xml_string, streaming=False):
     """
     Parse a recipe XML string based on the defined structure in the prompt.
     
@@ -45,7 +75,21 @@ def parse_recipe_xml(xml_string):
         <!-- More steps -->
       </instructions>
     </recipe>
+    
+    With streaming=True the text goes through the fault-tolerant
+    RecipeStreamParser instead of ElementTree: malformed XML (stray "&",
+    unclosed tags, truncated output) still yields whatever title, ingredients
+    and steps can be recovered, and no exception is raised. None is returned
+    only when there is no <recipe> tag at all.
+    
+    Parse failures are logged at DEBUG level, never printed.
     """
+    if streaming:
+        recipe = parse_recipe_stream(xml_string)
+        if recipe is None:
+            instrumentation.increment("utils.parse_failures")
+        return recipe
+
     try:
         # Extract the XML part if there's text before or after it
         xml_match = re.search(r'<recipe>.*?</recipe>', xml_string, re.DOTALL)
@@ -80,8 +124,8 @@ def parse_recipe_xml(xml_string):
             'steps': steps
         }
     except Exception as e:
-        print(f"Error parsing XML: {e}")
-        print(f"Problematic XML: {xml_string}")
+        logger.debug("Error parsing XML: %s\nProblematic XML: %s", e, xml_string)
+        instrumentation.increment("utils.parse_failures")
         return None
     
 # Function to display recipe in a nicely formatted way
@@ -116,11 +160,7 @@ def prase_ingridients_to_embeddings(ingredients_list):
     if not ingredients_list:
         return []
     
-    embeddings = []
-    for ingredient in ingredients_list:
-        embedding = embedder.encode(ingredient)
-        embeddings.append(embedding)
-    return embeddings
+    return list(encode_texts(ingredients_list))
     
 def parse_instructions_to_embeddings(instructions_list):
     """
@@ -129,11 +169,7 @@ def parse_instructions_to_embeddings(instructions_list):
     if not instructions_list:
         return []
     
-    embeddings = []
-    for instruction in instructions_list:
-        embedding = embedder.encode(instruction)
-        embeddings.append(embedding)
-    return embeddings
+    return list(encode_texts(instructions_list))
 
 def parse_instructions(instructions_text):
     """
@@ -151,6 +187,31 @@ def parse_instructions(instructions_text):
     
     return steps
 
+def _string_array(column):
+    """A pa.StringArray (nulls kept) from an Arrow array/chunked array or a list of strings."""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    elif not isinstance(column, pa.Array):
+        column = pa.array(column, pa.string())
+    return column.cast(pa.string())
+
+def parse_instructions_column(column):
+    """
+    `parse_instructions` for a whole column: takes an Arrow string column (or
+    a list of strings) and returns a list<string> array, using Arrow string
+    kernels only (split, trim, filter), no per-row Python.
+    """
+    column = _string_array(column).fill_null("")
+    lines = pc.split_pattern(column, "\n")
+    steps = pc.utf8_trim_whitespace(pc.list_flatten(lines))
+    parents = pc.list_parent_indices(lines)
+    keep = pc.greater(pc.utf8_length(steps), 0)
+    counts = np.bincount(parents.filter(keep).to_numpy(), minlength=len(column))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), steps.filter(keep))
+
+_INGREDIENT_RE = re.compile(r"'([^'\\]*(?:\\.[^'\\]*)*)'")
+
 def parse_ingredients(ingredients_text):
     """
     Parse ingredients text which is a string representation of a list
@@ -164,11 +225,48 @@ def parse_ingredients(ingredients_text):
         return ingredients_text
         
     # Use regex to match everything between single quotes
-    pattern = r"'([^'\\]*(?:\\.[^'\\]*)*)'"
-    matches = re.findall(pattern, ingredients_text)
+    matches = _INGREDIENT_RE.findall(ingredients_text)
     
     return matches
 
+# Rows like "['a', 'b']" whose items hold no quote or backslash: for them
+# _INGREDIENT_RE is the same as stripping "['" / "']" and splitting on "', '".
+_SIMPLE_INGREDIENTS_RE = r"^\['[^'\\]*'(, '[^'\\]*')*\]$"
+
+def parse_ingredients_column(column):
+    """
+    `parse_ingredients` for a whole column: takes an Arrow string column (or
+    a list of strings) and returns a list<string> array.
+    
+    Well-formed list literals are split with Arrow string kernels; only the
+    remaining rows (items with quotes or escapes, malformed text) go through
+    the per-row regex.
+    """
+    list_type = pa.list_(pa.string())
+    if isinstance(column, list) and any(isinstance(text, list) for text in column):
+        return pa.array([parse_ingredients(text) for text in column], list_type)
+    if isinstance(column, (pa.Array, pa.ChunkedArray)) and pa.types.is_list(column.type):
+        # Already parsed (parse_ingredients passes lists through)
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        return column.cast(list_type).fill_null(pa.scalar([], list_type))
+    
+    column = _string_array(column)
+    simple = pc.fill_null(pc.match_substring_regex(column, _SIMPLE_INGREDIENTS_RE), False)
+    split = pc.split_pattern(pc.utf8_slice_codeunits(column, 2, -2), "', '")
+    
+    others = np.flatnonzero(~simple.to_numpy(zero_copy_only=False))
+    parsed = [None] * len(column)
+    for i, text in zip(others, column.take(pa.array(others, pa.int64())).to_pylist()):
+        parsed[i] = parse_ingredients(text)
+    return pc.if_else(simple, split, pa.array(parsed, list_type))
+
+def _set_column(table, name, values):
+    """`table` with column `name` replaced by (or extended with) `values`."""
+    if name in table.column_names:
+        return table.set_column(table.column_names.index(name), name, values)
+    return table.append_column(name, values)
+
 def encode_image(image_path):
     """Encode an image as base64 string, with error handling."""
     try:
@@ -184,62 +282,146 @@ def encode_image(image_path):
         print(f"Error encoding image {image_path}: {e}")
         return None
     
-def preprocess_dataset(hf_dataset):
+def preprocess_dataset(hf_dataset, embed_batch_size=256, image_mode="base64",
+                       max_image_side=None, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                       thumbnail_dir=DEFAULT_THUMBNAIL_DIR, batch_size=256, num_proc=None,
+                       embedding_dtype="float32"):
     """
     Preprocess the Hugging Face dataset by adding new columns for:
     - Parsed ingredients
     - Parsed cleaned ingredients (using parse_ingredients for now)
     - Parsed instruction steps
-    - Base64 encoded images
+    - Base64 encoded images (image_mode="base64"), or only a validated
+      image path (image_mode="path") that is encoded lazily at request time
+      through images.example_image_base64 / images.image_message
     
-    Filters out examples where image encoding fails.
+    Filters out examples where image encoding fails (or, in "path" mode,
+    whose image file does not exist - a single stat, no read).
+    
+    Parsing and image I/O run as batched maps of `batch_size` rows, spread
+    over `num_proc` worker processes; the text columns are parsed a whole
+    Arrow column at a time (parse_ingredients_column /
+    parse_instructions_column).  Ingredient and instruction embeddings
+    are computed afterwards in the main process (the model is never copied
+    into the workers), in batches of `embed_batch_size` rows whose strings
+    all go through the embedder together.  The embedding columns are stored
+    as ``list<fixed_size_list<embedding_dtype>[dim]>`` (one flat buffer plus
+    row offsets), which embedding_store.embedding_column reads back as
+    zero-copy NumPy views.
+    
+    With `max_image_side` set, images are first downscaled and re-encoded as
+    JPEG through images.prepare_image (cached on disk by content hash), the
+    stored path/payload refers to the thumbnail, and an `image_bytes_saved`
+    column records the saving per image.
     
     Args:
         hf_dataset: The original Hugging Face dataset object.
+        embed_batch_size: Number of rows whose strings are encoded together.
+        image_mode: "base64" to store the encoded image in a `base64_image`
+            column, "path" to store only `image_path`.
+        max_image_side: Longest side of the downscaled image, or None to keep
+            the originals.
+        jpeg_quality: JPEG quality used when re-encoding thumbnails.
+        thumbnail_dir: Directory of the thumbnail cache.
+        batch_size: Rows per batch for parsing, image I/O and filtering.
+        num_proc: Worker processes for parsing and image I/O (None runs
+            them in the main process).
+        embedding_dtype: "float32" or "float16" storage for the embeddings.
         
     Returns:
         The processed Hugging Face dataset with only valid images.
     """
+    # Fail before any parsing or embedding work is spent on the dataset.
+    if embedding_dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"embedding_dtype must be one of {SUPPORTED_DTYPES}, got {embedding_dtype!r}")
 
-    def _process_example(example):
-        """Helper function to process a single dataset example."""
-        # Process ingredients
-        if 'Ingredients' in example:
-            example['parsed_ingredients'] = parse_ingredients(example['Ingredients'])
-        else:
-             example['parsed_ingredients'] = [] # Add empty list if key missing
-        
-        # Process cleaned ingredients
-        if 'Cleaned_Ingredients' in example:
-            example['parsed_cleaned_ingredients'] = parse_ingredients(example['Cleaned_Ingredients'])
-        else:
-             example['parsed_cleaned_ingredients'] = [] # Add empty list if key missing
+    def _process_batch(table):
+        """Parse the text columns and resolve the images of a batch of rows (an Arrow table)."""
+        n = table.num_rows
         
-        # Process instructions
-        if 'Instructions' in example:
-            example['instruction_steps'] = parse_instructions(example['Instructions'])
-        else:
-            example['instruction_steps'] = [] # Add empty list if key missing
+        # Process ingredients, cleaned ingredients and instructions with
+        # column-level parsers (empty lists if a column is missing)
+        with instrumentation.stage("preprocess.parse_columns"):
+            for source, target, parse in (
+                ('Ingredients', 'parsed_ingredients', parse_ingredients_column),
+                ('Cleaned_Ingredients', 'parsed_cleaned_ingredients', parse_ingredients_column),
+                ('Instructions', 'instruction_steps', parse_instructions_column),
+            ):
+                text = table.column(source) if source in table.column_names else pa.nulls(n, pa.string())
+                table = _set_column(table, target, parse(text))
         
         # Validate and process image paths
-        if 'full_image_path' in example:
-            example['base64_image'] = encode_image(example['full_image_path'])
+        if 'full_image_path' in table.column_names:
+            image_paths = table.column('full_image_path').to_pylist()
         else:
-            example['base64_image'] = None # Add None if key missing
-        
-        # Vectorize ingredients and instructions
-        example['ingredients_embeddings'] = prase_ingridients_to_embeddings(example['parsed_ingredients'])
-        example['instructions_embeddings'] = parse_instructions_to_embeddings(example['instruction_steps'])
+            image_paths = [None] * n
+        if max_image_side is not None:
+            with instrumentation.stage("preprocess.downscale"):
+                image_paths, saved = _downscale(image_paths)
+            table = _set_column(table, 'image_bytes_saved', pa.array(saved, pa.int64()))
+        with instrumentation.stage("preprocess.images"):
+            if image_mode == "path":
+                images = [path if image_is_valid(path) else None for path in image_paths]
+            else:
+                images = [encode_image(path) if path is not None else None for path in image_paths]
+        instrumentation.increment("preprocess.missing_images", images.count(None))
         
-        return example
+        return _set_column(table, image_column, pa.array(images, pa.string()))
+
+    def _downscale(image_paths):
+        """Swap each image path for its thumbnail; also returns the bytes saved per image."""
+        paths, saved = [], []
+        for image_path in image_paths:
+            report = None
+            if image_is_valid(image_path):
+                try:
+                    report = prepare_image(image_path, max_image_side, jpeg_quality, thumbnail_dir)
+                except Exception as e:
+                    logger.warning("Could not downscale %s, keeping the original: %s", image_path, e)
+            paths.append(report['path'] if report else image_path)
+            saved.append(report['bytes_saved'] if report else 0)
+        return paths, saved
+
+    def _embed_batch(batch):
+        """Vectorize ingredients and instructions of a whole batch in one encode call."""
+        ingredients = batch['parsed_ingredients']
+        steps = batch['instruction_steps']
+        with instrumentation.stage("preprocess.embed"):
+            vectors = encode_nested(ingredients + steps)
+        vectors = [v.astype(embedding_dtype, copy=False) for v in vectors]
+        batch['ingredients_embeddings'] = vectors[:len(ingredients)]
+        batch['instructions_embeddings'] = vectors[len(ingredients):]
+        return batch
+
+    if image_mode not in ("base64", "path"):
+        raise ValueError(f"image_mode must be 'base64' or 'path', got {image_mode!r}")
+    image_column = 'image_path' if image_mode == "path" else 'base64_image'
 
     print(f"Preprocessing dataset with {len(hf_dataset)} examples...")
     
-    # First, process all examples
-    processed_dataset = hf_dataset.map(_process_example)
+    # First, parse all examples and load their images (in parallel)
+    processed_dataset = hf_dataset.with_format("arrow").map(
+        _process_batch, batched=True, batch_size=batch_size, num_proc=num_proc
+    ).with_format(None)
     
     # Then filter out examples with missing images
-    valid_examples = processed_dataset.filter(lambda example: example['base64_image'] is not None)
+    valid_examples = processed_dataset.filter(
+        lambda images: [image is not None for image in images],
+        batched=True,
+        batch_size=batch_size,
+        input_columns=[image_column],
+        num_proc=num_proc,
+    )
+    
+    # Embed only the surviving examples, in the main process
+    features = valid_examples.features.copy()
+    features['ingredients_embeddings'] = embedding_feature(embedding_dim(), embedding_dtype)
+    features['instructions_embeddings'] = features['ingredients_embeddings']
+    valid_examples = valid_examples.map(_embed_batch, batched=True, batch_size=embed_batch_size, features=features)
+    
+    if max_image_side is not None:
+        saved = sum(valid_examples['image_bytes_saved'])
+        print(f"Downscaling to {max_image_side}px saved {saved / 1e6:.1f} MB of image data")
     
     print(f"Preprocessing complete. {len(valid_examples)} examples with valid images (filtered out {len(processed_dataset) - len(valid_examples)} examples)")
     return valid_examples
@@ -259,7 +441,7 @@ def convert_recipe_to_xml(recipe_entry):
     ingredients = recipe_entry["parsed_cleaned_ingredients"]
     steps = recipe_entry["instruction_steps"]
 
-    print("converting to xml ...example:", recipe_entry)
+    logger.debug("converting to xml ...example: %s", title)
     
     # Start building the XML structure
     xml = [